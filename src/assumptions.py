@@ -0,0 +1,15 @@
+# Assumptions of the simulation model shared by the main script and the experiment runner.
+
+
+## 1. Incidetns types and their required vehicles 
+incident_type = {1:{'t1':1, 't2':1},
+                 2:{'t1':1, 't2':2},
+                 3:{'t1':1, 't2':2, 't3':1}}
+
+# 2. Standard travel time for different vehicles (seconds)
+time_st_t1 = 9*60
+time_st_t2 = 9*60
+time_st_t3 = 14*60
+
+# Number of zones (node) in the network 
+zone_num = 693
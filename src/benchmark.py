@@ -0,0 +1,159 @@
+import time
+import argparse
+import resource
+import tracemalloc
+
+import simpy
+import numpy as np
+import pandas as pd
+
+from network import Network
+from call_arrival import call_arrival
+from dispatch import dispatch_arrival
+from incident_process import incident_process
+from data_cache import load_configuration, load_arrivals, load_od
+from assumptions import incident_type, time_st_t1, time_st_t2, time_st_t3, zone_num
+
+
+# Benchmark suite timing each stage of the simulation pipeline separately.
+## Stages: data load, `generate_station`, `generate_zone`, `env.run()`, `generate_result`, `compute_util`, and `generate_zonal_db`.
+## Scenarios:
+### 1. Bundled: the arrival files and OD matrices in the data directory.
+### 2. Synthetic: generated networks with a given number of zones, and incident streams scaled to a longer horizon.
+## For each stage the wall time and memory are reported: with `--memory`, the peak of the stage's traced allocations (`peak_mb`);
+## otherwise the process' maximum resident size so far (`max_rss_mb`), which is cumulative: it includes the earlier stages and scenarios,
+## and only grows. For `env.run()` the number of simulation events per second is also reported.
+## Example: `python benchmark.py --arrivals 1 2 --zones 2000 5000 --incident-scale 10 --output bench.csv`
+
+
+# Arrival processes that can be benchmarked.
+ARRIVAL_PROCESS = {'call_arrival':call_arrival, 'dispatch_arrival':dispatch_arrival}
+
+
+class StageTimer:
+
+    def __init__(self, scenario, trace_memory=False):
+        self.scenario = scenario
+        self.trace_memory = trace_memory
+        self.rows = []
+
+    def run(self, stage, func, *args, **kwargs):
+        """
+        Running one stage and storing its wall time and peak memory (of the stage, or of the process so far).
+        """
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter()-start
+        row = {'scenario':self.scenario, 'stage':stage, 'seconds':elapsed}
+        if self.trace_memory:
+            row['peak_mb'] = tracemalloc.get_traced_memory()[1]/2**20
+            tracemalloc.stop()
+        else:
+            row['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/2**10
+        self.rows.append(row)
+        return result
+
+
+def synthetic_inputs(zones, incident_scale=1, seed=0):
+    """
+    Generating a synthetic network (OD matrix and resource configuration) and incident database.
+    Zones are random points, and stations and incidents are scaled with the number of zones like the bundled network.
+    """
+    rng = np.random.default_rng(seed)
+    # Travel time (seconds) between zone centroids at 30 km/h, in a square with the bundled network's zone density.
+    side = 30000*np.sqrt(zones/zone_num)
+    xy = rng.uniform(0, side, size=(zones, 2))
+    tt = np.empty((zones, zones), dtype=np.int32)
+    for start in range(0, zones, 500):
+        tt[start:start+500] = np.hypot(*(xy[start:start+500,None,:]-xy[None,:,:]).transpose(2,0,1))/(30/3.6)
+    od = pd.DataFrame(tt, columns=[str(i) for i in range(1,zones+1)], copy=False)
+
+    # About one station every 5.5 zones, with the vehicle mix of the nominal configuration.
+    station = rng.random(zones) < 1/5.5
+    loc = pd.DataFrame({'zone':[str(i) for i in range(1,zones+1)], 'Station':station.astype(np.int64),
+                        't1':station.astype(np.int64),
+                        't2':station*rng.choice([1,2,3], size=zones, p=[0.05,0.85,0.10]),
+                        't3':station*(rng.random(zones) < 0.25)})
+    loc = loc.astype({'zone':object, 't2':np.int64, 't3':np.int64})
+
+    # Incidents of one year per 693 zones, and a horizon `incident_scale` times longer.
+    num = int(26600*zones/zone_num*incident_scale)
+    arint = rng.exponential(365*24*3600*incident_scale/num, size=num)
+    arint[0] = 0
+    incident = pd.DataFrame({'inc_time':np.cumsum(arint), 'arint':arint,
+                             'inc_type':rng.choice([1,2,3], size=num, p=[0.69,0.24,0.07]),
+                             'location':rng.integers(1, zones+1, size=num),
+                             'dact':rng.lognormal(7.1, 0.6, size=num)},
+                            index=pd.Index(np.arange(1,num+1), name='num'))
+    return od, loc, incident
+
+
+def run_events(env):
+    """
+    Running the simulation like `env.run()` while counting the processed events.
+    """
+    events = 0
+    while env.peek() < simpy.core.Infinity:
+        env.step()
+        events += 1
+    return events
+
+
+def run_pipeline(timer, load, zones, arrival_process):
+    """
+    Running the whole simulation pipeline, timing each stage.
+    """
+    od, loc, incident = timer.run('load', load)
+    env = simpy.Environment()
+    network = Network(od, loc, zones, time_st_t1, time_st_t2, time_st_t3, len(incident), incident, env)
+    timer.run('generate_station', network.generate_station)
+    timer.run('generate_zone', network.generate_zone)
+    if arrival_process is dispatch_arrival:
+        timer.run('generate_dispatcher', network.generate_dispatcher)
+    env.process(incident_process(env, incident, network, incident_type, arrival=arrival_process))
+    events = timer.run('env.run', run_events, env)
+    timer.rows[-1]['events'] = events
+    timer.rows[-1]['events_per_second'] = events/timer.rows[-1]['seconds']
+    timer.rows[-1]['incidents'] = len(incident)
+    timer.run('generate_result', network.generate_result)
+    timer.run('compute_util', network.compute_util)
+    timer.run('generate_station_db', network.generate_station_db)
+    timer.run('generate_zonal_db', network.generate_zonal_db)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmark of the simulation pipeline stages.')
+    parser.add_argument('--arrivals', nargs='*', default=['2'], help='bundled arrival files (numbers) to benchmark')
+    parser.add_argument('--config', default='data/Resource_Configurations/config_2.csv')
+    parser.add_argument('--od', default='data/OD_Matrix/od_3.csv')
+    parser.add_argument('--zones', nargs='*', type=int, default=[], help='number of zones of synthetic networks')
+    parser.add_argument('--incident-scale', type=float, default=1, help='horizon (number of incidents) scale of synthetic networks')
+    parser.add_argument('--arrival-process', choices=ARRIVAL_PROCESS, default='dispatch_arrival')
+    parser.add_argument('--memory', action='store_true', help='trace peak allocations of each stage (slower)')
+    parser.add_argument('--output', help='csv file to store the results')
+    args = parser.parse_args(args)
+    arrival_process = ARRIVAL_PROCESS[args.arrival_process]
+
+    rows = []
+    for arrival in args.arrivals:
+        timer = StageTimer(f'arrival_{arrival}', args.memory)
+        load = lambda: (load_od(args.od), load_configuration(args.config), load_arrivals(f'data/Arrivals/arrival_{arrival}.csv'))
+        run_pipeline(timer, load, zone_num, arrival_process)
+        rows += timer.rows
+    for zones in args.zones:
+        timer = StageTimer(f'synthetic_{zones}x{args.incident_scale:g}', args.memory)
+        run_pipeline(timer, lambda: synthetic_inputs(zones, args.incident_scale), zones, arrival_process)
+        rows += timer.rows
+
+    result = pd.DataFrame(rows)
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        print(result.to_string(index=False, float_format='{:.3f}'.format))
+    if args.output:
+        result.to_csv(args.output, index=False)
+    return result
+
+
+if __name__ == '__main__':
+    main()
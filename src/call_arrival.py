@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 import simpy
 import numpy as np 
 import pandas as pd 
@@ -23,6 +25,18 @@ def call_arrival(env, count, time, incident_type_id, location, network, incident
     # Simulation Clock at incident arrival event.
     starting = env.now
 
+    # Row of the incident in the network's recorder, containing its simulated data.
+    ## Without recording (online statistics only), the dispatch is written in a small dict of the process instead:
+    ## each field is a single row (index 0), created on first use with the recorder's initial value.
+    if network.record:
+        if network.recorder is None:
+            network.generate_recorder(incident_type)
+        record = network.recorder.columns
+        row = network.recorder.add(count, time, incident_type_id, location, dact)
+    else:
+        record = defaultdict(lambda: [0])
+        row = 0
+
     # Dictionary containing the required vehicles based on incident type. 
     required_vehicles = incident_type[incident_type_id]
     
@@ -34,6 +48,11 @@ def call_arrival(env, count, time, incident_type_id, location, network, incident
         if value > 0 :
             # Iterate to find the required number of vehicles.
             for i in range(value):
+                # With k-nearest neighbor lists, the full lists of the zone are used once its k nearest stations are all busy.
+                zone = network.zones[str(location)]
+                if zone.truncated[key] and not any(network.stations[ind].availability[key]
+                                                   for ind in zone.nearest[f'nearest_st_{key}']+zone.nearest[f'nearest_nst_{key}']):
+                    zone.expand(key)
                 # First, search within standard travel time.
                 if bool(network.zones[str(location)].nearest[f'nearest_st_{key}']) & \
                     any([ network.stations[ind].availability[key] for ind in network.zones[str(location)].nearest[f'nearest_st_{key}']]):
@@ -45,18 +64,18 @@ def call_arrival(env, count, time, incident_type_id, location, network, incident
                         # Check if there are available vehicles.
                         if network.stations[j].availability[key] >0 :
                             # Store the travel time of the nearest available vehicle. 
-                            network.db[count][f'st_{key}_{i+1}'] = j
+                            record[f'st_{key}_{i+1}'][row] = j
                             if key == 't1':
-                                network.db[count][f'ftt_{key}_{i+1}'] = 0.9 * network.zones[str(location)].tt[j]            
+                                record[f'ftt_{key}_{i+1}'][row] = 0.9 * network.zones[str(location)].tt[j]
                             elif key == 't3':
-                                network.db[count][f'ftt_{key}_{i+1}'] = 1.01 * network.zones[str(location)].tt[j]
+                                record[f'ftt_{key}_{i+1}'][row] = 1.01 * network.zones[str(location)].tt[j]
                             else :   
-                                network.db[count][f'ftt_{key}_{i+1}'] = network.zones[str(location)].tt[j]
+                                record[f'ftt_{key}_{i+1}'][row] = network.zones[str(location)].tt[j]
                         
                             # Change the availability of vehicles in the chosen station.
                             network.stations[j].availability[key] = max(network.stations[j].availability[key]-1, 0)
                             # Store that this incident is responded within standard travel time.
-                            network.db[count][f'within_st_{key}']=True
+                            record[f'within_st_{key}'][row] = True
                             break
                 
                 # If there are no station within standard time search for staions beyond standard travel time. 
@@ -69,48 +88,59 @@ def call_arrival(env, count, time, incident_type_id, location, network, incident
                         # Check if there are available vehicles.
                         if network.stations[j].availability[key] > 0 :
                             # Store the travel time of the nearest available vehicle. 
-                            network.db[count][f'st_{key}_{i+1}'] = j
+                            record[f'st_{key}_{i+1}'][row] = j
                             if key == 't1':
-                                network.db[count][f'ftt_{key}_{i+1}'] = 0.9 * network.zones[str(location)].tt[j]            
+                                record[f'ftt_{key}_{i+1}'][row] = 0.9 * network.zones[str(location)].tt[j]
                             elif key == 't3':
-                                network.db[count][f'ftt_{key}_{i+1}'] = 1.01 * network.zones[str(location)].tt[j]
+                                record[f'ftt_{key}_{i+1}'][row] = 1.01 * network.zones[str(location)].tt[j]
                             else :   
-                                network.db[count][f'ftt_{key}_{i+1}'] = network.zones[str(location)].tt[j]
+                                record[f'ftt_{key}_{i+1}'][row] = network.zones[str(location)].tt[j]
                                 
                             # Change the availability of vehicles.
                             network.stations[j].availability[key] = max(network.stations[j].availability[key]-1, 0)
                             # Store that this incident is not responded within standard travel time.
-                            network.db[count][f'within_st_{key}']=False
+                            record[f'within_st_{key}'][row] = False
                             break
                 # Store the number of traversed stations before finding first available vehicles. 
-                network.db[count][f'traversed_station_{key}_{i+1}'] = num 
+                record[f'traversed_station_{key}_{i+1}'][row] = num
                 
     
     # Storing the travel time of each vehicles.
     ## Storing this data allows us to return each vehicle to their stations based on their specific travel time. 
-    network.db[count]['arrivals'] = []
+    ## These lists are only needed until the vehicles return, so they are kept in the process instead of the recorder.
+    arrivals = []
     for key,value in required_vehicles.items():
         for i in range(value):
-            network.db[count]['arrivals'].append(network.db[count][f'ftt_{key}_{i+1}'])
+            arrivals.append(record[f'ftt_{key}_{i+1}'][row])
     # Sorting the travel time allows us to schedule the vehicles' return in a corret order. 
-    network.db[count]['arrivals'].sort()
-    # Create dictonary of {travel time : st_key_value}  
-    network.db[count]['arrival_dict'] = {}
-    for arr in network.db[count]['arrivals']:
-        for key,value in required_vehicles.items():
-            for i in range(value):
-                if network.db[count][f'ftt_{key}_{i+1}'] == arr:
-                    network.db[count]['arrival_dict'][arr] = (network.db[count][f'st_{key}_{i+1}'],key)
+    arrivals.sort()
+    # Create dictonary of {travel time : [(st, key), ...]}
+    ## Vehicles with equal travel times (e.g. all vehicles sent from the incident's own zone) share a key, so each one is kept.
+    arrival_dict = {}
+    for key,value in required_vehicles.items():
+        for i in range(value):
+            arrival_dict.setdefault(record[f'ftt_{key}_{i+1}'][row], []).append(
+                (int(record[f'st_{key}_{i+1}'][row]),key))
     # Compute time difference between traveling time of required vehicles for invcident.
     ## The list is created from sorted travel time list.
-    network.db[count]['int_arr'] = [network.db[count]['arrivals'][i+1]-network.db[count]['arrivals'][i] for i in range(len(network.db[count]['arrivals'])-1)]
+    int_arr = [arrivals[i+1]-arrivals[i] for i in range(len(arrivals)-1)]
     
     # Find the maximum travel time of the required vehicles for scheduling the service event. 
-    network.db[count]['max_arrivals'] = np.max(network.db[count]['arrivals'])
+    record['max_arrivals'][row] = np.max(arrivals)
+    # Update the online statistics (if any) with the dispatched incident.
+    statistics = network.statistics
+    if statistics is not None:
+        slots = [f'{key}_{i+1}' for key,value in required_vehicles.items() for i in range(value)]
+        statistics.add(time, incident_type_id, location, [record[f'ftt_{t}'][row] for t in slots],
+                       [record[f'traversed_station_{t}'][row] for t in slots])
     
     ### `EVENT-2`: Vehicles' Arrival Event.
-    yield env.timeout(network.db[count]['max_arrivals'])
-    network.db[count]['all_arriving_time'] = env.now 
+    yield env.timeout(record['max_arrivals'][row])
+    arriving = env.now
+    if network.record:
+        # The recorder may have grown.
+        record = network.recorder.columns
+    record['all_arriving_time'][row] = arriving
 
     ### `Event-3`: Servie Event.
     yield env.timeout(dact)
@@ -118,22 +148,29 @@ def call_arrival(env, count, time, incident_type_id, location, network, incident
 
     ### `Event-4`: Vehicles' Return Event 
     # Send back first vehicle to thier station based on their travel time. 
-    first_vehicle_arriving = network.db[count]['arrivals'][0]
-    first_arriving_station, type_vehic = network.db[count]['arrival_dict'][first_vehicle_arriving]
+    first_vehicle_arriving = arrivals[0]
+    first_arriving_station, type_vehic = arrival_dict[first_vehicle_arriving].pop(0)
     # First vehicle arrivng at its station
     yield env.timeout(first_vehicle_arriving)
     # Change the availability of the first vehicle in its station
     network.stations[first_arriving_station].availability[type_vehic] = min(network.stations[first_arriving_station].availability[type_vehic]+1,
                                                                             network.stations[first_arriving_station].vehicles[type_vehic])
+    if statistics is not None:
+        statistics.vehicle_return(statistics.position[first_arriving_station], type_vehic, time,
+                                  arriving-time+dact+first_vehicle_arriving)
     # Send back other vehicles to their stations based on their travel time.
-    for intarr,j in zip(network.db[count]['int_arr'],range(len(network.db[count]['int_arr']))):
-        tt = network.db[count]['arrivals'][j+1]
-        st,t_vehic = network.db[count]['arrival_dict'][tt]
+    for intarr,j in zip(int_arr,range(len(int_arr))):
+        tt = arrivals[j+1]
+        st,t_vehic = arrival_dict[tt].pop(0)
         # Other vehicle arrivng at its station
         yield env.timeout(intarr)
         # Change the availability of the first vehicle in its station
         network.stations[st].availability[t_vehic] = min(network.stations[st].availability[t_vehic]+1,
                                                          network.stations[st].vehicles[t_vehic])
+        if statistics is not None:
+            statistics.vehicle_return(statistics.position[st], t_vehic, time, arriving-time+dact+tt)
     
     # Store the time all vehicles are returned. 
-    network.db[count]['all_returning_time'] = env.now 
\ No newline at end of file
+    if network.record:
+        record = network.recorder.columns
+    record['all_returning_time'][row] = env.now
\ No newline at end of file
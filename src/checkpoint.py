@@ -0,0 +1,139 @@
+import os
+import copy
+import pickle
+import itertools
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from event_calendar import EventCalendar
+
+
+# Checkpoints of a simulation run in the event calendar, to resume long runs or branch scenarios from a shared state.
+## 1. A checkpoint holds the whole simulation state of an `EventCalendar` run:
+###    the clock and pending events (incident arrival, services with their remaining vehicle returns), as plain records,
+###    the number of incidents taken from the incident stream,
+###    the dispatch engine's station availability and the current period of the OD schedule (if any),
+###    the recorded rows of simulated data, and the online statistics (if any).
+## 2. Inputs (OD matrix, resource configuration, incident stream) are not stored: a run is resumed in a new network built
+##    from the same inputs, and the incident stream continues after the incidents already taken from it.
+## 3. SimPy runs keep their pending events inside suspended generators, which cannot be serialized,
+##    so checkpoints are taken from runs in the event calendar (`engine='calendar'`), whose simulated data is identical.
+## 4. `run_with_checkpoints` runs in chunks of simulated time and saves a checkpoint after each one;
+##    if the checkpoint file exists, the run resumes from it (e.g. after an interruption).
+## Example: run a warm-up with `calendar.run(incident, network, incident_type, until=warm_up)`, save it with `save_checkpoint`,
+## and `resume` it in several networks (e.g. with different `ODSchedule`s) without re-simulating the warm-up.
+
+
+# Simulation state of a run.
+Checkpoint = namedtuple('Checkpoint',
+                        ['now', 'seq', 'events', 'consumed', 'calendar', 'station_ids', 'vehicles', 'availability',
+                         'period', 'period_end', 'recorder', 'statistics'])
+
+
+def checkpoint(calendar, network):
+    """
+    Simulation state of an event calendar run and its network.
+    """
+    recorder = network.recorder
+    if recorder is not None:
+        size = recorder.size
+        recorder = {'num':recorder.num[:size].copy(),
+                    'columns':{field:column[:size].copy() for field,column in recorder.columns.items()}}
+    # The scheduling order continues from the next number of the counter; taking it does not change the order of the run.
+    seq = next(calendar.seq)
+    calendar.seq = itertools.count(seq+1)
+    engine = network.dispatcher
+    # Pending services are lists updated in place by the run, so they are copied with the calendar.
+    return Checkpoint(calendar.now, seq+1, calendar.events, calendar.consumed, copy.deepcopy(calendar.calendar),
+                      engine.station_ids.copy(), engine.vehicles.copy(), engine.availability.copy(),
+                      network.period, network.period_end, recorder, copy.deepcopy(network.statistics))
+
+
+def save_checkpoint(path, calendar, network):
+    """
+    Writing the simulation state of a run to a file.
+    """
+    state = checkpoint(calendar, network)
+    # Written through a temporary file, so an interruption while writing does not corrupt the previous checkpoint.
+    temp = f'{path}.{os.getpid()}.tmp'
+    with open(temp, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp, path)
+    return state
+
+
+def load_checkpoint(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def resume(state, incident, network, incident_type, skip=True):
+    """
+    Restoring a simulation state in a new network, built from the same inputs as the checkpointed one,
+    and returning its event calendar; the run continues with `calendar.run()`.
+    `incident` is the whole incident database (or stream) of the run, and the incidents already taken are skipped;
+    with `skip=False`, it only holds the incidents after the pending arrival (e.g. a different continuation of a warm-up).
+    """
+    if isinstance(state, str):
+        state = load_checkpoint(state)
+    if network.dispatcher is None:
+        network.generate_dispatcher()
+    engine = network.dispatcher
+    if not (np.array_equal(engine.station_ids, state.station_ids) and np.array_equal(engine.vehicles, state.vehicles)):
+        raise ValueError('The network does not have the stations and vehicles of the checkpointed run.')
+    # In place, since the dispatch engines of all periods of an OD schedule share the availability array.
+    engine.set_availability(state.availability)
+    if state.period is not None:
+        network.set_period(state.period)
+    network.period_end = state.period_end
+
+    if state.recorder is not None:
+        network.generate_recorder(incident_type)
+        recorder = network.recorder
+        size = len(state.recorder['num'])
+        if size > len(recorder.num):
+            recorder.grow(size)
+        recorder.num[:size] = state.recorder['num']
+        for field,column in state.recorder['columns'].items():
+            recorder.columns[field][:size] = column
+        recorder.size = size
+
+    if state.statistics is not None:
+        network.statistics = copy.deepcopy(state.statistics)
+        network.record = state.recorder is not None
+
+    if skip:
+        if isinstance(incident, pd.DataFrame):
+            # Incidents are taken in the order of their id (see `incident_records`), not in the order of the rows.
+            incident = incident.sort_index().iloc[state.consumed:]
+        else:
+            incident = itertools.islice(incident, state.consumed, None)
+    calendar = EventCalendar()
+    network.env = calendar
+    calendar.now = state.now
+    calendar.seq = itertools.count(state.seq)
+    calendar.events = state.events
+    # A checkpoint can be resumed several times (e.g. branching scenarios), so its services are not shared with the run.
+    calendar.calendar = copy.deepcopy(state.calendar)
+    calendar.start(incident, network, incident_type, schedule=False)
+    calendar.consumed = state.consumed
+    return calendar
+
+
+def run_with_checkpoints(path, interval, incident, network, incident_type):
+    """
+    Running a simulation in the event calendar in chunks of `interval` simulated seconds, saving a checkpoint after each one.
+    If `path` exists, the run resumes from it in `network` (built from the same inputs). Returns the event calendar.
+    """
+    if os.path.exists(path):
+        calendar = resume(path, incident, network, incident_type)
+    else:
+        calendar = network.env if isinstance(network.env, EventCalendar) else EventCalendar()
+        network.env = calendar
+        calendar.start(incident, network, incident_type)
+    while calendar.calendar:
+        calendar.run(until=calendar.now+interval)
+        save_checkpoint(path, calendar, network)
+    return calendar
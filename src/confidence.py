@@ -0,0 +1,22 @@
+# Quantiles of confidence intervals, shared by the replication controller and the aggregation of experiment results.
+## It has no dependencies, so the output helpers can use it without importing the simulation modules.
+
+
+# Two-sided Student t quantiles for degrees of freedom 1..30 (above 30 the normal quantile is used).
+T_QUANTILE = {
+    0.90:[6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812, 1.796, 1.782, 1.771, 1.761, 1.753,
+          1.746, 1.740, 1.734, 1.729, 1.725, 1.721, 1.717, 1.714, 1.711, 1.708, 1.706, 1.703, 1.701, 1.699, 1.697],
+    0.95:[12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145, 2.131,
+          2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042],
+    0.99:[63.657, 9.925, 5.841, 4.604, 4.032, 3.707, 3.499, 3.355, 3.250, 3.169, 3.106, 3.055, 3.012, 2.977, 2.947,
+          2.921, 2.898, 2.878, 2.861, 2.845, 2.831, 2.819, 2.807, 2.797, 2.787, 2.779, 2.771, 2.763, 2.756, 2.750]}
+Z_QUANTILE = {0.90:1.645, 0.95:1.960, 0.99:2.576}
+
+
+def t_quantile(n, confidence=0.95):
+    """
+    Student t quantile of the confidence interval of the mean of `n` values.
+    """
+    if confidence not in T_QUANTILE:
+        raise ValueError(f'Unsupported confidence level {confidence}, expected one of {sorted(T_QUANTILE)}.')
+    return T_QUANTILE[confidence][n-2] if n <= 31 else Z_QUANTILE[confidence]
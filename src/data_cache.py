@@ -0,0 +1,90 @@
+import os
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from incident_source import Incident, load_incident_array
+
+
+# Cached loading of the simulation's input files.
+## 1. The first time an OD matrix, resource configuration, or arrival file is loaded, it is parsed and saved as `.npy` files.
+## 2. The cached files are stored in a `.cache` directory next to the source file and keyed by the hash of its content,
+##    so editing the source file creates a new cache entry.
+## 3. Cached OD matrices are opened as memory maps: repeated replications and worker processes open them in near-zero time
+##    and share the same pages instead of each holding its own copy.
+## The loaders return the same dataframes as parsing the csv files, except that the OD matrix has no `zone` column.
+
+
+def file_hash(path):
+    """
+    Computing the hash of a file's content.
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def cache_path(path, suffix, cache_dir=None):
+    """
+    Path of a cached file of `path`, keyed by its content.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path), '.cache')
+    os.makedirs(cache_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, f'{name}-{file_hash(path)}-{suffix}.npy')
+
+
+def save_array(path, array):
+    """
+    Saving an array through a temporary file, so that other processes never open a partially written cache.
+    """
+    temp = f'{path}.{os.getpid()}.tmp'
+    with open(temp, 'wb') as f:
+        np.save(f, array)
+    os.replace(temp, path)
+
+
+def load_od(path, cache_dir=None, mmap=True):
+    """
+    Loading an OD matrix as a dataframe of travel times (nodes x zones), with zone ids as column names.
+    """
+    matrix_path = cache_path(path, 'od', cache_dir)
+    label_path = matrix_path.replace('-od.npy', '-od_zones.npy')
+    if not (os.path.exists(matrix_path) and os.path.exists(label_path)):
+        od = pd.read_csv(path, dtype={'zone': np.str_}).drop(columns='zone')
+        save_array(label_path, od.columns.to_numpy(dtype=np.str_))
+        save_array(matrix_path, np.ascontiguousarray(od.to_numpy()))
+    matrix = np.load(matrix_path, mmap_mode='r' if mmap else None)
+    return pd.DataFrame(matrix, columns=np.load(label_path).tolist(), copy=False)
+
+
+def load_configuration(path, cache_dir=None):
+    """
+    Loading a resource configuration file.
+    """
+    config_path = cache_path(path, 'config', cache_dir)
+    if not os.path.exists(config_path):
+        loc = pd.read_csv(path, dtype={'zone': np.str_})
+        array = np.empty(len(loc), dtype=[('zone', np.str_, max(loc['zone'].str.len().max(), 1))]+
+                                          [(col, np.int64) for col in loc.columns[1:]])
+        for col in loc.columns:
+            array[col] = loc[col].to_numpy()
+        save_array(config_path, array)
+    array = np.load(config_path)
+    return pd.DataFrame({col:array[col] for col in array.dtype.names}).astype({'zone':object})
+
+
+def load_arrivals(path, cache_dir=None):
+    """
+    Loading an incident realization (arrival) file, indexed by incident id.
+    """
+    arrival_path = cache_path(path, 'arrival', cache_dir)
+    if not os.path.exists(arrival_path):
+        save_array(arrival_path, load_incident_array(path))
+    array = np.load(arrival_path)
+    return pd.DataFrame({field:array[field] for field in Incident._fields[1:]},
+                        index=pd.Index(array['num'], name='num'))
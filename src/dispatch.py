@@ -0,0 +1,254 @@
+from operator import itemgetter
+
+import numpy as np
+
+
+# Dispatch engine is an array-backed alternative to the dictionary lookups done by `call_arrival`.
+## 1. Station availability is kept in a NumPy integer array (stations x vehicle types).
+## 2. Neighbor lists of each zone are stored as integer arrays of station positions in that array.
+## 3. The first available station of a neighbor list is found with a vectorized scan.
+## 4. An availability index is updated at each dispatch and return: a mask of the stations with free vehicles of each type,
+##    and their number. Beyond standard travel time, the nearest free station is the free station with the lowest rank
+##    in the zone's order (a zones x stations rank matrix), so the cost does not grow with the busy stations to skip,
+##    and a search for a vehicle type without any free vehicle returns at once.
+## The assignments are identical to `call_arrival`: within standard list first, then beyond standard list.
+## With k-nearest neighbor lists (`Network.generate_zone(k=...)`), the rank matrix covers every station of each type,
+## so stations beyond the k nearest ones are found by the same search.
+
+
+# Vehicle types in the column order of the availability array.
+VEHICLE_TYPES = ('t1', 't2', 't3')
+# Vehicles (type and number) sent to each type of incident; e.g. `t2_2` is the second type-2 vehicle.
+VEHICLE_SLOTS = {1:['t1_1','t2_1'],
+                 2:['t1_1','t2_1','t2_2'],
+                 3:['t1_1','t2_1','t2_2','t3_1']}
+# Travel time factor of each vehicle type relative to the OD matrix.
+SPEED_FACTOR = {'t1':0.9, 't2':1.0, 't3':1.01}
+
+
+class DispatchEngine:
+
+    def __init__(self, station_ids, vehicles, tt_matrix, nearest_index, zone_num):
+        """
+        `station_ids` are the node ids of stations, `vehicles` their number of vehicles of each type (stations x vehicle types),
+        `tt_matrix` the (nodes x zones) travel time matrix, and `nearest_index` the sorted station ids of each zone (see `zone.sort_nearest`).
+        """
+        # Zone id (row of resource configuration) of each station, and its position in the arrays.
+        self.station_ids = np.asarray(station_ids, dtype=np.int64)
+        self.position = {st:k for k,st in enumerate(self.station_ids.tolist())}
+        self.type_col = {key:c for c,key in enumerate(VEHICLE_TYPES)}
+
+        # Vehicle slots of each incident type with their recorder fields (see `slot_fields`), filled by `assign_vehicles`.
+        self.slots = {}
+
+        # Number of vehicles and available vehicles of each type in each station.
+        self.vehicles = np.array(vehicles, dtype=np.int64).reshape(-1, len(VEHICLE_TYPES))
+        self.availability = self.vehicles.copy()
+        # Availability index: stations with free vehicles of each type (vehicle types x stations), and their number.
+        self.free = np.ascontiguousarray((self.availability > 0).T)
+        self.n_free = self.free.sum(axis=1)
+
+        # Travel time from each station to each zone (row 0 is unused since zone ids start from 1).
+        self.tt = np.zeros((zone_num+1, len(self.station_ids)))
+        self.tt[1:] = tt_matrix[self.station_ids].T
+        # Neighbor lists as arrays of station positions, indexed by zone id.
+        self.nearest_st = {key:[None]*(zone_num+1) for key in VEHICLE_TYPES}
+        self.nearest_nst = {key:[None]*(zone_num+1) for key in VEHICLE_TYPES}
+        lookup = np.zeros(tt_matrix.shape[0], dtype=np.int64)
+        lookup[self.station_ids] = np.arange(len(self.station_ids))
+        # Number of stations within and beyond standard travel time of each zone, positions of all stations of each type,
+        # and rank of every station in each zone's order (stations without the vehicle type have the last rank).
+        self.n_within = {}
+        self.n_beyond = {}
+        self.truncated = {}
+        self.type_positions = {}
+        self.rank = {}
+        for c,key in enumerate(VEHICLE_TYPES):
+            sorted_ids, n_within = nearest_index[key]
+            positions = lookup[sorted_ids]
+            for i in range(1, zone_num+1):
+                self.nearest_st[key][i] = positions[i-1,:n_within[i-1]]
+                self.nearest_nst[key][i] = positions[i-1,n_within[i-1]:]
+            self.n_within[key] = np.asarray(n_within)
+            self.type_positions[key] = np.flatnonzero(self.vehicles[:, c] > 0)
+            self.truncated[key] = positions.shape[1] < len(self.type_positions[key])
+            self.n_beyond[key] = np.r_[0, len(self.type_positions[key])-self.n_within[key]]
+            # Stations sorted by travel time like `zone.sort_nearest` (ties in the order of the stations).
+            order = self.type_positions[key][np.argsort(self.tt[1:, self.type_positions[key]], axis=1, kind='stable')]
+            rank = np.full((zone_num+1, len(self.station_ids)), len(self.station_ids), dtype=np.int32)
+            np.put_along_axis(rank[1:], order, np.arange(order.shape[1], dtype=np.int32)[None, :], axis=1)
+            self.rank[key] = rank
+
+
+    def find(self, location, key):
+        """
+        Finding the nearest station with an available vehicle of type `key` for an incident in `location`.
+        Returns the station position (-1 if there is none), number of traversed stations, and whether it is within standard.
+        """
+        col = self.type_col[key]
+        # First, search within standard travel time.
+        nearest = self.nearest_st[key][location]
+        if len(nearest):
+            free = self.free[col, nearest]
+            k = free.argmax()
+            if free[k]:
+                return nearest[k], k+1, True
+        # If there are no available vehicles within standard time search for stations beyond standard travel time:
+        # the free station with the lowest rank, unless no station has a free vehicle of this type.
+        if self.n_free[col] == 0:
+            return -1, self.n_beyond[key][location], False
+        free = np.flatnonzero(self.free[col])
+        rank = self.rank[key][location, free]
+        k = rank.argmin()
+        n_within = self.n_within[key][location-1]
+        # Within standard travel time only with k-nearest neighbor lists, when the free station is beyond the k nearest ones.
+        if rank[k] < n_within:
+            return free[k], rank[k]+1, True
+        return free[k], rank[k]-n_within+1, False
+
+
+    def dispatch(self, pos, key):
+        """
+        Decreasing the availability of a vehicle in the chosen station.
+        """
+        col = self.type_col[key]
+        available = self.availability[pos, col]
+        if available > 0:
+            self.availability[pos, col] = available-1
+            if available == 1:
+                self.free[col, pos] = False
+                self.n_free[col] -= 1
+
+
+    def release(self, pos, key):
+        """
+        Increasing the availability of a vehicle returned to its station.
+        """
+        col = self.type_col[key]
+        available = self.availability[pos, col]
+        if available < self.vehicles[pos, col]:
+            self.availability[pos, col] = available+1
+            if available == 0:
+                self.free[col, pos] = True
+                self.n_free[col] += 1
+
+
+    def share_availability(self, engine):
+        """
+        Using the availability (and its index) of another engine of the same stations, e.g. of another period of an OD schedule.
+        """
+        self.availability = engine.availability
+        self.free = engine.free
+        self.n_free = engine.n_free
+
+
+    def set_availability(self, availability):
+        """
+        Setting the available vehicles of each station (e.g. from a checkpoint) and rebuilding the availability index in place.
+        """
+        self.availability[:] = availability
+        self.free[:] = (self.availability > 0).T
+        self.n_free[:] = self.free.sum(axis=1)
+
+
+
+def slot_fields(required_vehicles):
+    """
+    Vehicle slots of an incident type's required vehicles in dispatch order: vehicle type, speed factor,
+    and recorder fields of the station, travel time, within standard, and number of traversed stations.
+    """
+    return [(key, SPEED_FACTOR[key], f'st_{key}_{i+1}', f'ftt_{key}_{i+1}', f'within_st_{key}', f'traversed_station_{key}_{i+1}')
+            for key,value in required_vehicles.items() for i in range(value)]
+
+
+
+def assign_vehicles(network, count, time, incident_type_id, location, incident_type, dact):
+    """
+    Recording an incident and dispatching its vehicles from the nearest available stations (`EVENT-1` of `call_arrival`).
+    Returns the incident's row in the recorder (None when the network does not record incidents, see `Network.generate_statistics`)
+    and the (travel time, station position, vehicle type) of the assigned vehicles, sorted by travel time.
+    """
+    engine = network.dispatcher
+    statistics = network.statistics
+    # Row of the incident in the network's recorder, containing its simulated data.
+    if network.record:
+        if network.recorder is None:
+            network.generate_recorder(incident_type)
+        record = network.recorder.columns
+        row = network.recorder.add(count, time, incident_type_id, location, dact)
+    else:
+        record = row = None
+    # Travel time and number of traversed stations of each vehicle slot, passed to the online statistics.
+    travel = []
+    traversed = []
+    # Field names are built once per incident type instead of for every incident.
+    slots = engine.slots.get(incident_type_id)
+    if slots is None:
+        slots = engine.slots[incident_type_id] = slot_fields(incident_type[incident_type_id])
+    find = engine.find
+    tt = engine.tt
+
+    assigned = []
+    for key, speed, st_field, ftt_field, within_field, trvs_field in slots:
+        pos, num, within = find(location, key)
+        ftt = 0
+        if pos >= 0:
+            ftt = speed * tt[location, pos]
+            if record is not None:
+                record[st_field][row] = engine.station_ids[pos]
+                record[ftt_field][row] = ftt
+                record[within_field][row] = within
+            engine.dispatch(pos, key)
+            assigned.append((ftt, pos, key))
+        # Store the number of traversed stations before finding first available vehicles.
+        if record is not None:
+            record[trvs_field][row] = num
+        if statistics is not None:
+            travel.append(ftt)
+            traversed.append(num)
+
+    if not assigned:
+        raise RuntimeError(f'No vehicle is available for incident {count} at {time}; '
+                           'simulate overloaded scenarios with the pending-incident queues of `surge.SurgeSimulation`.')
+    # Sorting the travel time allows us to schedule the vehicles' return in a correct order.
+    assigned.sort(key=itemgetter(0))
+    if record is not None:
+        record['max_arrivals'][row] = assigned[-1][0]
+    if statistics is not None:
+        statistics.add(time, incident_type_id, location, travel, traversed)
+    return row, assigned
+
+
+
+def dispatch_arrival(env, count, time, incident_type_id, location, network, incident_type, dact):
+    """
+    Modeling the steps each incidents goes through using the network's dispatch engine.
+    It records the same simulated data as `call_arrival`.
+    """
+    ### `EVENT-1` : Incident Arrival Event
+    row, assigned = assign_vehicles(network, count, time, incident_type_id, location, incident_type, dact)
+    statistics = network.statistics
+
+    ### `EVENT-2`: Vehicles' Arrival Event.
+    yield env.timeout(assigned[-1][0])
+    arriving = env.now
+    if row is not None:
+        network.recorder.columns['all_arriving_time'][row] = arriving
+
+    ### `Event-3`: Service Event.
+    yield env.timeout(dact)
+
+    ### `Event-4`: Vehicles' Return Event
+    # Send back vehicles to their stations based on their travel time.
+    previous = 0
+    for j,(ftt, pos, key) in enumerate(assigned):
+        yield env.timeout(ftt if j == 0 else ftt-previous)
+        network.dispatcher.release(pos, key)
+        if statistics is not None:
+            # Busy time: time to the start of the service, service time, and travel time back to the station.
+            statistics.vehicle_return(pos, key, time, arriving-time+dact+ftt)
+        previous = ftt
+
+    # Store the time all vehicles are returned.
+    if row is not None:
+        network.recorder.columns['all_returning_time'][row] = env.now
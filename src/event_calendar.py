@@ -0,0 +1,148 @@
+import heapq
+import itertools
+from collections import namedtuple
+
+import pandas as pd
+
+from dispatch import assign_vehicles
+from incident_source import incident_records
+
+
+# Event calendar is a lightweight alternative to running `incident_process` and `dispatch_arrival` in SimPy.
+## 1. Instead of a SimPy process (generator) per incident, every event is a plain record in a single `heapq` calendar.
+## 2. Events are ordered by time and then by scheduling order, like SimPy's queue, so simultaneous events are processed
+##    in the same order and the simulated data is identical to the SimPy path (which is kept as the reference).
+## 3. Event types follow the steps of `call_arrival`:
+###    `INCIDENT_ARRIVAL`: the next incident is scheduled, and the vehicles of this one are dispatched (`EVENT-1`).
+###    `VEHICLE_RETURN`: a vehicle returned to its station (`Event-4`), and the next one (if any) is scheduled.
+###    The arrival of all vehicles (`EVENT-2`) and the end of the service (`Event-3`) are known at dispatch, so they are not events
+###    of the calendar: the first vehicle return is scheduled at dispatch, and the service start time is stored when it occurs.
+###    `SERVICE_START` and `SERVICE_END` are kept for the other calendars (`what_if`, `surge`).
+## The calendar is used as the network's environment: it has the simulation clock (`now`) like `simpy.Environment`.
+## A run can be stopped at a simulation time and continued, and its state saved and resumed in another process (see `checkpoint`).
+
+
+# Event types.
+INCIDENT_ARRIVAL, SERVICE_START, SERVICE_END, VEHICLE_RETURN = range(4)
+
+# Event record of the calendar; `seq` is the scheduling order, which breaks ties between simultaneous events.
+Event = namedtuple('Event', ['time', 'seq', 'kind', 'data'])
+
+# Simulation state of an incident in service, kept in a list:
+# [recorder row (None without recording), service time, assigned vehicles, number of returned vehicles, incident time, service start time].
+## The first return time is computed like SimPy's timeouts (`now+delay` at each step), so the clock is identical; it is scheduled
+## earlier than in SimPy, which only changes the order of events at exactly the same time (not observed with continuous times).
+
+
+class EventCalendar:
+
+    def __init__(self):
+        self.now = 0
+        self.calendar = []
+        self.seq = itertools.count()
+        self.events = 0
+        # Heap insertion of the calendar, replaced when the calendar is instrumented (see `Instrumentation.attach`).
+        self.push = heapq.heappush
+        # Incident stream of the run, number of incidents taken from it, and the simulated network (see `start`).
+        self.incident = None
+        self.consumed = 0
+        self.network = None
+        self.incident_type = None
+
+
+    def schedule(self, delay, kind, data):
+        """
+        Scheduling an event `delay` seconds from now.
+        """
+        self.push(self.calendar, Event(self.now+delay, next(self.seq), kind, data))
+
+
+    def start(self, incident, network, incident_type, schedule=True):
+        """
+        Setting the incident database (or iterable of incident records in occurrence order) and network of the run.
+        The first incident is scheduled at its inter-arrival time, unless `schedule` is False (e.g. when resuming from a checkpoint).
+        """
+        if isinstance(incident, pd.DataFrame):
+            incident = incident_records(incident)
+        self.incident = iter(incident)
+        self.network = network
+        self.incident_type = incident_type
+        if schedule:
+            first = next(self.incident, None)
+            if first is not None:
+                self.consumed += 1
+                self.schedule(first.arint, INCIDENT_ARRIVAL, first)
+
+
+    def run(self, incident=None, network=None, incident_type=None, until=None):
+        """
+        Simulating an incident database (or iterable of incident records in occurrence order) in the network,
+        like `env.process(incident_process(env, incident, network, incident_type, arrival=dispatch_arrival)); env.run()`.
+        Without `incident`, the run set by `start` (or restored from a checkpoint) continues.
+        With `until`, only events before that time are processed, like `env.run(until)`, and the run can be continued later
+        (or saved with `checkpoint.save_checkpoint`).
+        """
+        if incident is not None:
+            self.start(incident, network, incident_type)
+        incident = self.incident
+        network = self.network
+        incident_type = self.incident_type
+        # The dispatch engines of all periods of an OD schedule share their availability, so any of them can release vehicles.
+        release = network.dispatcher.release
+        statistics = network.statistics
+        calendar = self.calendar
+        seq = self.seq
+        push = self.push
+        pop = heapq.heappop
+        record = None if network.recorder is None else network.recorder.columns
+        consumed = self.consumed
+        until = float('inf') if until is None else until
+
+        # Events are pushed as plain tuples in the layout of `Event`, and services are updated in place, which is faster in the loop.
+        while calendar:
+            if calendar[0][0] >= until:
+                break
+            now, _, kind, data = pop(calendar)
+            self.now = now
+            self.events += 1
+
+            if kind == INCIDENT_ARRIVAL:
+                # Like `incident_process`, the next incident is scheduled before this one's vehicles are dispatched.
+                following = next(incident, None)
+                if following is not None:
+                    consumed += 1
+                    push(calendar, (now+following.arint, next(seq), INCIDENT_ARRIVAL, following))
+                # Switching the OD matrix at period boundaries of the network's OD schedule (if any).
+                if now >= network.period_end:
+                    network.update_period(now)
+                count, inc_time, arint, inc_type, location, dact = data
+                row, assigned = assign_vehicles(network, count, inc_time, inc_type, location, incident_type, dact)
+                if row is not None:
+                    # The recorder may have grown.
+                    record = network.recorder.columns
+                # All vehicles arrive at the start of the service, and the first one returns after the service.
+                arriving = now+assigned[-1][0]
+                push(calendar, (arriving+dact+assigned[0][0], next(seq), VEHICLE_RETURN,
+                                [row, dact, assigned, 0, inc_time, arriving]))
+
+            else:
+                row, dact, assigned, returned, inc_time, arriving = data
+                ftt, pos, key = assigned[returned]
+                if returned == 0 and row is not None:
+                    record['all_arriving_time'][row] = arriving
+                release(pos, key)
+                if statistics is not None:
+                    statistics.vehicle_return(pos, key, inc_time, arriving-inc_time+dact+ftt)
+                returned += 1
+                if returned < len(assigned):
+                    # Vehicles return in the order of their travel time.
+                    data[3] = returned
+                    push(calendar, (now+(assigned[returned][0]-ftt), next(seq), VEHICLE_RETURN, data))
+                elif row is not None:
+                    # Store the time all vehicles are returned.
+                    record['all_returning_time'][row] = now
+
+        self.consumed = consumed
+        # The clock stops at `until` if events remain, and at the last event otherwise.
+        if calendar:
+            self.now = until
@@ -1,56 +1,165 @@
+import os
+import warnings
+
 import numpy as np
 import pandas as pd 
 import matplotlib.pyplot as plt 
 import geopandas as gpd 
+from matplotlib.path import Path
+from matplotlib.figure import Figure
+from matplotlib.collections import PolyCollection
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 
+from confidence import t_quantile
 
-def process_data(result, fields, param):
+
+# Aggregation of the performance parameters of many replications.
+## 1. `ReplicationAggregator` consumes the runs of a configuration one at a time into preallocated (zones or stations x replications)
+##    arrays per field, so only the tables of the current run are held besides the arrays (e.g. `StoredRun` handles of `result_sink`).
+## 2. Run objects are only read, never modified.
+## 3. `summary` computes the mean, standard deviation, confidence interval, and quantiles of every row in one vectorized pass.
+
+# Tables and columns of each performance parameter, as {field : (table, columns)}.
+## The travel time of an incident type is the average over its required vehicles' columns (in minutes).
+PARAMS = {
+    'utilization': {},
+    'coverage': {'cov_e1':('zonal_db_e1', ['cov_e1']), 'cov_e2':('zonal_db_e2', ['cov_e2']), 'cov_e3':('zonal_db_e3', ['cov_e3'])},
+    'traversal': {'e1_trvs':('zonal_db_e1', ['e1_trvs']), 'e2_trvs':('zonal_db_e2', ['e2_trvs']), 'e3_trvs':('zonal_db_e3', ['e3_trvs'])},
+    'travel_time_incident': {'tt_e1':('zonal_db_e1', ['e1_t1_1_mt', 'e1_t2_1_mt']),
+                             'tt_e2':('zonal_db_e2', ['e2_t1_1_mt', 'e2_t2_1_mt', 'e2_t2_2_mt']),
+                             'tt_e3':('zonal_db_e3', ['e3_t1_1_mt', 'e3_t2_1_mt', 'e3_t2_2_mt', 'e3_t3_1_mt'])},
+}
+
+
+def run_values(run, fields, param):
     """
-    Generating datasets containing performance parameters in a common format for different replications.
+    Performance parameters of one run, as {field : series}.
     """
-    # Generate emepty output
-    data = {config:{field:None for field in fields} for config in result.keys()}
-    # Iterate through different configurations
+    if param == 'utilization':
+        # Read once per run, since stored runs (see `result_sink`) read their tables when accessed.
+        station_util_db = run.station_util_db
+        return {field:pd.to_numeric(station_util_db[field].replace('Not Defined', 0)) for field in fields}
+
+    values = {}
+    tables = {}
+    for field in fields:
+        table, columns = PARAMS[param][field]
+        if table not in tables:
+            tables[table] = getattr(run, table)
+        df = tables[table]
+        if param == 'travel_time_incident':
+            values[field] = df[columns].mean(axis=1)/60
+        else:
+            values[field] = df[columns[0]]
+    return values
+
+
+
+class ReplicationAggregator:
+
+    def __init__(self, fields, capacity=32):
+        """
+        `fields` are the performance parameters to aggregate; `capacity` the initial number of replications of the arrays.
+        """
+        self.fields = list(fields)
+        self.capacity = capacity
+        self.index = None
+        self.arrays = None
+        self.size = 0
+
+
+    def add(self, values):
+        """
+        Adding the performance parameters of one run ({field : series}) as a new replication column.
+        The rows are those of the first run; rows missing in a later run are stored as missing values.
+        """
+        if self.index is None:
+            self.index = values[self.fields[0]].index
+            self.arrays = {field:np.full((len(self.index), self.capacity), np.nan) for field in self.fields}
+        if self.size == self.capacity:
+            self.capacity *= 2
+            for field in self.fields:
+                grown = np.full((len(self.index), self.capacity), np.nan)
+                grown[:, :self.size] = self.arrays[field][:, :self.size]
+                self.arrays[field] = grown
+        for field in self.fields:
+            series = values[field]
+            if not series.index.equals(self.index):
+                series = series.reindex(self.index)
+            self.arrays[field][:, self.size] = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        self.size += 1
+
+
+    def values(self, field):
+        """
+        (rows x replications) array of a field.
+        """
+        return self.arrays[field][:, :self.size]
+
+
+    def frame(self, field):
+        """
+        Dataframe of a field with one column per replication, in the format `box_plots` and `plot_zonal_results` use.
+        """
+        return pd.DataFrame(self.values(field), index=self.index, columns=[field]*self.size)
+
+
+    def summary(self, field, confidence=0.95, quantiles=(0.05, 0.5, 0.95)):
+        """
+        Mean, standard deviation, confidence interval of the mean, and quantiles of a field over the replications, for every row.
+        """
+        values = self.values(field)
+        n = np.sum(~np.isnan(values), axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+            # Rows without any value (or a single one) give missing statistics.
+            warnings.simplefilter('ignore', RuntimeWarning)
+            mean = np.nanmean(values, axis=1)
+            std = np.nanstd(values, axis=1, ddof=1)
+            t = np.array([t_quantile(k, confidence) if k > 1 else np.inf for k in range(self.size+1)])[n]
+            half_width = t*std/np.sqrt(n)
+            q = np.nanquantile(values, quantiles, axis=1)
+        df = pd.DataFrame({'replications':n, 'mean':mean, 'std':std, 'half_width':half_width,
+                           'ci_low':mean-half_width, 'ci_high':mean+half_width}, index=self.index)
+        for quantile, row in zip(quantiles, q):
+            df[f'q{quantile:g}'] = row
+        return df
+
+
+
+def aggregate(result, fields, param, capacity=32):
+    """
+    Aggregating the runs of every configuration, as a dictionary of {configuration name : `ReplicationAggregator`}.
+    """
+    aggregated = {}
     for key in result.keys():
-        # Generate dictionary to extrac inforamtion from different runs. 
-        dicted_data = {field:[] for field in fields}
-        
-        # Processing utilization data
-        if param == 'utilization':
-            for runs in result[key]:
-                runs.station_util_db.replace('Not Defined', 0, inplace=True)
-                # run once
-                #runs.station_util_db = runs.station_util_db*200
-                for field in dicted_data.keys():
-                    dicted_data[field].append(runs.station_util_db[field])
-                    
-        # Processing coverage data
-        if param == 'coverage':
-            for runs in result[key]:
-                dicted_data['cov_e1'].append(runs.zonal_db_e1.cov_e1)
-                dicted_data['cov_e2'].append(runs.zonal_db_e2.cov_e2)
-                dicted_data['cov_e3'].append(runs.zonal_db_e3.cov_e3)
-        
-        # Process traversal data
-        if param == 'traversal':
-            for runs in result[key]:
-                dicted_data['e1_trvs'].append(runs.zonal_db_e1.e1_trvs)
-                dicted_data['e2_trvs'].append(runs.zonal_db_e2.e2_trvs)
-                dicted_data['e3_trvs'].append(runs.zonal_db_e3.e3_trvs)
-        
-        # Processing travel time data.
-        if param =='travel_time_incident':
-            for runs in result[key]:
-                dicted_data['tt_e1'].append((runs.zonal_db_e1[['e1_t1_1_mt', 'e1_t2_1_mt']].mean(axis=1))/60)
-                dicted_data['tt_e2'].append((runs.zonal_db_e2[['e2_t1_1_mt', 'e2_t2_1_mt', 'e2_t2_2_mt']].mean(axis=1))/60)
-                dicted_data['tt_e3'].append((runs.zonal_db_e3[['e3_t1_1_mt', 'e3_t2_1_mt', 'e3_t2_2_mt', 'e3_t3_1_mt']].mean(axis=1))/60)
-        
-        for field in fields:       
-            data[key][field] = pd.concat(dicted_data[field], axis=1)
+        aggregator = ReplicationAggregator(fields, capacity)
+        for run in result[key]:
+            aggregator.add(run_values(run, fields, param))
+        aggregated[key] = aggregator
+    return aggregated
 
-    return data
+
+def process_data(result, fields, param):
+    """
+    Generating datasets containing performance parameters in a common format for different replications.
+    """
+    aggregated = aggregate(result, fields, param)
+    return {key:{field:aggregator.frame(field) for field in fields} for key,aggregator in aggregated.items()}
 
 
+def summary_statistics(result, fields, param, confidence=0.95, quantiles=(0.05, 0.5, 0.95)):
+    """
+    Summary statistics of the performance parameters over the replications of each configuration, in a long format
+    (one row per configuration, field, and zone or station).
+    """
+    frames = []
+    for key,aggregator in aggregate(result, fields, param).items():
+        for field in fields:
+            df = aggregator.summary(field, confidence, quantiles)
+            df.insert(0, 'field', field)
+            df.insert(0, 'config', key)
+            frames.append(df)
+    return pd.concat(frames)
 
 
 def box_plots(data, param, configuration_name):
@@ -94,45 +203,131 @@ def box_plots(data, param, configuration_name):
     plt.show()
     
     
+# Zonal maps of the performance parameters.
+## `ZoneMap` converts the zones' geometries to matplotlib paths once; each map is a single `PolyCollection` of these paths,
+## and drawing a parameter only updates the face colours of the collection, instead of merging and plotting a GeoDataFrame.
+## `export_zonal_maps` reuses one figure and collection for every map, e.g. for headless batch export (with the `Agg` backend).
+
+# Fields and titles of the zonal maps of each performance parameter.
+ZONAL_PARAMS = {
+    'Utilization': (['t1_util', 't2_util', 't3_util'], ['Type-1 Vehicle ', 'Type-2 Vehicle', 'Type-3 Vehicle']),
+    'Coverage': (['cov_e1', 'cov_e2', 'cov_e3'], ['Type-1 Incident', 'Type-2 Incident', 'Type-3 Incident']),
+    'Traversal': (['e1_trvs', 'e2_trvs', 'e3_trvs'], ['Type-1 Incident', 'Type-2 Incident', 'Type-3 Incident']),
+    'Travel Time': (['tt_e1', 'tt_e2', 'tt_e3'], ['Type-1 Incident Average', 'Type-2 Incident Average', 'Type-3 Incident Average']),
+}
+# Fields of the stations' databases, indexed by station id instead of zone id.
+STATION_FIELDS = ZONAL_PARAMS['Utilization'][0]
+
+
+
+class ZoneMap:
+
+    def __init__(self, zone, key='zone97'):
+        """
+        `zone` is the GeoDataFrame of the zones and `key` its column of zone ids.
+        """
+        # Zone ids are cast once; the values of stations (utilization) and zones are both matched to them as integers.
+        self.ids = zone[key].to_numpy().astype(np.int64)
+        self.verts = []
+        self.codes = []
+        for geometry in zone.geometry:
+            polygons = geometry.geoms if geometry.geom_type == 'MultiPolygon' else [geometry]
+            verts = []
+            codes = []
+            # Every ring (exteriors and holes) of a zone is one closed subpath of its path.
+            for polygon in polygons:
+                for ring in [polygon.exterior, *polygon.interiors]:
+                    ring = np.asarray(ring.coords)[:, :2]
+                    verts.append(ring)
+                    codes.append(np.r_[Path.MOVETO, np.full(len(ring)-2, Path.LINETO), Path.CLOSEPOLY])
+            self.verts.append(np.concatenate(verts))
+            self.codes.append(np.concatenate(codes).astype(Path.code_type))
+        self.bounds = zone.total_bounds
+
+
+    def values(self, series, stations=False):
+        """
+        Values of a parameter (indexed by zone id) in the order of the zones; zones without a value are 0.
+        With `stations`, the parameter is indexed by station id (e.g. utilization), i.e. the row of the station's zone
+        in the resource configuration, so zone `i` is station `i-1`.
+        """
+        index = series.index.astype(np.int64)
+        if stations:
+            index = index+1
+        series = pd.Series(series.to_numpy(dtype=np.float64), index=index)
+        return series.reindex(self.ids).fillna(0).to_numpy()
+
+
+    def draw(self, ax, cmap=plt.cm.Reds, alpha=0.7):
+        """
+        Adding the zones to an axis as a single collection, and returning the collection.
+        """
+        collection = PolyCollection([], cmap=cmap, alpha=alpha, edgecolor='black')
+        collection.set_verts_and_codes(self.verts, self.codes)
+        collection.set_array(np.zeros(len(self.ids)))
+        ax.add_collection(collection, autolim=False)
+        ax.set_xlim(self.bounds[0], self.bounds[2])
+        ax.set_ylim(self.bounds[1], self.bounds[3])
+        ax.set_aspect('equal')
+        ax.set_xticks([])
+        ax.set_yticks([])
+        return collection
+
+
+    def update(self, collection, series, stations=False):
+        """
+        Colouring the zones of a collection by the values of a parameter (indexed by station id with `stations`).
+        """
+        values = self.values(series, stations)
+        collection.set_array(values)
+        collection.set_clim(values.min(), values.max())
+
+
+
 def plot_zonal_results(data, param, configuration_name, zone):
     """
     Plotting performance parameters in zonal resolution.
+    `zone` is the GeoDataFrame of the zones, or a `ZoneMap` to reuse its geometries across figures.
     """
-    
+    zone_map = zone if isinstance(zone, ZoneMap) else ZoneMap(zone)
+    param_list, title_list = ZONAL_PARAMS[param]
+
     fig, axs = plt.subplots(figsize=(24, 23), ncols=3, nrows=3) 
     
     # Iterate through different configurations.
     for i, config in zip([0,1,2],configuration_name):
-
-        if param == 'Utilization':
-            param_list = ['t1_util','t2_util','t3_util']
-            title_list = ['Type-1 Vehicle ', 'Type-2 Vehicle', 'Type-3 Vehicle']
-            zone['zone97'] = zone['zone97'].astype(np.str_)
-            
-        if param == 'Coverage':
-            param_list = ['cov_e1', 'cov_e2', 'cov_e3']
-            title_list = ['Type-1 Incident', 'Type-2 Incident', 'Type-3 Incident']
-            zone['zone97'] = zone['zone97'].astype(np.int64)
-            
-        if param == 'Traversal':
-            param_list = ['e1_trvs', 'e2_trvs', 'e3_trvs']
-            title_list = ['Type-1 Incident', 'Type-2 Incident', 'Type-3 Incident']
-            zone['zone97'] = zone['zone97'].astype(np.int64)
-            
-        if param == 'Travel Time':
-            param_list = ['tt_e1', 'tt_e2', 'tt_e3']
-            title_list = ['Type-1 Incident Average', 'Type-2 Incident Average', 'Type-3 Incident Average']
-            zone['zone97'] = zone['zone97'].astype(np.int64)
-            
         for j, t, title in zip(param_list, [0,1,2], title_list):
-            df = pd.DataFrame({j:data[i][j].mean(axis=1)})
-            df = pd.merge(zone,df,left_on='zone97',right_index=True,how='left').fillna(0)
-            df.plot(column=j, edgecolor='black', ax=axs[t][i], cmap=plt.cm.Reds, alpha=0.7)
-            
+            collection = zone_map.draw(axs[t][i])
+            zone_map.update(collection, data[i][j].mean(axis=1), j in STATION_FIELDS)
             axs[t][i].set_title(f'{config}: {title} {param}')
-            axs[t][i].set_xticks([])
-            axs[t][i].set_yticks([])
             
     plt.tight_layout()
     plt.show()
-    
+
+
+def export_zonal_maps(data, zone, path, fields=None, replications=False, dpi=100, figsize=(8, 8)):
+    """
+    Saving a PNG map of each configuration and field of `process_data`'s output in `path`: the mean over the replications,
+    and with `replications=True`, each replication as well. Returns the paths of the saved files.
+    """
+    zone_map = zone if isinstance(zone, ZoneMap) else ZoneMap(zone)
+    os.makedirs(path, exist_ok=True)
+    # A figure outside pyplot, so no window or interactive backend is needed.
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    collection = zone_map.draw(ax)
+
+    files = []
+    for config, config_data in data.items():
+        for field in (fields or config_data.keys()):
+            df = config_data[field]
+            maps = [('mean', df.mean(axis=1))]
+            if replications:
+                maps += [(r, df.iloc[:, r]) for r in range(df.shape[1])]
+            for name, values in maps:
+                zone_map.update(collection, values, field in STATION_FIELDS)
+                ax.set_title(f'{config}: {field} ({name})')
+                files.append(os.path.join(path, f'{config}_{field}_{name}.png'))
+                fig.savefig(files[-1], dpi=dpi)
+    return files
@@ -0,0 +1,135 @@
+import numpy as np
+
+from incident_source import INCIDENT_DTYPE, array_records
+
+
+# Incident generator creating incident streams on the fly instead of loading pre-generated arrival files.
+## 1. Incidents of each (zone, incident type) arrive as a Poisson process with its own rate (incidents per second).
+##    The rates are fitted from one or more arrival files, and can be scaled (e.g. 10x demand, or a growth factor per zone)
+##    to simulate new scenarios without generating and storing more arrival files.
+## 2. Service (action) times follow a distribution per incident type: the empirical distribution of the arrival files,
+##    or a fitted log-normal distribution.
+## 3. Incidents are generated with vectorized NumPy draws in batches of structured arrays (`INCIDENT_DTYPE`),
+##    and `incidents` feeds them to `incident_process` as records, so no arrival file is written or read.
+## 4. Every replication has its own seeded random streams, one for each source of randomness (arrival times, incidents' zone and type, service times).
+##    The same seed and replication always give the same stream, so different resource configurations see common random numbers.
+## Example: `IncidentGenerator.fit([load_arrivals(f'data/Arrivals/arrival_{i}.csv') for i in range(1,13)], zone_num).scale(10)`
+
+
+# Sources of randomness, each with its own random stream.
+STREAMS = ('arrival', 'mark', 'service')
+
+# Service time distributions.
+SERVICE = ('empirical', 'lognormal')
+
+
+class IncidentGenerator:
+
+    def __init__(self, rates, dact, horizon, seed=0, service='empirical'):
+        """
+        `rates` is a (zones x incident types) array of arrival rates, where row `i-1` is zone `i` and column `j-1` is type `j`.
+        `dact` contains the observed service times of each incident type, and `horizon` is the simulated time (seconds).
+        """
+        if service not in SERVICE:
+            raise ValueError(f'Unknown service time distribution {service}, expected one of {SERVICE}.')
+        self.rates = np.asarray(rates, dtype=np.float64)
+        self.dact = {j:np.sort(np.asarray(values, dtype=np.float64)) for j,values in dact.items()}
+        self.horizon = horizon
+        self.seed = seed
+        self.service = service
+        n_types = self.rates.shape[1]
+        # Empirical service times of all types in one array, with the offset and number of values of each type.
+        self.dact_values = np.concatenate([self.dact.get(j, np.zeros(1)) for j in range(1, n_types+1)])
+        self.dact_size = np.array([len(self.dact.get(j, np.zeros(1))) for j in range(1, n_types+1)])
+        self.dact_offset = np.concatenate([[0], np.cumsum(self.dact_size)[:-1]])
+        # Log-normal parameters of each type.
+        logs = [np.log(np.maximum(self.dact.get(j, np.ones(1)), 1e-9)) for j in range(1, n_types+1)]
+        self.dact_mu = np.array([x.mean() for x in logs])
+        self.dact_sigma = np.array([x.std() for x in logs])
+
+
+    @classmethod
+    def from_arrivals(cls, incident, zone_num, seed=0, service='empirical'):
+        """
+        Estimating the arrival rates and service times from an incident database (e.g. an arrival file).
+        """
+        return cls.fit([incident], zone_num, seed, service)
+
+
+    @classmethod
+    def fit(cls, incidents, zone_num, seed=0, service='empirical'):
+        """
+        Estimating the arrival rates and service times from several incident databases (e.g. the realizations of the arrival files).
+        The rates are the incident counts of each (zone, type) over the total time of all databases.
+        """
+        types = sorted(set().union(*[incident['inc_type'].unique() for incident in incidents]))
+        counts = np.zeros((zone_num, max(types)))
+        horizon = 0
+        for incident in incidents:
+            np.add.at(counts, (incident['location'].to_numpy()-1, incident['inc_type'].to_numpy()-1), 1)
+            horizon += incident['inc_time'].max()
+        dact = {j:np.concatenate([incident.loc[incident['inc_type'] == j, 'dact'].to_numpy() for incident in incidents])
+                for j in types}
+        return cls(counts/horizon, dact, horizon/len(incidents), seed, service)
+
+
+    def scale(self, factor, horizon=None):
+        """
+        Generator of a demand scenario: the rates are multiplied by `factor`, a number or an array broadcast to
+        (zones x types), e.g. a growth factor per zone as a column vector.
+        """
+        rates = self.rates*np.asarray(factor, dtype=np.float64)
+        return IncidentGenerator(rates, self.dact, self.horizon if horizon is None else horizon, self.seed, self.service)
+
+
+    def streams(self, replication):
+        """
+        Independent random streams of a replication.
+        """
+        sequence = np.random.SeedSequence(self.seed, spawn_key=(replication,))
+        return {name:np.random.default_rng(child) for name,child in zip(STREAMS, sequence.spawn(len(STREAMS)))}
+
+
+    def service_times(self, rng, inc_type):
+        """
+        Drawing the service times of incidents of the given types.
+        One random number per incident keeps the service stream aligned between replications of different configurations.
+        """
+        j = inc_type-1
+        if self.service == 'lognormal':
+            return np.exp(self.dact_mu[j]+self.dact_sigma[j]*rng.standard_normal(len(j)))
+        u = rng.random(len(j))
+        return self.dact_values[self.dact_offset[j]+(u*self.dact_size[j]).astype(np.int64)]
+
+
+    def batches(self, replication, batch=10000):
+        """
+        Generating the incidents of a replication in occurrence order, as structured arrays of `batch` incidents.
+        """
+        rng = self.streams(replication)
+        total = self.rates.sum()
+        # Cumulative probabilities of the (zone, type) pairs, in the order of `rates.ravel()`.
+        marks = np.cumsum(self.rates.ravel()/total)
+        n_types = self.rates.shape[1]
+        num = 0
+        now = 0.0
+        while now <= self.horizon:
+            array = np.empty(batch, dtype=INCIDENT_DTYPE)
+            array['arint'] = rng['arrival'].exponential(1/total, size=batch)
+            array['inc_time'] = now+np.cumsum(array['arint'])
+            mark = np.minimum(np.searchsorted(marks, rng['mark'].random(batch), side='right'), len(marks)-1)
+            array['location'] = mark//n_types+1
+            array['inc_type'] = mark % n_types+1
+            array['dact'] = self.service_times(rng['service'], array['inc_type'])
+            array['num'] = np.arange(num+1, num+batch+1)
+            now = array['inc_time'][-1]
+            num += batch
+            yield array[array['inc_time'] <= self.horizon]
+
+
+    def incidents(self, replication, batch=10000):
+        """
+        Generating the incident records of a replication in occurrence order, for `incident_process`.
+        """
+        for array in self.batches(replication, batch):
+            yield from array_records(array, batch)
@@ -1,28 +1,34 @@
 import simpy 
 import pandas as pd 
-import numpy as np 
+import numpy as np
 from call_arrival import call_arrival 
+from incident_source import incident_records
 
 # Process generator yielding call arrival process.
 ## It recieve a simulation environment, incident database, network object, and incident type.
 ### Incident database contains the location, occurence time, action (service) time, and type of incidents.
+### It can also be an iterable of incident records in occurrence order, e.g. streamed from an arrival file (see `incident_source`).
 ### According to the occurence time and incident id the call arrival function gets called. 
+### With an OD schedule, the network switches OD matrices when the first incident of a new period arrives.
+### Any function with the same signature as `call_arrival` (e.g. `dispatch.dispatch_arrival`) can be passed as `arrival`.
 
 
-def incident_process(env, incident, network, incident_type):
+def incident_process(env, incident, network, incident_type, arrival=call_arrival):
     """
     A generator function scheduling incident arrival event.
     """
-    count = 1
-    while count <= incident.index.max() :
-        yield env.timeout(incident.loc[count,'arint'])
-        env.process(call_arrival(
+    if isinstance(incident, pd.DataFrame):
+        incident = incident_records(incident)
+    for count, inc_time, arint, inc_type, location, dact in incident:
+        yield env.timeout(arint)
+        # Switching the OD matrix at period boundaries of the network's OD schedule (if any).
+        if env.now >= network.period_end:
+            network.update_period(env.now)
+        env.process(arrival(
             env=env, count=count,
-            time=incident.loc[count,'inc_time'],
-            incident_type_id=incident.loc[count,'inc_type'],
-            location=incident.loc[count,'location'],
+            time=inc_time,
+            incident_type_id=inc_type,
+            location=location,
             network=network,
             incident_type = incident_type,
-            dact=incident.loc[count,'dact']))
-        count +=1 
-
+            dact=dact))
@@ -0,0 +1,81 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+
+# Incident sources feed `incident_process` with plain incident records instead of indexing the incident database per event.
+## 1. `incident_records` turns an incident database (DataFrame) into records in occurrence order.
+## 2. `load_incident_array` keeps an arrival file as a compact NumPy structured array, and `array_records` iterates it.
+## 3. `stream_incidents` reads an arrival file chunk by chunk, so memory stays flat for very long arrival streams.
+## Any other iterable of records (e.g. a generator of synthetic incidents) can be used as an incident source as well.
+## The bundled arrival files are grouped by incident type, so they are not in occurrence order and cannot be streamed row by row.
+
+
+# Incident record with the columns of the arrival files.
+Incident = namedtuple('Incident', ['num', 'inc_time', 'arint', 'inc_type', 'location', 'dact'])
+
+# NumPy structured record of an incident.
+INCIDENT_DTYPE = np.dtype([('num', np.int64), ('inc_time', np.float64), ('arint', np.float64),
+                           ('inc_type', np.int64), ('location', np.int64), ('dact', np.float64)])
+
+
+def incident_records(incident):
+    """
+    Generating incident records from an incident database (indexed by incident id) in occurrence order.
+    """
+    incident = incident.sort_index()
+    columns = [incident.index.tolist()] + [incident[field].tolist() for field in Incident._fields[1:]]
+    for row in zip(*columns):
+        yield Incident(*row)
+
+
+def load_incident_array(path):
+    """
+    Loading an arrival file as a NumPy structured array sorted by incident id.
+    """
+    incident = pd.read_csv(path)
+    array = np.empty(len(incident), dtype=INCIDENT_DTYPE)
+    for field in Incident._fields:
+        array[field] = incident[field].to_numpy()
+    return np.sort(array, order='num')
+
+
+def array_records(array, chunksize=10000):
+    """
+    Generating incident records from a NumPy structured array.
+    """
+    for start in range(0, len(array), chunksize):
+        for row in array[start:start+chunksize].tolist():
+            yield Incident(*row)
+
+
+def stream_incidents(path, chunksize=10000):
+    """
+    Generating incident records from an arrival file, reading it chunk by chunk.
+    The file must be in occurrence order (e.g. written by `write_incidents`).
+    """
+    last = 0
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        if (chunk['num'].diff().iloc[1:] <= 0).any() or chunk['num'].iloc[0] <= last:
+            raise ValueError(f'{path} is not in occurrence order; load it with `load_incident_array` instead.')
+        last = chunk['num'].iloc[-1]
+        columns = [chunk[field].tolist() for field in Incident._fields]
+        for row in zip(*columns):
+            yield Incident(*row)
+
+
+def write_incidents(path, incidents, chunksize=10000):
+    """
+    Writing incident records to an arrival file in occurrence order, so that it can be streamed.
+    """
+    header = True
+    chunk = []
+    for record in incidents:
+        chunk.append(record)
+        if len(chunk) == chunksize:
+            pd.DataFrame(chunk, columns=Incident._fields).to_csv(path, mode='w' if header else 'a', header=header, index=False)
+            header = False
+            chunk = []
+    if chunk or header:
+        pd.DataFrame(chunk, columns=Incident._fields).to_csv(path, mode='w' if header else 'a', header=header, index=False)
@@ -0,0 +1,172 @@
+import json
+import time
+import functools
+from collections import defaultdict
+
+import pandas as pd
+
+
+# Opt-in instrumentation of a simulation run: counters and timers around its hot paths and pipeline steps.
+## 1. Nothing is instrumented by default; `Instrumentation.attach` wraps the methods of one network object (and its environment)
+##    in place, so runs without instrumentation execute exactly the same code as before.
+## 2. Instrumented steps:
+###    Every `Network.generate_*` step and `compute_util` (timers).
+###    Dispatch search of the dispatch engine: calls, entries of the within-standard lists checked, free stations compared by rank
+###    beyond standard, empty within-standard lists, busy within-standard lists, and searches without any available vehicle
+###    (counters and timer).
+###    Result recording: rows added to the recorder (counter and timer).
+###    Event scheduling of a SimPy environment or an event calendar: scheduled events (counter and timer).
+###    The calendars of `what_if` and `surge` are not instrumented.
+## 3. The summary of a run can be exported as JSON or CSV, e.g. for capacity dashboards.
+## 4. Instrumentation of several runs (e.g. the replications of `runner.run_experiment`, each in its worker) is added up with `merge`.
+## Dispatch search counters need the dispatch engine (`dispatch_arrival` or the event calendar); `call_arrival` only reports the other steps.
+
+
+class Instrumentation:
+
+    def __init__(self, run=None):
+        # Label of the run in the exported summary.
+        self.run = run
+        self.counters = defaultdict(int)
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+
+    def add_time(self, name, seconds):
+        self.calls[name] += 1
+        self.seconds[name] += seconds
+
+
+    def timed(self, name, func):
+        """
+        Wrapping a function with a timer.
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add_time(name, time.perf_counter()-start)
+        return wrapper
+
+
+    def attach(self, network):
+        """
+        Instrumenting a network object, its environment, and the dispatch engines and recorder it creates.
+        It should be called before the `generate_*` steps.
+        """
+        for name in dir(network):
+            if name.startswith('generate_') or name == 'compute_util':
+                setattr(network, name, self.timed(name, getattr(network, name)))
+
+        # Dispatch engines and recorders are instrumented when they are created.
+        generate_dispatcher = network.generate_dispatcher
+        def instrumented_dispatcher():
+            generate_dispatcher()
+            self.attach_dispatcher(network.dispatcher)
+        network.generate_dispatcher = instrumented_dispatcher
+        generate_recorder = network.generate_recorder
+        def instrumented_recorder(incident_type):
+            generate_recorder(incident_type)
+            self.attach_recorder(network.recorder)
+        network.generate_recorder = instrumented_recorder
+
+        if network.dispatcher is not None:
+            self.attach_dispatcher(network.dispatcher)
+        if network.recorder is not None:
+            self.attach_recorder(network.recorder)
+        # Event scheduling of SimPy environments.
+        if hasattr(network.env, 'schedule') and hasattr(network.env, 'step'):
+            schedule = self.timed('event_scheduling', network.env.schedule)
+            def instrumented_schedule(*args, **kwargs):
+                self.counters['events_scheduled'] += 1
+                return schedule(*args, **kwargs)
+            network.env.schedule = instrumented_schedule
+        # Event scheduling of an event calendar: its heap insertion, used by `schedule` and the run loop.
+        elif hasattr(network.env, 'push'):
+            push = self.timed('event_scheduling', network.env.push)
+            def instrumented_push(calendar, event):
+                self.counters['events_scheduled'] += 1
+                push(calendar, event)
+            network.env.push = instrumented_push
+        return network
+
+
+    def attach_dispatcher(self, engine):
+        """
+        Instrumenting the nearest station search of a dispatch engine.
+        """
+        find = engine.find
+        counters = self.counters
+        def instrumented_find(location, key):
+            col = engine.type_col[key]
+            nearest = engine.nearest_st[key][location]
+            # Whether the search ends in the within-standard list, and the free stations it would compare by rank otherwise.
+            listed = bool(engine.free[col, nearest].any()) if len(nearest) else False
+            n_free = int(engine.n_free[col])
+            start = time.perf_counter()
+            pos, num, within = find(location, key)
+            self.add_time('dispatch_search', time.perf_counter()-start)
+            counters[f'dispatch_search_{key}'] += 1
+            if len(nearest) == 0:
+                counters['within_standard_empty'] += 1
+            elif not within:
+                counters['within_standard_busy'] += 1
+            if pos < 0:
+                counters['no_vehicle_available'] += 1
+            # Work of the search: the availability of every station of the within-standard list is checked at once,
+            # and beyond standard the free stations of the vehicle type are compared by their rank in the zone's order.
+            counters['within_standard_checked'] += len(nearest)
+            if not listed:
+                counters['free_stations_ranked'] += n_free
+            return pos, num, within
+        engine.find = instrumented_find
+
+
+    def attach_recorder(self, recorder):
+        """
+        Instrumenting the rows added to a recorder.
+        """
+        recorder.add = self.timed('result_recording', recorder.add)
+
+
+    def merge(self, other):
+        """
+        Adding the counters and timers of another instrumentation (e.g. of a replication run in a worker process).
+        """
+        for name,value in other.counters.items():
+            self.counters[name] += value
+        for name,calls in other.calls.items():
+            self.calls[name] += calls
+            self.seconds[name] += other.seconds[name]
+        return self
+
+
+    def summary(self):
+        """
+        Summary of the run: one row per counter or timer.
+        """
+        rows = [{'run':self.run, 'metric':name, 'kind':'counter', 'count':value, 'seconds':None}
+                for name,value in sorted(self.counters.items())]
+        rows += [{'run':self.run, 'metric':name, 'kind':'timer', 'count':self.calls[name], 'seconds':self.seconds[name]}
+                 for name in sorted(self.calls)]
+        return pd.DataFrame(rows, columns=['run', 'metric', 'kind', 'count', 'seconds'])
+
+
+    def to_dict(self):
+        return {'run':self.run, 'counters':dict(self.counters),
+                'timers':{name:{'count':self.calls[name], 'seconds':self.seconds[name]} for name in self.calls}}
+
+
+    def to_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+    def to_csv(self, path):
+        self.summary().to_csv(path, index=False)
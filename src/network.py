@@ -3,8 +3,12 @@ import numpy as np
 import pandas as pd 
 
 
-from zone import Zone 
+from zone import Zone, sort_nearest
 from station import Station
+from dispatch import DispatchEngine, VEHICLE_TYPES, VEHICLE_SLOTS
+from recorder import Recorder
+from travel_times import StationTravelTimes
+from online_statistics import OnlineStatistics
 
 
 # Network class contains essential assumptions and characteristics about the emergency system services:
@@ -16,7 +20,10 @@ from station import Station
 ## 5. It contains station and resource configuraion. 
 ## 6. It contains standard travel time for three different vehicles.
 ## 7. It contains number of incident and the intial database which contains the location, occurence time, and type of incidents. 
-## 8. It stores simulated data after the completion. Output data are stored in different ways, such as final database, utilization database, and zonal database. 
+## 8. It can contain a schedule of OD matrices by time of day, switched during the simulation (see `od_schedule`).
+## 9. It stores simulated data after the completion. Output data are stored in different ways, such as final database, utilization database, and zonal database. 
+## 10. Utilization and zonal databases only use the incidents arriving after the warm-up period, if one is set (see `warm_up`).
+## 11. Utilization and zonal databases can also be generated from online statistics updated during the run (see `online_statistics`).
 
 
 class Network:
@@ -39,6 +46,9 @@ class Network:
         
         # Dictonary containing zone objects.
         self.zones = {}
+        # Travel time matrix (nodes x zones) and sorted station ids of each zone for each type of vehicle.
+        self.tt_matrix = None
+        self.nearest_index = {}
         # List of zone id (node) with station and each type of vehicles.
         self.station_zone_num = []
         self.station_zone_num_t1 = []
@@ -47,36 +57,83 @@ class Network:
         
         # Dictionary containing station objects
         self.stations = {}
+        # Array-backed dispatch engine (optional alternative to the station objects' availability).
+        self.dispatcher = None
+        # Schedule of OD matrices by time of day, precomputed objects of each period, current period and its end time.
+        self.schedule = None
+        self.periods = []
+        self.period = None
+        self.period_end = float('inf')
         
-        # Initial incident database 
+        # Initial incident database (None when incidents are streamed from an incident source).
         self.initial_db = initial_db
-        # Incident database (Simulated data are store in a dictionary because of its memory advantages.)
-        self.db = {i:{} for i in range(1,incident_num+1)}
+        self.incident_num = incident_num
+        # Recorder of the simulated data (columnar arrays, see `recorder.py`), and whether incidents are recorded
+        # (not with online statistics only, see `generate_statistics`).
+        self.recorder = None
+        self.record = True
+        # Online statistics updated during the run (optional, see `online_statistics.py`).
+        self.statistics = None
         # Final incident database
         self.final_db = None
         self.final_db_cleaned = None 
+        # Length of the warm-up period (seconds) excluded from the utilization and zonal databases.
+        self.warm_up = 0
         # Station's utilization database
         self.station_util_dict = {}  
         self.station_util_db = None 
         # Aggregated zonal incident database
-        self.zonal_dict = {i:{} for i in range(1,self.zone_num+1)}
         self.zonal_db = None
         self.zonal_db_e1 = None
         self.zonal_db_e2 = None
         self.zonal_db_e3 = None
         
     
-    def generate_zone(self):
+    def generate_zone(self, tt_matrix=None, nearest_index=None, k=None):
         """
         Generating objects from the zone class for each node in the network.
+        The neighbors of all zones are sorted at once from the OD matrix, so it should be called after `generate_station`.
+        An already computed travel time matrix and neighbor index (of the same OD matrix and configuration) can be reused.
+        The travel time matrix can be sparse (`travel_times.StationTravelTimes`), in which case the OD matrix is not needed,
+        and with `k` the neighbor lists only keep the k nearest stations of each vehicle type (the full lists are used when they are all busy).
         """
+        standard = {'t1':self.time_st_t1, 't2':self.time_st_t2, 't3':self.time_st_t3}
+        station_zone_num = {'t1':self.station_zone_num_t1, 't2':self.station_zone_num_t2, 't3':self.station_zone_num_t3}
+        # Travel time matrix; column `i-1` contains the travel time between zone `i` and every node.
+        if tt_matrix is None:
+            tt_matrix = self.generate_tt_matrix()
+        self.tt_matrix = tt_matrix
+        # Sorting the stations of all zones for each type of vehicle in one pass.
+        if nearest_index is None:
+            nearest_index = {key:sort_nearest(self.tt_matrix, station_zone_num[key], standard[key], k) for key in ['t1','t2','t3']}
+        self.nearest_index = nearest_index
+        sparse = isinstance(self.tt_matrix, StationTravelTimes)
+        truncated = {key:self.nearest_index[key][0].shape[1] < len(station_zone_num[key]) for key in ['t1','t2','t3']}
+
         # Iterating through number of nodes and creating zone object for each.  
         for i in range(1,self.zone_num+1):
-            self.zones[str(i)] = Zone(tt=self.od[str(i)], num_id=str(i),
-                                      time_st_t1=self.time_st_t1, time_st_t2=self.time_st_t2, time_st_t3=self.time_st_t3,
-                                      net=self)
-            # After creating each zone object determine a list of neighbors for each based on travel time ascending order.
-            self.zones[str(i)].get_nearest()
+            zone = Zone(tt=self.tt_matrix.zone(i) if sparse else self.od[str(i)], num_id=str(i),
+                        time_st_t1=self.time_st_t1, time_st_t2=self.time_st_t2, time_st_t3=self.time_st_t3,
+                        net=self)
+            # Determine a list of neighbors for each zone based on travel time ascending order.
+            for key in ['t1','t2','t3']:
+                sorted_ids, n_within = self.nearest_index[key]
+                setattr(zone, f'nearest_st_{key}', sorted_ids[i-1,:n_within[i-1]].tolist())
+                setattr(zone, f'nearest_nst_{key}', sorted_ids[i-1,n_within[i-1]:].tolist())
+                zone.truncated[key] = truncated[key]
+            zone.gt_nearest()
+            self.zones[str(i)] = zone
+
+    def generate_tt_matrix(self):
+        """
+        Extracting the (nodes x zones) travel time matrix from the OD matrix, where column `i-1` belongs to zone `i`.
+        """
+        columns = self.od.columns.get_indexer([str(i) for i in range(1,self.zone_num+1)])
+        if (np.diff(columns) == 1).all():
+            # Contiguous columns (e.g. of a memory-mapped OD matrix) are used without copying.
+            return self.od.iloc[:, columns[0]:columns[-1]+1].to_numpy()
+        return self.od.iloc[:, columns].to_numpy()
+
 
     def generate_zone_nearest(self):
         """
@@ -112,83 +169,169 @@ class Network:
                 self.stations[i].availability['t3'] = self.loc.loc[i,'t3']
     
     
+    def generate_dispatcher(self):
+        """
+        Generating the array-backed dispatch engine from the station objects and the zones' neighbor index.
+        It should be called after `generate_station` and `generate_zone`.
+        """
+        vehicles = [[self.stations[i].vehicles[key] for key in VEHICLE_TYPES] for i in self.station_zone_num]
+        self.dispatcher = DispatchEngine(self.station_zone_num, vehicles, self.tt_matrix, self.nearest_index, self.zone_num)
+
+
+    def generate_schedule(self, schedule):
+        """
+        Precomputing the travel time matrix, neighbor index, zones, and dispatch engine of every period of an OD schedule (see `od_schedule`).
+        It should be called after `generate_station`; the dispatch engines of all periods share the same availability array.
+        Periods with the same OD matrix object (e.g. the off-peak matrix before and after the peaks) reuse the objects of its first period.
+        """
+        self.schedule = schedule
+        self.periods = []
+        built = {}
+        for od in schedule.ods:
+            if id(od) in built:
+                self.periods.append(built[id(od)])
+                continue
+            self.od = od
+            self.zones = {}
+            self.generate_zone()
+            self.generate_dispatcher()
+            if self.periods:
+                self.dispatcher.share_availability(self.periods[0]['dispatcher'])
+            self.periods.append({'od':self.od, 'tt_matrix':self.tt_matrix, 'nearest_index':self.nearest_index,
+                                 'zones':self.zones, 'dispatcher':self.dispatcher})
+            built[id(od)] = self.periods[-1]
+        self.period_end = 0
+        self.update_period(0)
+
+
+    def update_period(self, now):
+        """
+        Switching to the OD matrix of the period of `now` if the current period has ended.
+        """
+        if now < self.period_end:
+            return
+        self.set_period(self.schedule.period(now))
+        self.period_end = self.schedule.period_end(now)
+
+
+    def set_period(self, index):
+        """
+        Using the precomputed objects of a period of the OD schedule.
+        """
+        self.period = index
+        period = self.periods[index]
+        self.od = period['od']
+        self.tt_matrix = period['tt_matrix']
+        self.nearest_index = period['nearest_index']
+        self.zones = period['zones']
+        self.dispatcher = period['dispatcher']
+
+
+    def generate_recorder(self, incident_type):
+        """
+        Generating the recorder of simulated data, with one preallocated row for each incident.
+        """
+        self.recorder = Recorder(incident_type, capacity=self.incident_num or 1024)
+
+
+    def generate_statistics(self, record=False):
+        """
+        Generating the online statistics collector, updated at each dispatch and vehicle return during the run.
+        It should be called after `generate_station`. The incidents are not recorded, unless `record` is True
+        (e.g. to generate the final database as well).
+        """
+        self.record = record
+        vehicles = [[self.stations[i].vehicles[key] for key in VEHICLE_TYPES] for i in self.station_zone_num]
+        standard = {'t1':self.time_st_t1, 't2':self.time_st_t2, 't3':self.time_st_t3}
+        self.statistics = OnlineStatistics(self.zone_num, self.station_zone_num, vehicles, standard)
+
+
+    def generate_online_db(self):
+        """
+        Generating the utilization and zonal databases from the online statistics, without creating the final database.
+        The warm-up period is the one excluded from the online statistics (see `OnlineStatistics.set_warm_up`).
+        """
+        self.warm_up = self.statistics.start
+        self.station_util_db = self.statistics.station_util_db(self.env.now)
+        self.zonal_db_e1 = self.statistics.zonal_db(1)
+        self.zonal_db_e2 = self.statistics.zonal_db(2)
+        self.zonal_db_e3 = self.statistics.zonal_db(3)
+        self.zonal_db = pd.concat([self.zonal_db_e1, self.zonal_db_e2, self.zonal_db_e3], axis=1)
+
+
     def generate_result(self):
         """
-        Create the final database from simulated data stored in the dictionary format.
+        Create the final database from simulated data stored in the recorder.
         The final database stores information about each incident. 
         """
-        # Creating a copy from initial database to be filled with the simulated data. 
-        data = self.initial_db.copy()
-        # Converting simulated data from dictionary format to a pandas dataframe. 
-        df_res = pd.DataFrame.from_dict(self.db,orient='index')
-        self.final_db = pd.merge(data, df_res, left_index=True, right_index=True, how='inner')
-        # Creating copy from final database to extract the desired outputs.
-        self.final_db_cleaned = self.final_db.copy()
-        self.final_db_cleaned[['btt_t1_1']] = self.final_db_cleaned[['ftt_t1_1']]
-        self.final_db_cleaned[['btt_t2_1']] = self.final_db_cleaned[['ftt_t2_1']]
-        self.final_db_cleaned[['btt_t2_2']] = self.final_db_cleaned[['ftt_t2_2']]
-        self.final_db_cleaned[['btt_t3_1']] = self.final_db_cleaned[['ftt_t3_1']]
-        self.final_db_cleaned['dt_start_op'] = self.final_db_cleaned['all_arriving_time']-self.final_db_cleaned['inc_time']
+        # Dataframe on top of the recorder's arrays. 
+        self.final_db = self.recorder.to_frame()
+        if self.initial_db is not None:
+            # Adding the remaining columns of the initial database (e.g. inter-arrival time).
+            extra = self.initial_db.columns.difference(self.final_db.columns)
+            self.final_db = self.final_db.join(self.initial_db[extra])
+        # Creating the processed database from the recorder's arrays to extract the desired outputs.
+        record = {field:column[:self.recorder.size] for field,column in self.recorder.columns.items()}
+        ## Vehicles go back with their forward travel time, so `btt` columns share the `ftt` arrays.
+        for slot in self.recorder.slots:
+            record[f'btt_{slot}'] = record[f'ftt_{slot}']
+        record['dt_start_op'] = record['all_arriving_time']-record['inc_time']
         # Arranging columns in the processed database. 
-        self.final_db_cleaned = self.final_db_cleaned[['inc_time','inc_type', 'location', 'dact',
-                  'within_st_t1','traversed_station_t1_1', 'st_t1_1','ftt_t1_1','btt_t1_1',
-                  'within_st_t2','traversed_station_t2_1', 'st_t2_1','ftt_t2_1','btt_t2_1',
-                  'traversed_station_t2_2', 'st_t2_2','ftt_t2_2','btt_t2_2',                              
-                  'within_st_t3', 'traversed_station_t3_1', 'st_t3_1','ftt_t3_1','btt_t3_1',
-                  'dt_start_op',
-                  'all_arriving_time',
-                  'all_returning_time']]
-        self.final_db_cleaned.fillna(0, inplace=True)
+        columns = ['inc_time','inc_type', 'location', 'dact',
+                   'within_st_t1','traversed_station_t1_1', 'st_t1_1','ftt_t1_1','btt_t1_1',
+                   'within_st_t2','traversed_station_t2_1', 'st_t2_1','ftt_t2_1','btt_t2_1',
+                   'traversed_station_t2_2', 'st_t2_2','ftt_t2_2','btt_t2_2',                              
+                   'within_st_t3', 'traversed_station_t3_1', 'st_t3_1','ftt_t3_1','btt_t3_1',
+                   'dt_start_op',
+                   'all_arriving_time',
+                   'all_returning_time']
+        self.final_db_cleaned = pd.DataFrame({col:record[col] for col in columns}, index=self.final_db.index, copy=False)
+
+
+    def steady_state(self):
+        """
+        Processed database of the incidents arriving after the warm-up period (every incident without warm-up).
+        """
+        df = self.final_db_cleaned
+        if self.warm_up > 0:
+            df = df[df['inc_time'] >= self.warm_up]
+        return df
 
 
     # computed utilization and operation time for each type of vehicle in each station
     def compute_util(self):
         """
         Computing the vehicles' utilization parameters.
-        First, extract the whole operation time for each vehicle from output database.
+        First, extract the whole operation time of every dispatched vehicle from output database and sum it per station in one groupby.
         Then store the operation time and utilization parameter of each vehicle in staion objects. 
         """
         # Getting a view from output database to extract operation time data. 
-        df = self.final_db_cleaned
+        df = self.steady_state()
+        # Operation time of each vehicle slot (e.g. `t2_2`) of the incidents requiring it, with its station and vehicle type.
+        station = []
+        vehicle = []
+        operation = []
+        for t in VEHICLE_SLOTS[3]:
+            d = df[df['inc_type'].isin([j for j,slots in VEHICLE_SLOTS.items() if t in slots])]
+            station.append(d[f'st_{t}'].to_numpy())
+            vehicle.append(np.full(len(d), t.split('_')[0]))
+            operation.append((d['dt_start_op']+d['dact']+d[f'btt_{t}']).to_numpy())
+        operation_time = pd.DataFrame({'station':np.concatenate(station), 'vehicle':np.concatenate(vehicle),
+                                       'operation':np.concatenate(operation)})
+        operation_time = operation_time.groupby(['station','vehicle'])['operation'].sum()
+
+        # Simulated time after the warm-up period.
+        duration = self.env.now-self.warm_up
         # Iterate through stataions and update the operation time and utilization parameter for their vehicles.
         for i in  self.station_zone_num :
-            # type1 vehicle utilization
-            if self.stations[i].vehicles['t1'] == 0:
-                self.stations[i].operation_time['t1'] = 'Not Defined'
-                self.stations[i].utilization['t1'] = 'Not Defined'
-            else :
-                if len(df[df['st_t1_1']==i]) > 0 :
-                    self.stations[i].operation_time['t1'] = df[df['st_t1_1']==i][['dt_start_op','dact','btt_t1_1']].sum(axis=1).sum()
-                    self.stations[i].utilization['t1'] = self.stations[i].operation_time['t1']/(self.stations[i].vehicles['t1']*self.env._now)
-                else :
-                    self.stations[i].operation_time['t1'] = 0
-                    self.stations[i].utilization['t1'] = 0
-                
-            # type3 vehicle utilization
-            if self.stations[i].vehicles['t3'] == 0:
-                self.stations[i].operation_time['t3'] = 'Not Defined'
-                self.stations[i].utilization['t3'] = 'Not Defined'
-            else:
-                if len(df[df['st_t3_1']==i]) > 0 :
-                    self.stations[i].operation_time['t3'] = df[df['st_t3_1']==i][['dt_start_op','dact','btt_t3_1']].sum(axis=1).sum()
-                    self.stations[i].utilization['t3'] = self.stations[i].operation_time['t3']/(self.stations[i].vehicles['t3']*self.env._now)
-                else :
-                    self.stations[i].operation_time['t3'] = 0
-                    self.stations[i].utilization['t3'] = 0
-                
-            # type2 vehicle utilization 
-            if self.stations[i].vehicles['t2'] == 0:
-                self.stations[i].operation_time['t2'] = 'Not Defined'
-                self.stations[i].utilization['t2'] = 'Not Defined'
-            else:
-                if len(df[df['st_t2_1']==i]) | len(df[df['st_t2_1']==i]) > 0:
-                    t2_1 = df[df['st_t2_1']==i][['dt_start_op','dact','btt_t2_1']].sum(axis=1).sum()
-                    t2_2 = df[df['st_t2_2']==i][['dt_start_op','dact','btt_t2_2']].sum(axis=1).sum()
-                    self.stations[i].operation_time['t2'] = t2_1+t2_2
-                    self.stations[i].utilization['t2'] = (t2_1+t2_2)/(self.stations[i].vehicles['t2']*self.env._now)
-                else :
-                    self.stations[i].operation_time['t2'] = 0
-                    self.stations[i].utilization['t2'] = 0
+            for key in ['t1','t2','t3']:
+                if self.stations[i].vehicles[key] == 0:
+                    self.stations[i].operation_time[key] = 'Not Defined'
+                    self.stations[i].utilization[key] = 'Not Defined'
+                else:
+                    self.stations[i].operation_time[key] = operation_time.get((i,key), 0)
+                    self.stations[i].utilization[key] = self.stations[i].operation_time[key]/(self.stations[i].vehicles[key]*duration) \
+                        if duration > 0 else 0
     
     
     def generate_station_db(self):
@@ -208,218 +351,94 @@ class Network:
     def generate_zonal_db(self):
         """
         Generating database containg aggregated data about each type of incident on the zonal level.
-        First, processed inforamtion are stored in dictionary format because of its memory advantages.
-        Then, it is converted to a pandas dataframe. 
+        Every statistic is aggregated in a single groupby over the final output by (incident type, zone),
+        and then split into one database for each type of incident.
         """
-        # Getting a copy from final output.
-        df = self.final_db_cleaned.copy()
+        df = self.steady_state()
+        zones = pd.RangeIndex(1, self.zone_num+1)
         # Standard travel time
         standard = {'t1':self.time_st_t1, 't2':self.time_st_t2, 't3':self.time_st_t3}
+        slots = VEHICLE_SLOTS[3]
 
-        # Triple-level for loop: incidents' type --> zones --> vehicles 
-        ## (level-1) `j` for incident's type.
-        for j in [1,2,3]:
-            if j == 3 : #Type-3 incident.
-                vehicle_type = ['t1_1','t2_1','t2_2','t3_1']
-            elif j ==2 : #Type-2 incident
-                vehicle_type = ['t1_1','t2_1','t2_2']
-            elif j==1 : #Type-1 incident
-                vehicle_type = ['t1_1','t2_1']
-            ## (level-2) `i` for zones.
-            for i in range(1,self.zone_num+1):
-                # i for each zone
-                d = df[(df['location']==i)&(df['inc_type']==j)]
-                self.zonal_dict[i][f'num_e{j}'] = len(d)
-                ## (level-3) `t` for vehicles' type.
-                for t in vehicle_type:
-                    t_m = t.split('_')[0]
-                    # Number of incidents within or not within standard
-                    self.zonal_dict[i][f'e{j}_{t}_wst'] = len(d[d[f'ftt_{t}']<=standard[t_m]])
-                    self.zonal_dict[i][f'e{j}_{t}_nst'] = len(d)-len(d[d[f'ftt_{t}']<=standard[t_m]])
-                    # Average travel time 
-                    self.zonal_dict[i][f'e{j}_{t}_mt_wst'] = d[d[f'ftt_{t}']<=standard[t_m]][f'ftt_{t}'].mean()
-                    self.zonal_dict[i][f'e{j}_{t}_mt_nst'] = d[d[f'ftt_{t}']>standard[t_m]][f'ftt_{t}'].mean()
-                    self.zonal_dict[i][f'e{j}_{t}_mt'] = d[f'ftt_{t}'].mean()
-                    # Traversering data
-                    trvs_dict = d[f'traversed_station_{t}'].value_counts().to_dict()
-                    for num_trvs,nums in trvs_dict.items():
-                        self.zonal_dict[i][f'e{j}_{t}_trvs_{num_trvs}'] = nums
-        
-        # Coverage of each incident type 
-        for i in range(1,self.zone_num+1):  
-            e1_df = df[(df['location']==i)&(df['inc_type']==1)]
-            e2_df = df[(df['location']==i)&(df['inc_type']==2)]
-            e3_df = df[(df['location']==i)&(df['inc_type']==3)]
-            self.zonal_dict[i]['num_cov_e1'] = len(e1_df[(e1_df['ftt_t1_1']<=standard['t1'])&(e1_df['ftt_t2_1']<=standard['t2'])])
-            self.zonal_dict[i]['num_cov_e2'] = len(e2_df[(e2_df['ftt_t1_1']<=standard['t1'])&(e2_df['ftt_t2_1']<=standard['t2'])&(e2_df['ftt_t2_2']<=standard['t2'])])
-            self.zonal_dict[i]['num_cov_e3'] = len(e3_df[(e3_df['ftt_t1_1']<=standard['t1'])&(e3_df['ftt_t2_1']<=standard['t2'])&(e3_df['ftt_t2_2']<=standard['t2'])&(e3_df['ftt_t3_1']<=standard['t3'])])
-            
-        # Extracting related columns for each type of incident.
-        col_e1 = []
-        col_e2 = []
-        col_e3 = []
-        # Changing data formats.
-        self.zonal_db = pd.DataFrame.from_dict(self.zonal_dict,orient='index')
-        # Spiliting columns containing data about different type of incidents. 
-        for key in self.zonal_db.columns:
-            if 'e1' in key:
-                col_e1.append(key)
-            elif 'e2' in key:
-                col_e2.append(key)
-            elif 'e3' in key:
-                col_e3.append(key)
-        self.zonal_db_e1 = self.zonal_db[col_e1]
-        self.zonal_db_e2 = self.zonal_db[col_e2]
-        self.zonal_db_e3 = self.zonal_db[col_e3]
-        
-        ### 1. Coverage 
-        # Computing coverage of each incidents.
-        # Type-1 (e1) incident
-        df_e1 = self.zonal_db_e1.copy()
-        df_e1['cov_t1_1'] = df_e1.apply(lambda x: x.e1_t1_1_wst/x.num_e1 if x.num_e1>0 else 0, axis=1)
-        df_e1['cov_t2_1'] = df_e1.apply(lambda x: x.e1_t2_1_wst/x.num_e1 if x.num_e1>0 else 0, axis=1)
-        df_e1['cov_e1'] = df_e1.apply(lambda x: x.num_cov_e1/x.num_e1 if x.num_e1>0 else 0, axis=1)
-        self.zonal_db_e1 =  df_e1
-        # Type-2 (e2) incident
-        df_e2 = self.zonal_db_e2.copy()
-        df_e2['cov_t1_1'] = df_e2.apply(lambda x: x.e2_t1_1_wst/x.num_e2 if x.num_e2>0 else 0, axis=1)
-        df_e2['cov_t2_1'] = df_e2.apply(lambda x: x.e2_t2_1_wst/x.num_e2 if x.num_e2>0 else 0, axis=1)
-        df_e2['cov_t2_2'] = df_e2.apply(lambda x: x.e2_t2_2_wst/x.num_e2 if x.num_e2>0 else 0, axis=1)
-        df_e2['cov_e2'] = df_e2.apply(lambda x: x.num_cov_e2/x.num_e2 if x.num_e2>0 else 0, axis=1)
-        self.zonal_db_e2 =  df_e2
-        # Type-3 (e3) incident
-        df_e3 = self.zonal_db_e3.copy()
-        df_e3['cov_t1_1'] = df_e3.apply(lambda x: x.e3_t1_1_wst/x.num_e3 if x.num_e3>0 else 0, axis=1)
-        df_e3['cov_t2_1'] = df_e3.apply(lambda x: x.e3_t2_1_wst/x.num_e3 if x.num_e3>0 else 0, axis=1)
-        df_e3['cov_t2_2'] = df_e3.apply(lambda x: x.e3_t2_2_wst/x.num_e3 if x.num_e3>0 else 0, axis=1)
-        df_e3['cov_t3_1'] = df_e3.apply(lambda x: x.e3_t3_1_wst/x.num_e3 if x.num_e3>0 else 0, axis=1)
-        df_e3['cov_e3'] = df_e3.apply(lambda x: x.num_cov_e3/x.num_e3 if x.num_e3>0 else 0, axis=1)
-        self.zonal_db_e3 =  df_e3
-
-        # Filling NA values with zero
-        self.zonal_db_e1.fillna(0,inplace=True)
-        self.zonal_db_e2.fillna(0,inplace=True)
-        self.zonal_db_e3.fillna(0,inplace=True)
-        
-        ### 2. Traversing data 
-        # Computing average number of traverse 
-        df_e1 = self.zonal_db_e1.copy()
-        df_e2 = self.zonal_db_e2.copy()
-        df_e3 = self.zonal_db_e3.copy()
-        # Type-1 (e1) incident
-        e1_t1_col = []
-        e1_t2_col = []
-        for col in  df_e1.columns:
-            if ('t1' in col) & ('trvs' in col):
-                e1_t1_col.append(col)
-            if ('t2_1' in col) & ('trvs' in col):
-                e1_t2_col.append(col)
-        for ind,row in df_e1.iterrows():
-            x_t1 = 0
-            x_t2 = 0
-            for col in e1_t1_col:
-                num = float(col.split('_')[-1])
-                x_t1 += num*row[col]
-            for col in e1_t2_col:
-                num = float(col.split('_')[-1])
-                x_t2 += num*row[col]
-            if df_e1.loc[ind,'num_e1'] >0 :
-                x_t1 = x_t1/df_e1.loc[ind,'num_e1']
-                x_t2 = x_t2/df_e1.loc[ind,'num_e1']
-            else :
-                x_t1 = 0
-                x_t2 = 0
-            df_e1.loc[ind,'e1_t1_trvs'] = x_t1
-            df_e1.loc[ind,'e1_t2_trvs'] = x_t2
-            df_e1.loc[ind,'e1_trvs'] = np.average([x_t1,x_t2])
-        self.zonal_db_e1 =  df_e1
-    
-        # Type-2 (e2) incident
-        e2_t1_col = []
-        e2_t2_1_col = []
-        e2_t2_2_col = []
-        for col in  df_e2.columns:
-            if ('t1' in col) & ('trvs' in col):
-                e2_t1_col.append(col)
-            if ('t2_1' in col) & ('trvs' in col):
-                e2_t2_1_col.append(col)
-            if ('t2_2' in col) & ('trvs' in col):
-                e2_t2_2_col.append(col)
-        for ind,row in df_e2.iterrows():
-            x_t1 = 0
-            x_t2_1 = 0
-            x_t2_2 = 0
-            for col in e2_t1_col:
-                num = float(col.split('_')[-1])
-                x_t1 += num*row[col]
-            for col in e2_t2_1_col:
-                num = float(col.split('_')[-1])
-                x_t2_1 += num*row[col]
-            for col in e2_t2_2_col:
-                num = float(col.split('_')[-1])
-                x_t2_2 += num*row[col]
-            if df_e2.loc[ind,'num_e2'] >0 :
-                x_t1 = x_t1/df_e2.loc[ind,'num_e2']
-                x_t2_1 = x_t2_1/df_e2.loc[ind,'num_e2']
-                x_t2_2 = x_t2_2/df_e2.loc[ind,'num_e2']
-            else :
-                x_t1 = 0
-                x_t2_1 = 0
-                x_t2_2 = 0
-            df_e2.loc[ind,'e2_t2_1_trvs'] = x_t2_1
-            df_e2.loc[ind,'e2_t2_2_trvs'] = x_t2_2
-            df_e2.loc[ind,'e2_t1_trvs'] = x_t1
-            df_e2.loc[ind,'e2_t2_trvs'] = np.average([x_t2_1,x_t2_2])
-            t2_avg = np.average([x_t2_1,x_t2_2])
-            df_e2.loc[ind,'e2_trvs'] = np.average([x_t1,t2_avg])
-        self.zonal_db_e2 =  df_e2
-        
-        # Type-3 (e3) incident
-        e3_t1_col = []
-        e3_t2_1_col = []
-        e3_t2_2_col = []
-        e3_t3_col = []
-        for col in  df_e3.columns:
-            if ('t1' in col) & ('trvs' in col):
-                e3_t1_col.append(col)
-            if ('t2_1' in col) & ('trvs' in col):
-                e3_t2_1_col.append(col)
-            if ('t2_2' in col) & ('trvs' in col):
-                e3_t2_2_col.append(col)
-            if ('t3' in col) & ('trvs' in col):
-                e3_t3_col.append(col)
-        for ind,row in df_e3.iterrows():
-            x_t1 = 0
-            x_t2_1 = 0
-            x_t2_2 = 0
-            x_t3 = 0
-            for col in e3_t1_col:
-                num = float(col.split('_')[-1])
-                x_t1 += num*row[col]
-            for col in e3_t2_1_col:
-                num = float(col.split('_')[-1])
-                x_t2_1 += num*row[col]
-            for col in e3_t2_2_col:
-                num = float(col.split('_')[-1])
-                x_t2_2 += num*row[col]
-            for col in e3_t3_col:
-                num = float(col.split('_')[-1])
-                x_t3 += num*row[col]
-            if df_e3.loc[ind,'num_e3'] >0 :
-                x_t1 = x_t1/df_e3.loc[ind,'num_e3']
-                x_t2_1 = x_t2_1/df_e3.loc[ind,'num_e3']
-                x_t2_3 = x_t2_2/df_e3.loc[ind,'num_e3']
-                x_t3 = x_t3/df_e3.loc[ind,'num_e3']
-            else :
-                x_t1 = 0
-                x_t2_1 = 0
-                x_t2_2 = 0
-                x_t3 = 0
-            df_e3.loc[ind,'e3_t2_1_trvs'] = x_t2_1
-            df_e3.loc[ind,'e3_t2_2_trvs'] = x_t2_2
-            df_e3.loc[ind,'e3_t1_trvs'] = x_t1
-            df_e3.loc[ind,'e3_t2_trvs'] = np.average([x_t2_1,x_t2_2])
-            df_e3.loc[ind,'e3_t3_trvs'] = x_t3
-            t2_avg = np.average([x_t2_1,x_t2_2])
-            df_e3.loc[ind,'e3_trvs'] = np.average([x_t1,t2_avg,x_t3])
-        self.zonal_db_e3 =  df_e3
\ No newline at end of file
+        # Per incident data to be aggregated: travel time within/beyond standard, coverage, and traversed stations.
+        keys = [df['inc_type'], df['location']]
+        data = {}
+        for t in slots:
+            ftt = df[f'ftt_{t}']
+            wst = ftt <= standard[t.split('_')[0]]
+            data[f'{t}_wst'] = wst
+            data[f'{t}_mt_wst'] = ftt.where(wst)
+            data[f'{t}_mt_nst'] = ftt.where(~wst)
+            data[f'{t}_mt'] = ftt
+            data[f'{t}_trvs'] = df[f'traversed_station_{t}']
+        # An incident is covered if all of its required vehicles arrive within standard travel time.
+        covered = np.zeros(len(df), dtype=bool)
+        for j,vehicles in VEHICLE_SLOTS.items():
+            covered |= (df['inc_type'] == j).to_numpy() & np.logical_and.reduce([data[f'{t}_wst'].to_numpy() for t in vehicles])
+        data['num_cov'] = covered
+        data = pd.DataFrame(data, index=df.index)
+
+        # Single pass aggregation by incident type and zone.
+        grouped = data.groupby(keys)
+        count = grouped.size()
+        total = grouped.sum()
+        mean = grouped.mean()
+        # Number of incidents for each number of traversed stations.
+        trvs = {t:df.groupby(keys+[df[f'traversed_station_{t}']]).size().unstack(fill_value=0) for t in slots}
+
+        def zonal(x, j):
+            # Rows of incident type `j` in an aggregated output for every zone.
+            return x.reindex(pd.MultiIndex.from_product([[j], zones])).droplevel(0)
+
+        self.zonal_db = {}
+        for j,vehicles in VEHICLE_SLOTS.items():
+            db = pd.DataFrame(index=zones)
+            db[f'num_e{j}'] = zonal(count, j).fillna(0).astype(int)
+            for t in vehicles:
+                # Number of incidents within or not within standard
+                db[f'e{j}_{t}_wst'] = zonal(total[f'{t}_wst'], j).fillna(0).astype(int)
+                db[f'e{j}_{t}_nst'] = db[f'num_e{j}']-db[f'e{j}_{t}_wst']
+                # Average travel time 
+                db[f'e{j}_{t}_mt_wst'] = zonal(mean[f'{t}_mt_wst'], j)
+                db[f'e{j}_{t}_mt_nst'] = zonal(mean[f'{t}_mt_nst'], j)
+                db[f'e{j}_{t}_mt'] = zonal(mean[f'{t}_mt'], j)
+                # Traversering data
+                trvs_db = zonal(trvs[t], j)
+                trvs_db = trvs_db.loc[:, trvs_db.sum() > 0]
+                trvs_db.columns = [f'e{j}_{t}_trvs_{num_trvs}' for num_trvs in trvs_db.columns]
+                db = pd.concat([db, trvs_db], axis=1)
+            db[f'num_cov_e{j}'] = zonal(total['num_cov'], j).fillna(0).astype(int)
+
+            ### 1. Coverage 
+            # Computing coverage of each vehicle and of the incident.
+            num = db[f'num_e{j}'].where(db[f'num_e{j}'] > 0)
+            for t in vehicles:
+                db[f'cov_{t}'] = (db[f'e{j}_{t}_wst']/num).fillna(0)
+            db[f'cov_e{j}'] = (db[f'num_cov_e{j}']/num).fillna(0)
+            # Filling NA values with zero
+            db = db.fillna(0)
+
+            ### 2. Traversing data 
+            # Average number of traversed stations for each vehicle.
+            x = {t:zonal(mean[f'{t}_trvs'], j).fillna(0) for t in vehicles}
+            if j == 1:
+                db['e1_t1_trvs'] = x['t1_1']
+                db['e1_t2_trvs'] = x['t2_1']
+                db['e1_trvs'] = (x['t1_1']+x['t2_1'])/2
+            else:
+                t2_avg = (x['t2_1']+x['t2_2'])/2
+                db[f'e{j}_t2_1_trvs'] = x['t2_1']
+                db[f'e{j}_t2_2_trvs'] = x['t2_2']
+                db[f'e{j}_t1_trvs'] = x['t1_1']
+                db[f'e{j}_t2_trvs'] = t2_avg
+                if j == 2:
+                    db['e2_trvs'] = (x['t1_1']+t2_avg)/2
+                else:
+                    db['e3_t3_trvs'] = x['t3_1']
+                    db['e3_trvs'] = (x['t1_1']+t2_avg+x['t3_1'])/3
+            self.zonal_db[j] = db
+
+        self.zonal_db_e1 = self.zonal_db[1]
+        self.zonal_db_e2 = self.zonal_db[2]
+        self.zonal_db_e3 = self.zonal_db[3]
+        self.zonal_db = pd.concat([self.zonal_db_e1, self.zonal_db_e2, self.zonal_db_e3], axis=1)
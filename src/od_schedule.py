@@ -0,0 +1,51 @@
+import bisect
+
+
+# Schedule of OD matrices keyed by time of day, e.g. off-peak, AM-peak, and PM-peak travel times in a day-long simulation.
+## 1. A schedule is a list of (period start in seconds since midnight, OD matrix), where simulation time 0 is midnight; a period lasts until the next start,
+##    and the last period wraps around midnight to the first start.
+## 2. `Network.generate_schedule` precomputes the travel time matrix, neighbor orderings, zones, and dispatch engine of every period once
+##    (once per OD matrix object, when several periods use the same one).
+## 3. During the run, the network switches to the next period's precomputed objects (a few reference assignments)
+##    when the first incident after a period boundary arrives; dispatch decisions only happen at incident arrivals,
+##    so this is the same as switching exactly at the boundary.
+## Example: `ODSchedule([(0, od_4), (7*3600, od_3), (10*3600, od_4), (16*3600, od_1), (19*3600, od_4)])`
+
+
+class ODSchedule:
+
+    def __init__(self, periods, cycle=24*3600):
+        """
+        `periods` is a list of (period start in seconds since midnight, OD matrix), and `cycle` the length of a day (seconds).
+        """
+        periods = sorted(periods, key=lambda x: x[0])
+        if not periods:
+            raise ValueError('An OD schedule needs at least one period.')
+        if any(not 0 <= start < cycle for start,_ in periods):
+            raise ValueError(f'Period starts should be within [0, {cycle}) seconds since midnight.')
+        self.starts = [start for start,_ in periods]
+        self.ods = [od for _,od in periods]
+        self.cycle = cycle
+
+
+    def __len__(self):
+        return len(self.starts)
+
+
+    def period(self, time):
+        """
+        Index of the period of a simulation time (seconds).
+        """
+        # Times before the first start belong to the last period of the previous day (index -1).
+        return (bisect.bisect_right(self.starts, time % self.cycle)-1) % len(self.starts)
+
+
+    def period_end(self, time):
+        """
+        Simulation time at which the period of `time` ends.
+        """
+        day = time-time % self.cycle
+        k = bisect.bisect_right(self.starts, time % self.cycle)
+        if k == len(self.starts):
+            return day+self.cycle+self.starts[0]
+        return day+self.starts[k]
@@ -0,0 +1,246 @@
+from collections import defaultdict, Counter
+
+import numpy as np
+import pandas as pd
+
+from dispatch import VEHICLE_TYPES, VEHICLE_SLOTS
+from warm_up import RunningMSER
+
+
+# Online statistics of a run, updated at each dispatch and vehicle return instead of computed from the final database afterwards.
+## 1. For every zone x incident type x vehicle slot it keeps running counts and sums: incidents, vehicles within standard travel time,
+##    travel times (within and beyond standard), traversed stations, incidents covered by all of their vehicles,
+##    and the number of incidents for each number of traversed stations.
+## 2. For every station and vehicle type it keeps the busy time of its vehicles (dispatch to return), added when a vehicle returns.
+## 3. The utilization and zonal databases can be generated at any time during the run or right after it,
+##    with the same values as `compute_util` and `generate_zonal_db`, so `generate_result` is not needed (see `Network.generate_online_db`).
+## 4. The dispatch values are passed to it directly, so a network with online statistics does not record the incidents
+##    (unless `Network.generate_statistics(record=True)`), and its memory does not grow with the number of incidents.
+## 5. With a warm-up period (`set_warm_up`), only the incidents arriving after it are counted (and their vehicles' busy time),
+##    and utilization is computed over the simulated time after it. A fixed period is known from the start. A period detected
+##    during the run by MSER (see `warm_up.RunningMSER`) restarts the statistics at the truncation point: until it is detected
+##    (usually within the first few hundred incidents) the dispatches and returns are also kept, and counted again from it.
+##    If it is not detected during the run, `finish` applies MSER to the whole run, like `warm_up.truncate` on the recorder.
+## It is updated by `call_arrival`, `dispatch_arrival`, and the event calendar when the network has one (`Network.generate_statistics`).
+
+
+# Vehicle slots in the order of their index in the arrays (the slots of type-3 incidents include every other slot).
+SLOTS = VEHICLE_SLOTS[3]
+
+
+class OnlineStatistics:
+
+    def __init__(self, zone_num, station_ids, vehicles, standard):
+        """
+        `station_ids` are the node ids of stations, `vehicles` their number of vehicles of each type (stations x vehicle types),
+        and `standard` the standard travel time of each vehicle type.
+        """
+        self.zone_num = zone_num
+        self.station_ids = list(station_ids)
+        self.position = {st:k for k,st in enumerate(self.station_ids)}
+        self.type_col = {key:c for c,key in enumerate(VEHICLE_TYPES)}
+        self.vehicles = np.array(vehicles, dtype=np.int64).reshape(-1, len(VEHICLE_TYPES))
+
+        # Running counts and sums, indexed by zone id, incident type, and vehicle slot (row 0 and type 0 are unused).
+        ## They are updated in flat lists (faster than NumPy scalar updates in the simulation loop) and read with `array`.
+        self.shape = (zone_num+1, len(VEHICLE_SLOTS)+1, len(SLOTS))
+        size = int(np.prod(self.shape))
+        self.count = [0]*size
+        self.covered = [0]*size
+        self.wst = [0]*size
+        self.ftt = [0.0]*size
+        self.ftt_wst = [0.0]*size
+        self.trvs = [0]*size
+        # Number of incidents for each number of traversed stations, indexed like the flat lists.
+        self.histogram = defaultdict(Counter)
+        # Busy time of the vehicles of each station and type.
+        self.busy = [0.0]*self.vehicles.size
+        # Start of the counted period (end of the warm-up period), and the warm-up detector of the run (if any).
+        self.start = 0
+        self.detector = None
+        # Dispatches and returns since the start of the run, kept until the warm-up period is detected.
+        self.pending = []
+        self.returned = []
+
+        # Slot index and standard travel time of the vehicle slots of each incident type.
+        self.fields = {j:[(SLOTS.index(t), standard[t.split('_')[0]]) for t in slots] for j,slots in VEHICLE_SLOTS.items()}
+
+
+    def set_warm_up(self, warm_up, batch=5, interval=100):
+        """
+        Excluding a warm-up period: a fixed length (seconds), or `'mser'` to detect it during the run with MSER
+        on batch means of the time until all vehicles arrive (like `warm_up.truncate`).
+        """
+        if warm_up == 'mser':
+            self.detector = RunningMSER(batch, interval)
+        else:
+            self.start = warm_up
+
+
+    def add(self, time, inc_type, location, ftt, trvs):
+        """
+        Adding an incident dispatched at `time`: travel times and numbers of traversed stations of its vehicle slots,
+        in the order of `VEHICLE_SLOTS[inc_type]` (a vehicle that was not found has travel time 0).
+        """
+        detector = self.detector
+        if detector is not None:
+            self.pending.append((time, inc_type, location, ftt, trvs))
+            if detector.add(time, max(ftt)):
+                # This incident is counted again with the others.
+                self.restart(detector.truncation)
+                return
+        if time < self.start:
+            return
+        base = (location*self.shape[1]+inc_type)*self.shape[2]
+        # Incident counts are kept in the first slot of each (zone, type).
+        self.count[base] += 1
+        covered = True
+        for (s, standard), t, n in zip(self.fields[inc_type], ftt, trvs):
+            t = float(t)
+            n = int(n)
+            self.ftt[base+s] += t
+            self.trvs[base+s] += n
+            self.histogram[base+s][n] += 1
+            if t <= standard:
+                self.wst[base+s] += 1
+                self.ftt_wst[base+s] += t
+            else:
+                covered = False
+        if covered:
+            self.covered[base] += 1
+
+
+    def vehicle_return(self, pos, key, time, busy):
+        """
+        Adding the busy time of a vehicle of an incident dispatched at `time`, returned to the station in position `pos`:
+        time to the start of the service, service time, and travel time back to its station.
+        """
+        if self.detector is not None:
+            self.returned.append((pos, key, time, busy))
+        if time >= self.start:
+            self.busy[pos*len(VEHICLE_TYPES)+self.type_col[key]] += float(busy)
+
+
+    def restart(self, start):
+        """
+        Counting the incidents from `start` on, again from the dispatches and returns kept since the start of the run.
+        """
+        pending = self.pending
+        returned = self.returned
+        self.detector = None
+        self.pending = []
+        self.returned = []
+        self.reset(start)
+        for args in pending:
+            self.add(*args)
+        for args in returned:
+            self.vehicle_return(*args)
+
+
+    def finish(self):
+        """
+        Ending the warm-up detection at the end of the run: if the truncation point was not detected,
+        the statistics restart from the one of MSER on the whole run.
+        """
+        if self.detector is not None:
+            self.restart(self.detector.finish())
+
+
+    def reset(self, now):
+        """
+        Clearing every count and sum, and counting the incidents from `now` on.
+        """
+        self.start = now
+        size = len(self.count)
+        self.count = [0]*size
+        self.covered = [0]*size
+        self.wst = [0]*size
+        self.ftt = [0.0]*size
+        self.ftt_wst = [0.0]*size
+        self.trvs = [0]*size
+        self.histogram = defaultdict(Counter)
+        self.busy = [0.0]*self.vehicles.size
+
+
+    def array(self, name):
+        """
+        Running counts or sums as an array (zones x incident types x vehicle slots, or stations x vehicle types for `busy`).
+        """
+        values = np.array(getattr(self, name))
+        return values.reshape(self.vehicles.shape if name == 'busy' else self.shape)
+
+
+    def utilization(self, now):
+        """
+        Utilization of the vehicles of each station and type (stations x vehicle types), missing for types a station does not have.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.vehicles > 0, self.array('busy')/(self.vehicles*(now-self.start)), np.nan)
+
+
+    def station_util_db(self, now):
+        """
+        Vehicles' utilization database, like `Network.generate_station_db`.
+        """
+        util = self.utilization(now)
+        df = pd.DataFrame(util, index=self.station_ids, columns=[f'{key}_util' for key in VEHICLE_TYPES]).astype(object)
+        return df.where(self.vehicles > 0, 'Not Defined')
+
+
+    def zonal_db(self, j):
+        """
+        Aggregated zonal database of incident type `j`, like `Network.generate_zonal_db`.
+        """
+        zones = pd.RangeIndex(1, self.zone_num+1)
+        count = self.array('count')[1:, j, 0]
+        covered = self.array('covered')[1:, j, 0]
+        wst_all, ftt, ftt_wst, trvs_sum = (self.array(name)[1:, j] for name in ['wst', 'ftt', 'ftt_wst', 'trvs'])
+        num = np.where(count > 0, count, np.nan)
+        db = pd.DataFrame(index=zones)
+        db[f'num_e{j}'] = count
+        trvs = {}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for t in VEHICLE_SLOTS[j]:
+                s = SLOTS.index(t)
+                wst = wst_all[:, s]
+                db[f'e{j}_{t}_wst'] = wst
+                db[f'e{j}_{t}_nst'] = count-wst
+                db[f'e{j}_{t}_mt_wst'] = ftt_wst[:, s]/np.where(wst > 0, wst, np.nan)
+                db[f'e{j}_{t}_mt_nst'] = (ftt[:, s]-ftt_wst[:, s])/np.where(count-wst > 0, count-wst, np.nan)
+                db[f'e{j}_{t}_mt'] = ftt[:, s]/num
+                trvs[t] = np.nan_to_num(trvs_sum[:, s]/num)
+                # Number of incidents for each number of traversed stations (only the numbers that occurred).
+                rows = {}
+                for z in zones:
+                    i = (z*self.shape[1]+j)*self.shape[2]+s
+                    if i in self.histogram:
+                        rows[z] = self.histogram[i]
+                hist = pd.DataFrame.from_dict(rows, orient='index').reindex(zones).fillna(0).astype(np.int64)
+                hist = hist[sorted(hist.columns)]
+                hist.columns = [f'e{j}_{t}_trvs_{n}' for n in hist.columns]
+                db = pd.concat([db, hist], axis=1)
+            db[f'num_cov_e{j}'] = covered
+
+            ### 1. Coverage
+            for t in VEHICLE_SLOTS[j]:
+                db[f'cov_{t}'] = np.nan_to_num(db[f'e{j}_{t}_wst']/num)
+            db[f'cov_e{j}'] = np.nan_to_num(covered/num)
+        db = db.fillna(0)
+
+        ### 2. Traversing data
+        if j == 1:
+            db['e1_t1_trvs'] = trvs['t1_1']
+            db['e1_t2_trvs'] = trvs['t2_1']
+            db['e1_trvs'] = (trvs['t1_1']+trvs['t2_1'])/2
+        else:
+            t2_avg = (trvs['t2_1']+trvs['t2_2'])/2
+            db[f'e{j}_t2_1_trvs'] = trvs['t2_1']
+            db[f'e{j}_t2_2_trvs'] = trvs['t2_2']
+            db[f'e{j}_t1_trvs'] = trvs['t1_1']
+            db[f'e{j}_t2_trvs'] = t2_avg
+            if j == 2:
+                db['e2_trvs'] = (trvs['t1_1']+t2_avg)/2
+            else:
+                db['e3_t3_trvs'] = trvs['t3_1']
+                db['e3_trvs'] = (trvs['t1_1']+t2_avg+trvs['t3_1'])/3
+        return db
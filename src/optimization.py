@@ -0,0 +1,195 @@
+import simpy
+import numpy as np
+import pandas as pd
+
+from network import Network, VEHICLE_SLOTS
+from zone import sort_nearest
+from dispatch import DispatchEngine, dispatch_arrival, VEHICLE_TYPES
+from incident_process import incident_process
+from incident_source import incident_records
+from assumptions import incident_type, time_st_t1, time_st_t2, time_st_t3
+
+
+# Simulation-optimization of resource configurations (station and vehicle layouts).
+## 1. A layout is the number of vehicles of each type in each node, like the `t1`, `t2`, and `t3` columns of `config_*.csv`.
+## 2. Candidate layouts differ from the current one by moving a single vehicle to another node (which may open or close a station).
+## 3. The sorted neighbor stations of all zones (`NeighborIndex`) are updated in place by inserting or deleting the moved station,
+##    instead of rebuilding the network, zone objects, and neighbor lists from a configuration dataframe.
+## 4. Each candidate is simulated with the dispatch engine on the same incident stream (common random numbers),
+##    and the local search accepts the best improving move of each iteration.
+
+
+class NeighborIndex:
+
+    def __init__(self, tt_matrix, stations, time_st):
+        """
+        Stations of every zone sorted by travel time for one type of vehicle, like `zone.sort_nearest`,
+        which can be updated when a station is added or removed.
+        """
+        self.tt_matrix = tt_matrix
+        self.time_st = time_st
+        self.ids, self.n_within = sort_nearest(tt_matrix, stations, time_st)
+        # Travel times of the sorted stations (zones x stations).
+        self.times = np.take_along_axis(tt_matrix.T, self.ids, axis=1)
+
+
+    def add(self, node):
+        """
+        Inserting a new station in the sorted stations of every zone.
+        Stations with equal travel time stay ordered by their node id.
+        """
+        t = self.tt_matrix[node][:, None]
+        zones, stations = self.ids.shape
+        # Position of the new station in each zone's sorted list.
+        pos = ((self.times < t) | ((self.times == t) & (self.ids < node))).sum(axis=1)
+        cols = np.arange(stations)[None, :]
+        cols = cols + (cols >= pos[:, None])
+        rows = np.arange(zones)[:, None]
+        ids = np.empty((zones, stations+1), dtype=self.ids.dtype)
+        times = np.empty((zones, stations+1), dtype=self.times.dtype)
+        ids[rows, cols] = self.ids
+        times[rows, cols] = self.times
+        ids[np.arange(zones), pos] = node
+        times[np.arange(zones), pos] = t[:, 0]
+        self.ids, self.times = ids, times
+        self.n_within = self.n_within + (t[:, 0] <= self.time_st)
+
+
+    def remove(self, node):
+        """
+        Deleting a station from the sorted stations of every zone.
+        """
+        zones, stations = self.ids.shape
+        keep = self.ids != node
+        self.ids = self.ids[keep].reshape(zones, stations-1)
+        self.times = self.times[keep].reshape(zones, stations-1)
+        self.n_within = self.n_within - (self.tt_matrix[node] <= self.time_st)
+
+
+    def index(self):
+        """
+        Sorted station ids and number of stations within standard travel time, as returned by `zone.sort_nearest`.
+        """
+        return self.ids, self.n_within
+
+
+
+def coverage(recorder, standard, first=0):
+    """
+    Share of incidents whose required vehicles all arrived within standard travel time (from the recorder's row `first`).
+    """
+    record = {field:column[first:recorder.size] for field,column in recorder.columns.items()}
+    covered = np.zeros(recorder.size-first, dtype=bool)
+    for j,slots in VEHICLE_SLOTS.items():
+        covered_j = record['inc_type'] == j
+        for slot in slots:
+            covered_j &= record[f'ftt_{slot}'] <= standard[slot.split('_')[0]]
+        covered |= covered_j
+    return covered.mean() if recorder.size > first else 0
+
+
+
+class LayoutOptimizer:
+
+    def __init__(self, tt_matrix, loc, incident, zone_num, objective=coverage):
+        """
+        `tt_matrix` is the (nodes x zones) travel time matrix, `loc` the initial resource configuration,
+        and `incident` the incident database (or records) every candidate layout is simulated with.
+        """
+        self.tt_matrix = tt_matrix
+        self.zone_num = zone_num
+        self.objective = objective
+        self.standard = {'t1':time_st_t1, 't2':time_st_t2, 't3':time_st_t3}
+        # Incident records, shared by all evaluations.
+        self.incidents = list(incident_records(incident)) if isinstance(incident, pd.DataFrame) else list(incident)
+        # Number of vehicles of each type in each node (nodes x vehicle types).
+        self.vehicles = loc[list(VEHICLE_TYPES)].to_numpy(dtype=np.int64).copy()
+        self.zone_labels = loc['zone'].tolist()
+        # Sorted neighbor stations of each vehicle type.
+        self.index = {key:NeighborIndex(tt_matrix, np.flatnonzero(self.vehicles[:,c] > 0), self.standard[key])
+                      for c,key in enumerate(VEHICLE_TYPES)}
+        self.evaluations = 0
+
+
+    def move(self, key, source, target):
+        """
+        Moving a vehicle of type `key` from node `source` to node `target`, updating the neighbor index of that type.
+        """
+        c = VEHICLE_TYPES.index(key)
+        if self.vehicles[source, c] == 0:
+            raise ValueError(f'There is no vehicle of type {key} in node {source}.')
+        self.vehicles[source, c] -= 1
+        if self.vehicles[source, c] == 0:
+            self.index[key].remove(source)
+        if self.vehicles[target, c] == 0:
+            self.index[key].add(target)
+        self.vehicles[target, c] += 1
+
+
+    def evaluate(self):
+        """
+        Simulating the current layout and returning its objective value.
+        """
+        stations = np.flatnonzero(self.vehicles.any(axis=1))
+        env = simpy.Environment()
+        network = Network(None, None, self.zone_num, time_st_t1, time_st_t2, time_st_t3, len(self.incidents), None, env)
+        network.dispatcher = DispatchEngine(stations, self.vehicles[stations], self.tt_matrix,
+                                            {key:self.index[key].index() for key in VEHICLE_TYPES}, self.zone_num)
+        network.generate_recorder(incident_type)
+        env.process(incident_process(env, self.incidents, network, incident_type, arrival=dispatch_arrival))
+        env.run()
+        self.evaluations += 1
+        return self.objective(network.recorder, self.standard)
+
+
+    def candidate_moves(self, rng, num, targets):
+        """
+        Sampling random moves (vehicle type, source node, target node) of the current layout.
+        """
+        moves = []
+        while len(moves) < num:
+            key = VEHICLE_TYPES[rng.integers(len(VEHICLE_TYPES))]
+            sources = np.flatnonzero(self.vehicles[:, VEHICLE_TYPES.index(key)] > 0)
+            if len(sources) == 0:
+                continue
+            source = int(rng.choice(sources))
+            target = int(rng.choice(targets))
+            if target != source:
+                moves.append((key, source, target))
+        return moves
+
+
+    def local_search(self, iterations=10, candidates=10, targets=None, seed=0):
+        """
+        Greedy local search: in each iteration `candidates` random moves are evaluated and the best improving one is applied.
+        `targets` are the nodes vehicles can be moved to (every node of the configuration by default).
+        Returns the history of (iteration, move, objective value).
+        """
+        rng = np.random.default_rng(seed)
+        if targets is None:
+            targets = np.arange(len(self.vehicles))
+        best = self.evaluate()
+        history = [(0, None, best)]
+        for iteration in range(1, iterations+1):
+            scores = []
+            for key, source, target in self.candidate_moves(rng, candidates, targets):
+                self.move(key, source, target)
+                scores.append((self.evaluate(), (key, source, target)))
+                # Undo the move.
+                self.move(key, target, source)
+            score, move = max(scores, key=lambda x: x[0])
+            if score > best:
+                self.move(*move)
+                best = score
+                history.append((iteration, move, best))
+        return history
+
+
+    def configuration(self):
+        """
+        Resource configuration of the current layout, in the format of `config_*.csv`.
+        """
+        loc = pd.DataFrame({'zone':self.zone_labels, 'Station':self.vehicles.any(axis=1).astype(np.int64)})
+        for c,key in enumerate(VEHICLE_TYPES):
+            loc[key] = self.vehicles[:, c]
+        return loc.astype({'zone':object})
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+
+# The recorder stores the simulated data of incidents in preallocated NumPy arrays (one per output field).
+## 1. Its schema is derived from the incident types: for each vehicle slot (e.g. `t2_2` is the second type-2 vehicle)
+##    it stores the chosen station, travel time, and number of traversed stations, and for each vehicle type whether it was within standard.
+## 2. Each incident gets a row at its arrival event, and the simulation writes its fields into that row by index.
+## 3. Arrays grow by doubling when more incidents than the capacity arrive (e.g. streamed incidents).
+## 4. Fields of vehicles not required by an incident stay zero, like the cleaned final database.
+## 5. With `width`, every field has one column per simulated configuration (e.g. in `what_if`), and `split` gives a recorder of each column.
+
+
+class Recorder:
+
+    def __init__(self, incident_type, capacity=1024, width=None):
+
+        # Vehicle slots and vehicle types used by the incident types.
+        self.slots = []
+        self.vehicle_types = []
+        for required_vehicles in incident_type.values():
+            for key,value in required_vehicles.items():
+                if key not in self.vehicle_types:
+                    self.vehicle_types.append(key)
+                for i in range(value):
+                    if f'{key}_{i+1}' not in self.slots:
+                        self.slots.append(f'{key}_{i+1}')
+        self.vehicle_types.sort()
+        self.slots.sort()
+
+        # Output fields and their types.
+        self.schema = {'inc_time':np.float64, 'inc_type':np.int64, 'location':np.int64, 'dact':np.float64}
+        for key in self.vehicle_types:
+            self.schema[f'within_st_{key}'] = np.bool_
+        for slot in self.slots:
+            self.schema[f'traversed_station_{slot}'] = np.int64
+            self.schema[f'st_{slot}'] = np.int64
+            self.schema[f'ftt_{slot}'] = np.float64
+        self.schema.update({'max_arrivals':np.float64, 'all_arriving_time':np.float64, 'all_returning_time':np.float64})
+
+        # Incident id of each row and a column array for each field.
+        self.incident_type = incident_type
+        capacity = max(capacity, 1)
+        shape = capacity if width is None else (capacity, width)
+        self.num = np.zeros(capacity, dtype=np.int64)
+        self.columns = {field:np.zeros(shape, dtype=dtype) for field,dtype in self.schema.items()}
+        self.size = 0
+
+
+    def add(self, count, time, incident_type_id, location, dact):
+        """
+        Adding a row for an arrived incident and returning its index.
+        """
+        if self.size == len(self.num):
+            self.grow(2*self.size)
+        row = self.size
+        self.size += 1
+        self.num[row] = count
+        self.columns['inc_time'][row] = time
+        self.columns['inc_type'][row] = incident_type_id
+        self.columns['location'][row] = location
+        self.columns['dact'][row] = dact
+        return row
+
+
+    def grow(self, capacity):
+        """
+        Enlarging the arrays to the given capacity.
+        """
+        self.num = np.concatenate([self.num, np.zeros(capacity-len(self.num), dtype=self.num.dtype)])
+        for field,column in self.columns.items():
+            self.columns[field] = np.concatenate([column, np.zeros((capacity-len(column),)+column.shape[1:], dtype=column.dtype)])
+
+
+    def split(self):
+        """
+        Recorders of each column of a recorder with `width`, viewing its arrays without copying them.
+        """
+        recorders = []
+        for k in range(self.columns['inc_time'].shape[1]):
+            recorder = Recorder(self.incident_type, capacity=1)
+            recorder.num = self.num
+            recorder.columns = {field:column[:, k] for field,column in self.columns.items()}
+            recorder.size = self.size
+            recorders.append(recorder)
+        return recorders
+
+
+    def to_frame(self):
+        """
+        Creating a dataframe (indexed by incident id) on top of the recorded arrays without copying them.
+        """
+        return pd.DataFrame({field:column[:self.size] for field,column in self.columns.items()},
+                            index=pd.Index(self.num[:self.size], name='num'), copy=False)
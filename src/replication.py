@@ -0,0 +1,154 @@
+import simpy
+import numpy as np
+import pandas as pd
+
+from network import Network
+from optimization import coverage
+from incident_process import incident_process
+from dispatch import dispatch_arrival
+from warm_up import truncate
+from confidence import t_quantile
+from assumptions import incident_type, time_st_t1, time_st_t2, time_st_t3, zone_num
+
+
+# Replication controller comparing resource configurations with common random numbers and a sequential stopping rule.
+## 1. Incidents are generated on the fly by an `IncidentGenerator`; replication `r` of every configuration sees the same incident stream.
+## 2. After each replication the mean and confidence interval half-width of every metric (coverage and utilization by default)
+##    are updated for each configuration, and for the difference of each configuration with the first one (paired by replication).
+## 3. Replications stop when the half-width of every configuration's metric is within the target precision (relative to its mean),
+##    or at `max_replications`.
+## 4. With `warm_up`, the metrics of each replication exclude a fixed or detected (MSER) warm-up period (see `warm_up`).
+## Common random numbers make the paired differences much less noisy than the configurations' own metrics,
+## so configurations can usually be ranked with fewer replications.
+
+
+def half_width(values, confidence=0.95):
+    """
+    Half-width of the confidence interval of the mean of `values`.
+    """
+    n = len(values)
+    if n < 2:
+        return np.inf
+    return t_quantile(n, confidence)*np.std(values, ddof=1)/np.sqrt(n)
+
+
+def utilization(network):
+    """
+    Share of the simulated time the vehicles of the network were busy (all vehicles and stations together).
+    """
+    network.generate_result()
+    network.compute_util()
+    busy = 0
+    vehicles = 0
+    for station in network.stations.values():
+        for key,num in station.vehicles.items():
+            if num > 0:
+                busy += station.operation_time[key]
+                vehicles += num
+    duration = network.env.now-network.warm_up
+    return busy/(vehicles*duration) if vehicles and duration > 0 else 0
+
+
+def standard_coverage(network):
+    """
+    Share of incidents whose required vehicles all arrived within standard travel time.
+    """
+    # Recorder rows are in arrival order, so the incidents after the warm-up period are the last rows.
+    first = np.searchsorted(network.recorder.columns['inc_time'][:network.recorder.size], network.warm_up)
+    return coverage(network.recorder, {'t1':time_st_t1, 't2':time_st_t2, 't3':time_st_t3}, first)
+
+
+# Metrics computed from the network object after each replication.
+METRICS = {'coverage':standard_coverage, 'utilization':utilization}
+
+
+
+class ReplicationController:
+
+    def __init__(self, configs, od, generator, metrics=METRICS, precision=0.01, confidence=0.95,
+                 min_replications=3, max_replications=30, arrival_process=dispatch_arrival, warm_up=None):
+        """
+        `configs` is a dictionary of {configuration name : resource configuration dataframe},
+        `od` the OD matrix, and `generator` the `IncidentGenerator` of the incident streams.
+        `precision` is the target half-width relative to the absolute mean of each metric.
+        `warm_up` is the length of the warm-up period excluded from the metrics (seconds), or `'mser'` to detect it in each replication.
+        """
+        self.configs = configs
+        self.od = od
+        self.generator = generator
+        self.metrics = metrics
+        self.precision = precision
+        self.confidence = confidence
+        self.min_replications = min_replications
+        self.max_replications = max_replications
+        self.arrival_process = arrival_process
+        self.warm_up = warm_up
+        # Expected number of incidents of a replication (initial capacity of the recorders).
+        self.incident_num = int(generator.rates.sum()*generator.horizon)
+        self.tt_matrix = None
+        self.nearest_index = {}
+        # Metric values of each replication, as {configuration name : {metric : list of values}}.
+        self.results = {name:{metric:[] for metric in metrics} for name in configs}
+
+
+    def simulate(self, name, replication):
+        """
+        Simulating one replication of a configuration and returning its metrics.
+        """
+        env = simpy.Environment()
+        network = Network(self.od, self.configs[name], zone_num, time_st_t1, time_st_t2, time_st_t3,
+                          self.incident_num, None, env)
+        network.generate_station()
+        network.generate_zone(self.tt_matrix, self.nearest_index.get(name))
+        network.generate_dispatcher()
+        # The neighbor index of a configuration is computed in its first replication only.
+        self.tt_matrix = network.tt_matrix
+        self.nearest_index[name] = network.nearest_index
+        env.process(incident_process(env, self.generator.incidents(replication), network, incident_type,
+                                     arrival=self.arrival_process))
+        env.run()
+        if self.warm_up is not None:
+            truncate(network, self.warm_up)
+        return {metric:func(network) for metric,func in self.metrics.items()}
+
+
+    def summary(self):
+        """
+        Mean and confidence interval half-width of every metric of each configuration,
+        and of its paired difference with the first configuration.
+        """
+        rows = []
+        names = list(self.configs)
+        for name in names:
+            for metric,values in self.results[name].items():
+                values = np.asarray(values)
+                rows.append({'config':name, 'metric':metric, 'paired':False, 'replications':len(values),
+                             'mean':values.mean(), 'half_width':half_width(values, self.confidence)})
+                if name != names[0]:
+                    diff = values-np.asarray(self.results[names[0]][metric])
+                    rows.append({'config':f'{name} - {names[0]}', 'metric':metric, 'paired':True, 'replications':len(diff),
+                                 'mean':diff.mean(), 'half_width':half_width(diff, self.confidence)})
+        return pd.DataFrame(rows)
+
+
+    def converged(self, summary):
+        """
+        Checking whether the half-width of every configuration's metric is within the target precision.
+        Paired differences are only reported, since their mean can be close to zero.
+        """
+        summary = summary[~summary['paired']]
+        return bool((summary['half_width'] <= self.precision*summary['mean'].abs()).all())
+
+
+    def run(self):
+        """
+        Running replications until the target precision is reached, and returning the final summary.
+        """
+        for replication in range(self.max_replications):
+            for name in self.configs:
+                for metric,value in self.simulate(name, replication).items():
+                    self.results[name][metric].append(value)
+            summary = self.summary()
+            if replication+1 >= self.min_replications and self.converged(summary):
+                break
+        return summary
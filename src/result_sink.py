@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# Result sink streaming the output tables of each replication to Parquet files as soon as the replication finishes.
+## 1. Tables are written to `{root}/config={configuration}/replication={replication}/{table}.parquet`
+##    (hive-style partitions, so the whole experiment can also be opened as one dataset, e.g. with `pyarrow.dataset`).
+## 2. After writing, only a `StoredRun` handle is kept instead of the network object and its dataframes,
+##    so memory does not grow with the number of replications.
+## 3. `StoredRun` reads a table when it is accessed (and does not keep it), with the same attributes as `runner.RunResult`,
+##    so `load_results` gives `process_data` and `box_plots` the same input as an in-memory experiment.
+## Writing and reading Parquet files needs `pyarrow` (or `fastparquet`) installed.
+
+
+# Tables written for each replication by default.
+TABLES = ('station_util_db', 'zonal_db_e1', 'zonal_db_e2', 'zonal_db_e3')
+
+
+class StoredRun:
+
+    def __init__(self, config, replication, path, tables=TABLES):
+        self.config = config
+        self.replication = replication
+        self.path = path
+        self.tables = tables
+
+    def __repr__(self):
+        return f'StoredRun(config={self.config!r}, replication={self.replication}, path={self.path!r})'
+
+    def table(self, name):
+        """
+        Reading a stored table of the replication.
+        """
+        df = pd.read_parquet(os.path.join(self.path, f'{name}.parquet'))
+        if name == 'station_util_db':
+            # Vehicles a station does not have are stored as missing values.
+            df = df.astype(object).where(df.notna(), 'Not Defined')
+        return df
+
+    @property
+    def station_util_db(self):
+        return self.table('station_util_db')
+
+    @property
+    def zonal_db_e1(self):
+        return self.table('zonal_db_e1')
+
+    @property
+    def zonal_db_e2(self):
+        return self.table('zonal_db_e2')
+
+    @property
+    def zonal_db_e3(self):
+        return self.table('zonal_db_e3')
+
+    @property
+    def final_db_cleaned(self):
+        return self.table('final_db_cleaned')
+
+
+
+class ResultSink:
+
+    def __init__(self, root, tables=TABLES):
+        """
+        `root` is the output directory and `tables` the network's output tables to write
+        (`final_db` and `final_db_cleaned` can be added to keep the per incident data).
+        """
+        self.root = root
+        self.tables = tuple(tables)
+
+
+    def run_path(self, config, replication):
+        return os.path.join(self.root, f'config={config}', f'replication={replication}')
+
+
+    def write(self, config, replication, network):
+        """
+        Writing the output tables of a replication and returning its `StoredRun` handle.
+        The network object is not referenced afterwards, so it can be released.
+        """
+        path = self.run_path(config, replication)
+        os.makedirs(path, exist_ok=True)
+        for name in self.tables:
+            df = getattr(network, name)
+            if name == 'station_util_db':
+                df = df.replace('Not Defined', np.nan).astype(np.float64)
+            # Written through a temporary file, so readers never open a partially written table.
+            temp = os.path.join(path, f'{name}.{os.getpid()}.tmp')
+            df.to_parquet(temp)
+            os.replace(temp, os.path.join(path, f'{name}.parquet'))
+        return StoredRun(config, replication, path, self.tables)
+
+
+
+def load_results(root):
+    """
+    Opening the stored replications of an experiment, as a dictionary of {configuration name : list of `StoredRun`}.
+    No table is read until it is accessed.
+    """
+    result = {}
+    for config_dir in sorted(os.listdir(root)):
+        if not config_dir.startswith('config='):
+            continue
+        config = config_dir[len('config='):]
+        runs = []
+        for run_dir in os.listdir(os.path.join(root, config_dir)):
+            if run_dir.startswith('replication='):
+                path = os.path.join(root, config_dir, run_dir)
+                tables = tuple(sorted(f[:-len('.parquet')] for f in os.listdir(path) if f.endswith('.parquet')))
+                runs.append(StoredRun(config, int(run_dir[len('replication='):]), path, tables))
+        result[config] = sorted(runs, key=lambda run: run.replication)
+    return result
@@ -0,0 +1,209 @@
+import os
+import itertools
+import functools
+import multiprocessing
+from collections import namedtuple
+
+import simpy
+
+from network import Network
+from incident_process import incident_process
+from dispatch import dispatch_arrival
+from event_calendar import EventCalendar
+from what_if import WhatIf
+from warm_up import truncate
+from instrumentation import Instrumentation
+from data_cache import load_configuration, load_arrivals, load_od
+from assumptions import incident_type, time_st_t1, time_st_t2, time_st_t3, zone_num
+
+
+# The runner evaluates resource configurations over several replications in a process pool.
+## 1. An experiment is a grid of (resource configuration, arrival file, OD matrix) paths; each entry is one replication.
+## 2. Every input file is loaded once (from the binary cache of `data_cache`),
+##    and the neighbor index of each (configuration, OD matrix) pair is computed once.
+## 3. Workers are forked from the main process, so they share these read-only inputs (the OD matrices are memory maps)
+##    instead of re-parsing them per run.
+## 4. The results are grouped by configuration name in the format `helper_functions_outputs.process_data` expects.
+## 5. Replications run in SimPy (`engine='simpy'`, the reference) or in the event calendar of `event_calendar` (`engine='calendar'`).
+## 6. With a result sink, each replication's databases are written to Parquet files and its network is released (see `result_sink`).
+## 7. `run_what_if` simulates several configurations together on one arrival file and OD matrix (see `what_if`).
+## 8. With `warm_up`, the outputs only use the incidents after a fixed or detected warm-up period (see `warm_up`);
+##    MSER is applied to the recorded series after the run, or during the run with `online`.
+## 9. With `online`, the outputs come from statistics updated during the run instead of the final database (see `online_statistics`).
+
+
+# Outputs of a single replication.
+RunResult = namedtuple('RunResult',
+                       ['config', 'arrival', 'od', 'station_util_db', 'zonal_db_e1', 'zonal_db_e2', 'zonal_db_e3'])
+
+# Simulation engines.
+ENGINES = ('simpy', 'calendar')
+
+# Read-only inputs of the worker processes (set by `_init_worker`).
+_shared = {}
+
+
+def config_name(path):
+    """
+    Name of a configuration in the experiment's results, e.g. `config_2`.
+    """
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def make_grid(configs, arrivals, ods):
+    """
+    Generating every combination of resource configurations, arrival files, and OD matrices.
+    """
+    return list(itertools.product(configs, arrivals, ods))
+
+
+def build_network(loc, od, incident, env, tt_matrix=None, nearest_index=None, instrumentation=None):
+    """
+    Creating a network object with its stations, zones, and dispatch engine.
+    """
+    network = Network(od, loc, zone_num, time_st_t1, time_st_t2, time_st_t3, len(incident), incident, env)
+    if instrumentation is not None:
+        instrumentation.attach(network)
+    network.generate_station()
+    network.generate_zone(tt_matrix, nearest_index)
+    network.generate_dispatcher()
+    return network
+
+
+def prepare_inputs(grid):
+    """
+    Parsing every input file of the grid once and computing the neighbor index of each (configuration, OD matrix) pair.
+    Configurations are grouped by file name in the results, so different files with the same name are rejected.
+    """
+    inputs = {'config':{}, 'arrival':{}, 'od':{}, 'tt_matrix':{}, 'nearest_index':{}}
+    names = {}
+    for config, arrival, od in grid:
+        name = config_name(config)
+        if os.path.abspath(names.setdefault(name, config)) != os.path.abspath(config):
+            raise ValueError(f'Configurations {names[name]} and {config} have the same name {name} in the results.')
+        if config not in inputs['config']:
+            inputs['config'][config] = load_configuration(config)
+        if arrival not in inputs['arrival']:
+            inputs['arrival'][arrival] = load_arrivals(arrival)
+        if od not in inputs['od']:
+            inputs['od'][od] = load_od(od)
+        if (config, od) not in inputs['nearest_index']:
+            network = Network(inputs['od'][od], inputs['config'][config], zone_num,
+                              time_st_t1, time_st_t2, time_st_t3, 0, None, None)
+            network.generate_station()
+            network.generate_zone(inputs['tt_matrix'].get(od))
+            inputs['tt_matrix'][od] = network.tt_matrix
+            inputs['nearest_index'][(config, od)] = network.nearest_index
+    return inputs
+
+
+def run_replication(config, arrival, od, inputs=None, arrival_process=dispatch_arrival, engine='simpy', instrumentation=None,
+                    sink=None, replication=0, warm_up=None, online=False):
+    """
+    Simulating one replication and generating its utilization and zonal databases.
+    The event calendar always uses the dispatch engine, so `arrival_process` only applies to SimPy.
+    An `Instrumentation` object collects the counters and timers of the run (see `instrumentation`).
+    With a `ResultSink`, the databases are written to files and a `StoredRun` handle is returned instead (see `result_sink`).
+    `warm_up` is the length of the warm-up period excluded from the databases (seconds), or `'mser'` to detect it.
+    With `online`, the databases are generated from online statistics updated during the run, without recording the incidents.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown simulation engine {engine}, expected one of {ENGINES}.')
+    if inputs is None:
+        inputs = _shared
+    incident = inputs['arrival'][arrival]
+    # Setup the simulation environment and network object.
+    env = simpy.Environment() if engine == 'simpy' else EventCalendar()
+    network = build_network(inputs['config'][config], inputs['od'][od], incident, env,
+                            inputs['tt_matrix'][od], inputs['nearest_index'][(config, od)], instrumentation)
+    if online:
+        network.generate_statistics()
+        if warm_up is not None:
+            network.statistics.set_warm_up(warm_up)
+    # Run the simulation model.
+    run = env.run if instrumentation is None else instrumentation.timed('env.run', env.run)
+    if engine == 'simpy':
+        env.process(incident_process(env, incident, network, incident_type, arrival=arrival_process))
+        run()
+    else:
+        run(incident, network, incident_type)
+        if instrumentation is not None:
+            instrumentation.count('events_processed', env.events)
+    # Generate the output databases.
+    if online:
+        network.statistics.finish()
+        network.generate_online_db()
+    else:
+        if warm_up is not None:
+            truncate(network, warm_up)
+        network.generate_result()
+        network.compute_util()
+        network.generate_station_db()
+        network.generate_zonal_db()
+    if sink is not None:
+        return sink.write(config_name(config), replication, network)
+    return RunResult(config_name(config), arrival, od, network.station_util_db,
+                     network.zonal_db_e1, network.zonal_db_e2, network.zonal_db_e3)
+
+
+def _init_worker(inputs):
+    """
+    Storing the shared inputs in a worker process.
+    """
+    _shared.update(inputs)
+
+
+def _run_task(task, arrival_process, engine, sink, warm_up, online, instrumented):
+    config, arrival, od, replication = task
+    # Each replication is instrumented in its worker, and its instrumentation is sent back with the result.
+    instrumentation = Instrumentation(run=f'{config_name(config)}_{replication}') if instrumented else None
+    run = run_replication(config, arrival, od, arrival_process=arrival_process, engine=engine, instrumentation=instrumentation,
+                          sink=sink, replication=replication, warm_up=warm_up, online=online)
+    return run, instrumentation
+
+
+def run_experiment(grid, processes=None, arrival_process=dispatch_arrival, engine='simpy', sink=None, warm_up=None,
+                   online=False, instrumentation=None):
+    """
+    Running every replication of the grid in a process pool.
+    Returns a dictionary of {configuration name : list of replications' results}.
+    With a `ResultSink`, each worker writes its replication's databases as soon as it finishes, and the results are `StoredRun` handles.
+    With an `Instrumentation` object, every replication is instrumented in its worker and the counters and timers are added to it.
+    """
+    inputs = prepare_inputs(grid)
+    # Replications of each configuration are numbered in the order of the grid.
+    numbers = {}
+    tasks = []
+    for config, arrival, od in grid:
+        numbers[config] = numbers.get(config, -1)+1
+        tasks.append((config, arrival, od, numbers[config]))
+    # Forked workers inherit the parsed inputs without copying them; other start methods receive them once per worker.
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+    with context.Pool(processes, initializer=_init_worker, initargs=(inputs,)) as pool:
+        runs = pool.map(functools.partial(_run_task, arrival_process=arrival_process, engine=engine, sink=sink,
+                                       warm_up=warm_up, online=online, instrumented=instrumentation is not None),
+                        tasks, chunksize=1)
+
+    result = {}
+    for run, counters in runs:
+        result.setdefault(run.config, []).append(run)
+        if instrumentation is not None:
+            instrumentation.merge(counters)
+    return result
+
+
+def run_what_if(configs, arrival, od):
+    """
+    Simulating every configuration on the same arrival file and OD matrix in a single batch run.
+    Returns a dictionary of {configuration name : list of replications' results}, like `run_experiment`.
+    """
+    incident = load_arrivals(arrival)
+    locs = {config_name(config):load_configuration(config) for config in configs}
+    what_if = WhatIf(locs, load_od(od), zone_num, time_st_t1, time_st_t2, time_st_t3, len(incident), incident, incident_type)
+    what_if.run(incident)
+    return {name:[RunResult(name, arrival, od, network.station_util_db,
+                            network.zonal_db_e1, network.zonal_db_e2, network.zonal_db_e3)]
+            for name,network in what_if.generate_outputs().items()}
@@ -0,0 +1,211 @@
+import time
+import heapq
+import itertools
+from collections import deque
+
+import pandas as pd
+
+from dispatch import SPEED_FACTOR, VEHICLE_TYPES
+from event_calendar import INCIDENT_ARRIVAL, SERVICE_END, VEHICLE_RETURN
+from incident_source import incident_records
+
+
+# Surge (stress test) mode: simulating disaster-scale loads, where incidents wait for vehicles when none is available.
+## 1. Every required vehicle is dispatched from the nearest station with a free vehicle of its type (the network's dispatch engine).
+##    When no vehicle of a type is free anywhere, the incident waits in the pending queue of that vehicle type (first come, first served),
+##    once for every missing vehicle, and the vehicles already sent wait at the incident.
+## 2. A returning vehicle is released at its station and, if incidents wait for its type, the first one is dispatched
+##    from the nearest station with a free vehicle (which is the returned vehicle's, unless another one is nearer).
+## 3. The service starts when all vehicles of an incident arrive, and each vehicle returns to its station after the service.
+## 4. Memory is bounded: incidents are taken one at a time from the incident stream (e.g. `IncidentGenerator.incidents`
+##    or `incident_source.stream_incidents`), nothing is recorded per incident, and only pending events and waiting incidents are kept.
+##    With `max_queue`, an incident that would have to wait while `max_queue` incidents are already waiting is dropped (counted).
+## 5. Totals (waiting and response times) and per simulated hour statistics (arrived and completed incidents, i.e. throughput,
+##    the longest queue, and wall-clock seconds) are reported by `summary` and `hourly_db`.
+## Example: `SurgeSimulation(network, incident_type).run(IncidentGenerator.fit(arrivals, zone_num).scale(50).incidents(0))`
+## with a network built by `runner.build_network`.
+
+
+# Length of the reporting periods (seconds).
+HOUR = 3600
+
+
+class SurgeSimulation:
+
+    def __init__(self, network, incident_type, max_queue=None):
+        """
+        `network` is a network with a dispatch engine (see `Network.generate_dispatcher`),
+        and `max_queue` the number of waiting incidents beyond which new incidents are dropped (unbounded by default).
+        """
+        self.network = network
+        self.incident_type = incident_type
+        self.max_queue = max_queue
+        self.now = 0
+        self.calendar = []
+        self.seq = itertools.count()
+        self.events = 0
+        # Incidents waiting for a vehicle of each type, and the number of waiting incidents.
+        self.queues = {key:deque() for key in VEHICLE_TYPES}
+        self.waiting = 0
+
+        # Totals of the run.
+        self.arrived = 0
+        self.dispatched = 0
+        self.completed = 0
+        self.dropped = 0
+        self.queued = 0
+        self.wait_time = 0.0
+        self.response_time = 0.0
+        self.max_queue_length = 0
+        # Statistics of each simulated hour.
+        self.hourly = {'arrived':[], 'completed':[], 'max_queue':[], 'wall_seconds':[]}
+
+
+    def run(self, incident, until=None):
+        """
+        Simulating an incident database (or iterable of incident records in occurrence order), until the last event or `until`.
+        A simulation object runs once.
+        """
+        if isinstance(incident, pd.DataFrame):
+            incident = incident_records(incident)
+        incident = iter(incident)
+        network = self.network
+        incident_type = self.incident_type
+        engine = network.dispatcher
+        calendar = self.calendar
+        seq = self.seq
+        push = heapq.heappush
+        pop = heapq.heappop
+        queues = self.queues
+        until = float('inf') if until is None else until
+        hourly = self.hourly
+        hour_end = HOUR
+        # Arrived and completed incidents, and the longest queue, of the current hour.
+        arrived = completed = longest = 0
+        wall = time.perf_counter()
+
+        def send(state, key, now):
+            # Dispatching a vehicle of type `key` to an incident from the nearest station with a free one.
+            location = state[1]
+            pos = engine.find(location, key)[0]
+            if pos < 0:
+                return False
+            ftt = SPEED_FACTOR[key]*engine.tt[location, pos]
+            engine.dispatch(pos, key)
+            state[5].append((ftt, pos, key))
+            if now+ftt > state[4]:
+                state[4] = now+ftt
+            return True
+
+        def dispatched(state, now):
+            # All vehicles of an incident are dispatched: its service ends `dact` seconds after the last one arrives.
+            self.dispatched += 1
+            self.wait_time += now-state[0]
+            self.response_time += state[4]-state[0]
+            push(calendar, (state[4]+state[2], next(seq), SERVICE_END, state))
+
+        first = next(incident, None)
+        if first is not None:
+            push(calendar, (self.now+first.arint, next(seq), INCIDENT_ARRIVAL, first))
+
+        while calendar:
+            if calendar[0][0] >= until:
+                break
+            now, _, kind, data = pop(calendar)
+            self.now = now
+            self.events += 1
+            # Closing the statistics of the hours that ended before this event.
+            while now >= hour_end:
+                current = time.perf_counter()
+                hourly['arrived'].append(arrived)
+                hourly['completed'].append(completed)
+                hourly['max_queue'].append(max(longest, self.waiting))
+                hourly['wall_seconds'].append(current-wall)
+                arrived = completed = longest = 0
+                wall = current
+                hour_end += HOUR
+
+            if kind == INCIDENT_ARRIVAL:
+                following = next(incident, None)
+                if following is not None:
+                    push(calendar, (now+following.arint, next(seq), INCIDENT_ARRIVAL, following))
+                # Switching the OD matrix at period boundaries of the network's OD schedule (if any).
+                if now >= network.period_end:
+                    network.update_period(now)
+                    engine = network.dispatcher
+                arrived += 1
+                self.arrived += 1
+                required = incident_type[data.inc_type]
+                # Dropping the incident if it would wait while the queue is full, i.e. fewer vehicles of a required type are free.
+                ## Stations with a free vehicle (`n_free`) are a lower bound of the free vehicles, so they are only counted
+                ## when there are fewer such stations than required vehicles.
+                if self.max_queue is not None and self.waiting >= self.max_queue and \
+                    any(engine.n_free[engine.type_col[key]] < value and engine.availability[:, engine.type_col[key]].sum() < value
+                        for key,value in required.items() if value > 0):
+                    self.dropped += 1
+                    continue
+                # Incident state: [arrival time, location, service time, missing vehicles, last vehicle arrival, assigned vehicles].
+                state = [now, data.location, data.dact, 0, now, []]
+                for key,value in required.items():
+                    for i in range(value):
+                        if not send(state, key, now):
+                            queues[key].append(state)
+                            state[3] += 1
+                if state[3]:
+                    self.waiting += 1
+                    self.queued += 1
+                    longest = max(longest, self.waiting)
+                    self.max_queue_length = max(self.max_queue_length, self.waiting)
+                else:
+                    dispatched(state, now)
+
+            elif kind == SERVICE_END:
+                completed += 1
+                self.completed += 1
+                for ftt, pos, key in data[5]:
+                    push(calendar, (now+ftt, next(seq), VEHICLE_RETURN, (pos, key)))
+
+            else:
+                pos, key = data
+                engine.release(pos, key)
+                queue = queues[key]
+                if queue:
+                    state = queue.popleft()
+                    # The returned vehicle is free, so a vehicle of its type is always found.
+                    sent = send(state, key, now)
+                    assert sent
+                    state[3] -= 1
+                    if state[3] == 0:
+                        self.waiting -= 1
+                        dispatched(state, now)
+
+        # Statistics of the last (partial) hour.
+        hourly['arrived'].append(arrived)
+        hourly['completed'].append(completed)
+        hourly['max_queue'].append(max(longest, self.waiting))
+        hourly['wall_seconds'].append(time.perf_counter()-wall)
+        if calendar:
+            self.now = until
+        return self
+
+
+    def summary(self):
+        """
+        Totals of the run.
+        """
+        dispatched = self.dispatched
+        hours = max(self.now/HOUR, 1e-9)
+        return {'simulated_hours':float(self.now/HOUR), 'events':self.events,
+                'arrived':self.arrived, 'completed':self.completed, 'dropped':self.dropped, 'waiting':self.waiting,
+                'queued':self.queued, 'max_queue_length':self.max_queue_length,
+                'mean_wait_time':float(self.wait_time/dispatched) if dispatched else 0,
+                'mean_response_time':float(self.response_time/dispatched) if dispatched else 0,
+                'throughput_per_hour':float(self.completed/hours),
+                'wall_seconds':sum(self.hourly['wall_seconds'])}
+
+
+    def hourly_db(self):
+        """
+        Statistics of each simulated hour: arrived and completed incidents (throughput), longest queue, and wall-clock seconds.
+        """
+        return pd.DataFrame(self.hourly, index=pd.RangeIndex(len(self.hourly['arrived']), name='hour'))
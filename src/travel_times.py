@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+
+# Sparse travel times for large networks: only the rows of station nodes are kept, instead of the dense (nodes x zones) OD matrix.
+## 1. `StationTravelTimes` stores the travel time from each candidate station node to every zone (stations x zones),
+##    so memory scales with zones x stations instead of zones^2.
+## 2. It is indexed by node id like the dense travel time matrix (`tt[station_ids]`), so `sort_nearest`, the dispatch engine,
+##    and the network's zones use it in place of `Network.tt_matrix`; indexing a node that is not a candidate station raises an error.
+## 3. It can be read from an OD matrix file chunk by chunk, without ever loading the dense matrix.
+## Candidate stations should include every node that can hold a station in the configurations simulated with it (e.g. optimization targets).
+## With `generate_zone(k=...)`, only the k nearest stations of each vehicle type are kept in the neighbor lists (see `zone.sort_nearest`).
+
+
+class StationTravelTimes:
+
+    def __init__(self, station_ids, times, nodes):
+        """
+        `station_ids` are the node ids of the candidate stations, `times` their travel time to every zone (stations x zones),
+        where column `i-1` belongs to zone `i`, and `nodes` the number of nodes of the network.
+        """
+        self.station_ids = np.asarray(station_ids, dtype=np.int64)
+        self.times = np.asarray(times)
+        # Row of each node in `times` (-1 for nodes that are not candidate stations).
+        self.lookup = np.full(nodes, -1, dtype=np.int64)
+        self.lookup[self.station_ids] = np.arange(len(self.station_ids))
+        self.shape = (nodes, self.times.shape[1])
+
+
+    @classmethod
+    def from_matrix(cls, tt_matrix, station_ids):
+        """
+        Keeping the station rows of a dense (nodes x zones) travel time matrix.
+        """
+        station_ids = np.unique(station_ids)
+        return cls(station_ids, np.ascontiguousarray(tt_matrix[station_ids]), tt_matrix.shape[0])
+
+
+    @classmethod
+    def read_csv(cls, path, station_ids, zone_num, chunksize=1000):
+        """
+        Reading the station rows of an OD matrix file (rows are nodes, in the order of the resource configuration) chunk by chunk.
+        """
+        station_ids = np.unique(station_ids)
+        columns = [str(i) for i in range(1, zone_num+1)]
+        rows = []
+        nodes = 0
+        for chunk in pd.read_csv(path, chunksize=chunksize, usecols=columns):
+            selected = station_ids[(station_ids >= nodes) & (station_ids < nodes+len(chunk))]
+            rows.append(chunk[columns].to_numpy()[selected-nodes])
+            nodes += len(chunk)
+        return cls(station_ids, np.concatenate(rows), nodes)
+
+
+    def __getitem__(self, node):
+        """
+        Travel times from station node(s) to every zone, like indexing the dense travel time matrix.
+        """
+        rows = self.lookup[node]
+        if np.any(rows < 0):
+            raise KeyError(f'Node(s) {np.asarray(node)[np.asarray(rows) < 0]} are not candidate stations of the sparse travel times.')
+        return self.times[rows]
+
+
+    def zone(self, i):
+        """
+        Travel times from the stations to zone `i`, as a series indexed by station node id (like a column of the OD matrix).
+        """
+        return pd.Series(self.times[:, i-1], index=self.station_ids)
@@ -0,0 +1,127 @@
+import numpy as np
+
+
+# Warm-up detection and truncation of the simulated data.
+## 1. Every run starts with an empty system: all vehicles are available at their stations (`Network.generate_station`),
+##    so the first incidents are served faster than in steady state and bias the outputs of short runs.
+## 2. The warm-up period is detected with MSER (marginal standard error rule): the truncation point minimizing the standard error
+##    of the mean of the remaining observations, computed on batch means of a per-incident metric (MSER-5 uses batches of 5 incidents).
+## 3. The metric is a field the recorder fills during the run, in arrival order; by default `max_arrivals`,
+##    the time until all required vehicles arrive at the incident, which grows as vehicles get busy.
+## 4. Truncation sets `Network.warm_up`: `compute_util` and `generate_zonal_db` then only use incidents arriving after it,
+##    and utilization is computed over the simulated time after it.
+##    On the recorder, MSER is applied after the run to the whole recorded series: the run is not shortened,
+##    and only the databases generated from it exclude the warm-up period.
+## 5. With online statistics (no recorder), `RunningMSER` keeps batch means of the metric during the run and applies MSER
+##    as they grow; once the truncation point is detected, the online statistics restart from it (see `OnlineStatistics.set_warm_up`).
+##    If it is not detected during the run, MSER is applied at the end of the run to all batch means (`RunningMSER.finish`),
+##    like on the recorder, so both modes exclude the same incidents. The run itself is not shortened.
+## Example: `truncate(network)` after `env.run()` and before `generate_result`, or `run_replication(..., warm_up='mser')`.
+
+
+def mser(values, batch=5):
+    """
+    Number of observations to delete from the start of a series, by MSER on batch means of `batch` observations.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    k = len(values)//batch
+    if k < 2:
+        return 0
+    return mser_batches(values[:k*batch].reshape(k, batch).mean(axis=1))*batch
+
+
+def mser_batches(z):
+    """
+    Number of batches to delete from the start of a series of batch means, by MSER.
+    """
+    z = np.asarray(z, dtype=np.float64)
+    k = len(z)
+    if k < 2:
+        return 0
+    # Sums of the batch means (and their squares) from each truncation point to the end.
+    s1 = np.cumsum(z[::-1])[::-1]
+    s2 = np.cumsum((z*z)[::-1])[::-1]
+    m = np.arange(k, 0, -1)
+    statistic = (s2-s1*s1/m)/(m*m)
+    # Only truncation points in the first half of the run are considered, since the statistic is unstable near the end.
+    return int(np.argmin(statistic[:k//2+1]))
+
+
+def warm_up_time(network, metric='max_arrivals', batch=5):
+    """
+    End of the warm-up period of a simulated network (seconds): arrival time of the first incident after the MSER truncation point.
+    """
+    recorder = network.recorder
+    if recorder is None:
+        return 0
+    d = mser(recorder.columns[metric][:recorder.size], batch)
+    return float(recorder.columns['inc_time'][d]) if d > 0 else 0
+
+
+def truncate(network, warm_up='mser', metric='max_arrivals', batch=5):
+    """
+    Setting the warm-up period of a simulated network: a fixed length (seconds), or detected with MSER (`'mser'`).
+    Returns its length.
+    """
+    if warm_up == 'mser':
+        warm_up = warm_up_time(network, metric, batch)
+    elif warm_up >= network.env.now:
+        raise ValueError(f'The warm-up period ({warm_up} s) must end before the end of the run ({network.env.now} s).')
+    network.warm_up = warm_up
+    return network.warm_up
+
+
+
+class RunningMSER:
+
+    def __init__(self, batch=5, interval=100):
+        """
+        MSER on the batch means of a metric during a run: `batch` observations per batch, first applied after `interval` batches.
+        """
+        self.batch = batch
+        self.interval = interval
+        # Batch means, and the time of the first observation of each batch.
+        self.means = []
+        self.times = []
+        self.total = 0.0
+        self.n = 0
+        self.next_check = interval
+        # End of the warm-up period (seconds) once detected: the time of the first observation after the truncation point.
+        self.truncation = None
+
+
+    def add(self, time, value):
+        """
+        Adding an observation at `time`. Returns True when the truncation point is detected.
+        """
+        if self.n == 0:
+            self.times.append(time)
+        self.total += value
+        self.n += 1
+        if self.n < self.batch:
+            return False
+        self.means.append(self.total/self.batch)
+        self.total = 0.0
+        self.n = 0
+        k = len(self.means)
+        if k < self.next_check:
+            return False
+        # Checks are spaced geometrically, so their cost stays linear in the length of the run.
+        self.next_check = max(k+self.interval, int(k*1.1))
+        d = mser_batches(self.means)
+        # The truncation point is accepted when MSER's minimum is not at the end of the first half, i.e. the series is long enough.
+        if d < k//2:
+            self.truncation = self.times[d] if d > 0 else 0
+            return True
+        return False
+
+
+    def finish(self):
+        """
+        Applying MSER to all batch means at the end of the run, if the truncation point was not detected during it.
+        Returns the end of the warm-up period.
+        """
+        if self.truncation is None:
+            d = mser_batches(self.means)
+            self.truncation = self.times[d] if d > 0 else 0
+        return self.truncation
@@ -0,0 +1,248 @@
+import heapq
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from network import Network
+from recorder import Recorder
+from zone import sort_nearest
+from dispatch import VEHICLE_TYPES, SPEED_FACTOR
+from incident_source import incident_records
+from event_calendar import INCIDENT_ARRIVAL, SERVICE_START, SERVICE_END, VEHICLE_RETURN
+
+
+# Batch what-if evaluation pushing one incident stream through K resource configurations in a single run.
+## 1. The stations of all configurations are merged, and their availability is held in one (configurations x stations x vehicle types) array.
+## 2. The merged stations of each zone are sorted once; a configuration's neighbor list is the merged list restricted to its own stations,
+##    so the traversed stations are counted with a cumulative count of the configuration's stations along the merged list.
+## 3. On each incident arrival, the nearest available station of every configuration is found together with one vectorized scan,
+##    the incident records are decoded once for all configurations, and the simulated data is recorded with one column per configuration.
+## 4. Vehicle arrivals, services, and returns differ between configurations, so they are scheduled as separate events of each configuration
+##    in one event calendar (as in `event_calendar`), which keeps each configuration's results identical to simulating it alone.
+
+
+class Clock:
+
+    def __init__(self):
+        # Simulation time of the last event of a configuration, used as its network's environment.
+        self.now = 0
+
+
+
+class BatchDispatchEngine:
+
+    def __init__(self, vehicles, tt_matrix, zone_num, standard):
+        """
+        `vehicles` is the number of vehicles of each type in each node for every configuration (configurations x nodes x vehicle types),
+        `tt_matrix` the (nodes x zones) travel time matrix, and `standard` the standard travel time of each vehicle type.
+        """
+        vehicles = np.asarray(vehicles, dtype=np.int64)
+        # Node ids of the stations of any configuration, and their position in the arrays.
+        self.station_ids = np.flatnonzero(vehicles.any(axis=(0, 2)))
+        self.type_col = {key:c for c,key in enumerate(VEHICLE_TYPES)}
+
+        # Number of vehicles and available vehicles (configurations x stations x vehicle types).
+        self.vehicles = vehicles[:, self.station_ids]
+        self.availability = self.vehicles.copy()
+        self.configs = np.arange(len(self.vehicles))
+
+        # Travel time from each station to each zone (row 0 is unused since zone ids start from 1).
+        self.tt = np.zeros((zone_num+1, len(self.station_ids)))
+        self.tt[1:] = tt_matrix[self.station_ids].T
+        # Merged neighbor lists (station positions) of each zone, and the number of each configuration's own stations up to each position.
+        self.nearest_st = {key:[None]*(zone_num+1) for key in VEHICLE_TYPES}
+        self.nearest_nst = {key:[None]*(zone_num+1) for key in VEHICLE_TYPES}
+        self.rank_st = {key:[None]*(zone_num+1) for key in VEHICLE_TYPES}
+        self.rank_nst = {key:[None]*(zone_num+1) for key in VEHICLE_TYPES}
+        lookup = np.zeros(tt_matrix.shape[0], dtype=np.int64)
+        lookup[self.station_ids] = np.arange(len(self.station_ids))
+        for c,key in enumerate(VEHICLE_TYPES):
+            has = self.vehicles[:, :, c] > 0
+            sorted_ids, n_within = sort_nearest(tt_matrix, self.station_ids[has.any(axis=0)], standard[key])
+            positions = lookup[sorted_ids]
+            for i in range(1, zone_num+1):
+                self.nearest_st[key][i] = positions[i-1,:n_within[i-1]]
+                self.nearest_nst[key][i] = positions[i-1,n_within[i-1]:]
+                self.rank_st[key][i] = np.cumsum(has[:, self.nearest_st[key][i]], axis=1)
+                self.rank_nst[key][i] = np.cumsum(has[:, self.nearest_nst[key][i]], axis=1)
+
+
+    def scan(self, nearest, rank, col):
+        """
+        First available station of every configuration in a neighbor list.
+        Returns the station positions (-1 if there is none) and the number of traversed stations of each configuration.
+        """
+        if len(nearest) == 0:
+            return np.full(len(self.configs), -1), np.zeros(len(self.configs), dtype=np.int64)
+        free = self.availability[:, nearest, col] > 0
+        k = free.argmax(axis=1)
+        found = free[self.configs, k]
+        pos = np.where(found, nearest[k], -1)
+        num = np.where(found, rank[self.configs, k], rank[:, -1])
+        return pos, num
+
+
+    def find(self, location, key):
+        """
+        Finding the nearest station with an available vehicle of type `key` for an incident in `location`, in every configuration.
+        Returns the station positions (-1 if there is none), number of traversed stations, and whether they are within standard.
+        """
+        col = self.type_col[key]
+        # First, search within standard travel time.
+        pos, num = self.scan(self.nearest_st[key][location], self.rank_st[key][location], col)
+        within = pos >= 0
+        if within.all():
+            return pos, num, within
+        # Configurations without available vehicles within standard time search for stations beyond standard travel time.
+        pos_nst, num_nst = self.scan(self.nearest_nst[key][location], self.rank_nst[key][location], col)
+        return np.where(within, pos, pos_nst), np.where(within, num, num_nst), within
+
+
+    def dispatch(self, configs, pos, key):
+        """
+        Decreasing the availability of a vehicle in the chosen station of each configuration (chosen stations always have one).
+        """
+        self.availability[configs, pos, self.type_col[key]] -= 1
+
+
+    def release(self, config, pos, key):
+        """
+        Increasing the availability of a vehicle returned to its station in a configuration.
+        """
+        col = self.type_col[key]
+        self.availability[config, pos, col] = min(self.availability[config, pos, col]+1, self.vehicles[config, pos, col])
+
+
+
+class WhatIf:
+
+    def __init__(self, configs, od, zone_num, time_st_t1, time_st_t2, time_st_t3, incident_num, initial_db, incident_type):
+        """
+        `configs` is a dictionary of {configuration name : resource configuration dataframe} sharing the same nodes,
+        and the other arguments are the ones of the `Network` class.
+        """
+        self.names = list(configs)
+        self.incident_type = incident_type
+        # Network object of each configuration, storing its stations and (after the run) its simulated data.
+        self.networks = []
+        for name in self.names:
+            network = Network(od, configs[name], zone_num, time_st_t1, time_st_t2, time_st_t3, incident_num, initial_db, Clock())
+            network.generate_station()
+            self.networks.append(network)
+        standard = {'t1':time_st_t1, 't2':time_st_t2, 't3':time_st_t3}
+        vehicles = np.stack([configs[name][list(VEHICLE_TYPES)].to_numpy(dtype=np.int64) for name in self.names])
+        self.engine = BatchDispatchEngine(vehicles, self.networks[0].generate_tt_matrix(), zone_num, standard)
+        # Simulated data of all configurations, with one column per configuration in each field.
+        self.recorder = Recorder(incident_type, capacity=incident_num or 1024, width=len(self.names))
+        self.events = 0
+
+
+    def assign_vehicles(self, count, time, incident_type_id, location, dact):
+        """
+        Recording an incident and dispatching its vehicles in every configuration (`EVENT-1` of `call_arrival`).
+        Returns the recorder row and the assigned vehicles (sorted by travel time) of each configuration.
+        """
+        engine = self.engine
+        record = self.recorder.columns
+        row = self.recorder.add(count, time, incident_type_id, location, dact)
+        assigned = [[] for name in self.names]
+        for key,value in self.incident_type[incident_type_id].items():
+            for i in range(value):
+                pos, num, within = engine.find(location, key)
+                found = np.flatnonzero(pos >= 0)
+                pos = pos[found]
+                ftt = SPEED_FACTOR[key] * engine.tt[location, pos]
+                record[f'st_{key}_{i+1}'][row, found] = engine.station_ids[pos]
+                record[f'ftt_{key}_{i+1}'][row, found] = ftt
+                record[f'within_st_{key}'][row, found] = within[found]
+                engine.dispatch(found, pos, key)
+                for k,f,p in zip(found.tolist(), ftt.tolist(), pos.tolist()):
+                    assigned[k].append((f, p, key))
+                # Store the number of traversed stations before finding first available vehicles.
+                record[f'traversed_station_{key}_{i+1}'][row] = num
+
+        # Sorting the travel time allows us to schedule the vehicles' return in a correct order.
+        for k,vehicles in enumerate(assigned):
+            if not vehicles:
+                raise RuntimeError(f'No vehicle is available for incident {count} at {time} in configuration {self.names[k]}; '
+                                   'simulate overloaded scenarios with the pending-incident queues of `surge.SurgeSimulation`.')
+            vehicles.sort(key=lambda x: x[0])
+        record['max_arrivals'][row] = [vehicles[-1][0] for vehicles in assigned]
+        return row, assigned
+
+
+    def run(self, incident):
+        """
+        Simulating an incident database (or iterable of incident records in occurrence order) in every configuration.
+        """
+        if isinstance(incident, pd.DataFrame):
+            incident = incident_records(incident)
+        incident = iter(incident)
+        release = self.engine.release
+        clocks = [network.env for network in self.networks]
+        calendar = []
+        seq = itertools.count()
+        push = heapq.heappush
+        pop = heapq.heappop
+        record = self.recorder.columns
+
+        # The first incident is scheduled at its inter-arrival time.
+        first = next(incident, None)
+        if first is not None:
+            push(calendar, (0+first.arint, next(seq), INCIDENT_ARRIVAL, first))
+
+        # Events of a configuration carry the state [configuration, recorder row, service time, assigned vehicles, number of returned vehicles].
+        while calendar:
+            now, _, kind, data = pop(calendar)
+            self.events += 1
+
+            if kind == INCIDENT_ARRIVAL:
+                # The next incident is scheduled before this one's vehicles are dispatched, like `incident_process`.
+                following = next(incident, None)
+                if following is not None:
+                    push(calendar, (now+following.arint, next(seq), INCIDENT_ARRIVAL, following))
+                count, inc_time, arint, inc_type, location, dact = data
+                row, assigned = self.assign_vehicles(count, inc_time, inc_type, location, dact)
+                # The recorder may have grown.
+                record = self.recorder.columns
+                for k,clock in enumerate(clocks):
+                    clock.now = now
+                    push(calendar, (now+assigned[k][-1][0], next(seq), SERVICE_START, [k, row, dact, assigned[k], 0]))
+                continue
+
+            k = data[0]
+            clocks[k].now = now
+            if kind == SERVICE_START:
+                record['all_arriving_time'][data[1], k] = now
+                push(calendar, (now+data[2], next(seq), SERVICE_END, data))
+
+            elif kind == SERVICE_END:
+                push(calendar, (now+data[3][0][0], next(seq), VEHICLE_RETURN, data))
+
+            else:
+                k, row, dact, assigned, returned = data
+                ftt, pos, key = assigned[returned]
+                release(k, pos, key)
+                returned += 1
+                if returned < len(assigned):
+                    # Vehicles return in the order of their travel time.
+                    data[4] = returned
+                    push(calendar, (now+(assigned[returned][0]-ftt), next(seq), VEHICLE_RETURN, data))
+                else:
+                    # Store the time all vehicles are returned.
+                    record['all_returning_time'][row, k] = now
+
+
+    def generate_outputs(self):
+        """
+        Generating the output databases of every configuration from its column of the simulated data.
+        Returns a dictionary of {configuration name : network object}.
+        """
+        for network,recorder in zip(self.networks, self.recorder.split()):
+            network.recorder = recorder
+            network.generate_result()
+            network.compute_util()
+            network.generate_station_db()
+            network.generate_zonal_db()
+        return dict(zip(self.names, self.networks))
@@ -9,6 +9,9 @@ import pandas as pd
 ## For each type of vehicle two lists of neighboring supply node are created: 
 ### 1. Supply nodes within standard travel time.
 ### 2. Supply nodes beyond standard travel time. 
+## The lists of all zones are normally filled at once by the network using `sort_nearest`, and `get_nearest` does the same for a single zone.
+## Stations with equal travel time are ordered by their node id.
+## The lists can be truncated to the k nearest stations (e.g. for large networks), and `expand` restores the full lists of a zone when needed.
 
 
 class Zone:
@@ -26,16 +29,6 @@ class Zone:
         self.time_st_t2 = time_st_t2
         self.time_st_t3 = time_st_t3
 
-        # Finding every two nodes within each vehicle's standard travel time.
-        self.zone_st_t1_id = self.tt[self.tt <= self.time_st_t1].sort_values().index.tolist()
-        self.zone_st_t2_id = self.tt[self.tt <= self.time_st_t2].sort_values().index.tolist()
-        self.zone_st_t3_id = self.tt[self.tt <= self.time_st_t3].sort_values().index.tolist()
-
-        # Finding every two nodes beyond each vehicle's standard travel time.
-        self.zone_nst_t1_id = self.tt[self.tt > self.time_st_t1].sort_values().index.tolist()
-        self.zone_nst_t2_id = self.tt[self.tt > self.time_st_t2].sort_values().index.tolist()
-        self.zone_nst_t3_id = self.tt[self.tt > self.time_st_t3].sort_values().index.tolist()
-        
         # Generating dictionary containing relationship between nodes. 
         self.nearest = {'nearest_st_t1':None, 'nearest_st_t2':None,
                         'nearest_nst_t1':None, 'nearest_nst_t2':None,
@@ -47,40 +40,72 @@ class Zone:
         self.nearest_nst_t1 = []
         self.nearest_nst_t2 = []
         self.nearest_nst_t3 = []
+        # Whether the lists of each vehicle type only contain the k nearest stations (see `expand`).
+        self.truncated = {'t1':False, 't2':False, 't3':False}
     
     
+    # Every two nodes within each vehicle's standard travel time (computed when needed).
+    @property
+    def zone_st_t1_id(self):
+        return self.tt[self.tt <= self.time_st_t1].sort_values(kind='stable').index.tolist()
+
+    @property
+    def zone_st_t2_id(self):
+        return self.tt[self.tt <= self.time_st_t2].sort_values(kind='stable').index.tolist()
+
+    @property
+    def zone_st_t3_id(self):
+        return self.tt[self.tt <= self.time_st_t3].sort_values(kind='stable').index.tolist()
+
+    # Every two nodes beyond each vehicle's standard travel time (computed when needed).
+    @property
+    def zone_nst_t1_id(self):
+        return self.tt[self.tt > self.time_st_t1].sort_values(kind='stable').index.tolist()
+
+    @property
+    def zone_nst_t2_id(self):
+        return self.tt[self.tt > self.time_st_t2].sort_values(kind='stable').index.tolist()
+
+    @property
+    def zone_nst_t3_id(self):
+        return self.tt[self.tt > self.time_st_t3].sort_values(kind='stable').index.tolist()
+
+
     def get_nearest(self):      
         """
         Finding staions within and beyond each vehicle's standard travel time, based on travel time in an ascending order, for each node.
         """  
+        station_t1 = set(self.net.station_zone_num_t1)
+        station_t2 = set(self.net.station_zone_num_t2)
+        station_t3 = set(self.net.station_zone_num_t3)
         # Type-1 
         ## within standard travel time
         for i in self.zone_st_t1_id :
-            if i in self.net.station_zone_num_t1:
+            if i in station_t1:
                 self.nearest_st_t1.append(i)
         ## beyon strandard travel time
         for i in self.zone_nst_t1_id :
-            if i in self.net.station_zone_num_t1:
+            if i in station_t1:
                 self.nearest_nst_t1.append(i)     
                 
         # Type-2 vehicle
         ## within standard travel time
         for i in self.zone_st_t2_id :
-            if i in self.net.station_zone_num_t2:
+            if i in station_t2:
                 self.nearest_st_t2.append(i)
         ## beyon strandard travel time
         for i in self.zone_nst_t2_id :
-            if i in self.net.station_zone_num_t2:
+            if i in station_t2:
                 self.nearest_nst_t2.append(i)   
                 
         # Type-3 vehicle
         ## within standard travel time
         for i in self.zone_st_t3_id :
-            if i in self.net.station_zone_num_t3:
+            if i in station_t3:
                 self.nearest_st_t3.append(i)  
         ## beyon strandard travel time
         for i in self.zone_nst_t3_id :
-            if i in self.net.station_zone_num_t3:
+            if i in station_t3:
                 self.nearest_nst_t3.append(i)          
                 
                 
@@ -96,4 +121,34 @@ class Zone:
         self.nearest['nearest_nst_t1'] = self.nearest_nst_t1
         self.nearest['nearest_nst_t2'] = self.nearest_nst_t2
         self.nearest['nearest_nst_t3'] = self.nearest_nst_t3
-                
\ No newline at end of file
+
+
+    def expand(self, key):
+        """
+        Replacing the k nearest stations of a vehicle type with the full lists of stations, used when all k nearest stations are busy.
+        """
+        stations = getattr(self.net, f'station_zone_num_{key}')
+        tt = self.tt[stations].sort_values(kind='stable')
+        time_st = getattr(self, f'time_st_{key}')
+        setattr(self, f'nearest_st_{key}', tt.index[tt <= time_st].tolist())
+        setattr(self, f'nearest_nst_{key}', tt.index[tt > time_st].tolist())
+        self.nearest[f'nearest_st_{key}'] = getattr(self, f'nearest_st_{key}')
+        self.nearest[f'nearest_nst_{key}'] = getattr(self, f'nearest_nst_{key}')
+        self.truncated[key] = False
+
+
+
+def sort_nearest(tt, stations, time_st, k=None):
+    """
+    Sorting the stations of every zone based on travel time in an ascending order, in one pass over the OD matrix.
+    `tt` is the (nodes x zones) travel time matrix (dense, or `travel_times.StationTravelTimes`)
+    and `stations` contains the node id of stations with the vehicle type.
+    Returns the sorted station ids (zones x stations, or only the `k` nearest) and the number of stations within standard travel time of each zone.
+    """
+    stations = np.asarray(stations, dtype=np.int64)
+    times = tt[stations].T
+    order = np.argsort(times, axis=1, kind='stable')
+    n_within = (times <= time_st).sum(axis=1)
+    if k is not None:
+        order = order[:, :k]
+    return stations[order], n_within
@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pytest
+
+
+# The simulation modules are flat modules in `src`, imported like `main.py` does.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+DATA = os.path.join(ROOT, 'data')
+sys.path.insert(0, SRC)
+
+# Small slice of the bundled data: one configuration and OD matrix, and the first incidents of an arrival file.
+CONFIG = os.path.join(DATA, 'Resource_Configurations', 'config_2.csv')
+ARRIVAL = os.path.join(DATA, 'Arrivals', 'arrival_2.csv')
+OD = os.path.join(DATA, 'OD_Matrix', 'od_3.csv')
+INCIDENTS = 3000
+
+
+@pytest.fixture(scope='session')
+def inputs():
+    """
+    Parsed inputs of the slice, in the format of `runner.prepare_inputs`, with the arrival file cut to its first incidents.
+    """
+    from runner import prepare_inputs
+    inputs = prepare_inputs([(CONFIG, ARRIVAL, OD)])
+    inputs['arrival'][ARRIVAL] = inputs['arrival'][ARRIVAL].sort_index().iloc[:INCIDENTS]
+    return inputs
+
+
+@pytest.fixture(scope='session')
+def incident(inputs):
+    return inputs['arrival'][ARRIVAL]
+
+
+@pytest.fixture
+def network_factory(inputs):
+    """
+    Building networks of the slice in a given simulation environment.
+    """
+    from runner import build_network
+
+    def factory(env, incident=None, config=CONFIG):
+        incident = inputs['arrival'][ARRIVAL] if incident is None else incident
+        if config not in inputs['config']:
+            from runner import prepare_inputs
+            extra = prepare_inputs([(config, ARRIVAL, OD)])
+            inputs['config'][config] = extra['config'][config]
+            inputs['nearest_index'][(config, OD)] = extra['nearest_index'][(config, OD)]
+        return build_network(inputs['config'][config], inputs['od'][OD], incident, env,
+                             inputs['tt_matrix'][OD], inputs['nearest_index'][(config, OD)])
+    return factory
@@ -0,0 +1,89 @@
+import pandas as pd
+import pytest
+
+from assumptions import incident_type
+from event_calendar import EventCalendar
+from checkpoint import checkpoint, resume, save_checkpoint, run_with_checkpoints
+
+
+def full_run(network_factory, incident):
+    calendar = EventCalendar()
+    network = network_factory(calendar, incident)
+    calendar.run(incident, network, incident_type)
+    return network.recorder.to_frame()
+
+
+def test_resume_from_unsorted_incidents(network_factory, incident):
+    # Arrival files are not in incident id order.
+    shuffled = incident.sample(frac=1, random_state=0)
+    expected = full_run(network_factory, shuffled)
+
+    calendar = EventCalendar()
+    network = network_factory(calendar, shuffled)
+    calendar.start(shuffled, network, incident_type)
+    calendar.run(until=incident['inc_time'].iloc[len(incident)//2])
+    state = checkpoint(calendar, network)
+
+    network = network_factory(None, shuffled)
+    resumed = resume(state, shuffled, network, incident_type)
+    resumed.run()
+    result = network.recorder.to_frame()
+    assert result.index.is_unique
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_run_with_checkpoints(tmp_path, network_factory, incident):
+    expected = full_run(network_factory, incident)
+    path = str(tmp_path/'run.pkl')
+    # An interrupted run: the first chunks are saved, and a new network resumes from the file.
+    calendar = EventCalendar()
+    network = network_factory(calendar)
+    calendar.start(incident, network, incident_type)
+    for _ in range(3):
+        calendar.run(until=calendar.now+3600)
+        save_checkpoint(path, calendar, network)
+    network = network_factory(None)
+    run_with_checkpoints(path, 3600*24, incident, network, incident_type)
+    pd.testing.assert_frame_equal(network.recorder.to_frame(), expected)
+
+
+def test_resume_online_statistics(network_factory, incident):
+    calendar = EventCalendar()
+    network = network_factory(calendar)
+    network.generate_statistics()
+    calendar.run(incident, network, incident_type)
+    network.generate_online_db()
+    expected = network.zonal_db
+
+    calendar = EventCalendar()
+    network = network_factory(calendar)
+    network.generate_statistics()
+    calendar.start(incident, network, incident_type)
+    calendar.run(until=incident['inc_time'].iloc[len(incident)//3])
+    state = checkpoint(calendar, network)
+    assert state.recorder is None
+
+    network = network_factory(None)
+    resume(state, incident, network, incident_type).run()
+    assert network.recorder is None
+    network.generate_online_db()
+    pd.testing.assert_frame_equal(network.zonal_db, expected)
+
+
+@pytest.mark.parametrize('cut', [0.2, 0.4, 0.5, 0.6, 0.8])
+def test_branch_one_checkpoint_several_times(network_factory, incident, cut):
+    expected = full_run(network_factory, incident)
+    calendar = EventCalendar()
+    source = network_factory(calendar)
+    calendar.start(incident, source, incident_type)
+    calendar.run(until=incident['inc_time'].iloc[int(len(incident)*cut)])
+    state = checkpoint(calendar, source)
+    # Continuing the source run does not change the checkpoint.
+    calendar.run()
+    pd.testing.assert_frame_equal(source.recorder.to_frame(), expected)
+
+    for branch in range(2):
+        network = network_factory(None)
+        resume(state, incident, network, incident_type).run()
+        pd.testing.assert_frame_equal(network.recorder.to_frame(), expected)
+        assert (network.dispatcher.availability == network.dispatcher.vehicles).all()
@@ -0,0 +1,25 @@
+import subprocess
+import sys
+
+import pytest
+
+from conftest import SRC
+from confidence import t_quantile, T_QUANTILE, Z_QUANTILE
+
+
+def test_t_quantile():
+    assert t_quantile(2) == T_QUANTILE[0.95][0]
+    assert t_quantile(31, 0.99) == T_QUANTILE[0.99][29]
+    assert t_quantile(32, 0.90) == Z_QUANTILE[0.90]
+
+
+def test_output_helpers_do_not_import_the_simulation():
+    code = ('import sys, helper_functions_outputs; '
+            'print(sorted(m for m in ("simpy", "network", "optimization", "replication") if m in sys.modules))')
+    out = subprocess.run([sys.executable, '-c', code], cwd=SRC, capture_output=True, text=True, check=True).stdout
+    assert out.strip() == '[]'
+
+
+def test_unsupported_confidence():
+    with pytest.raises(ValueError, match='0.9, 0.95, 0.99'):
+        t_quantile(10, 0.975)
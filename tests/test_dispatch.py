@@ -0,0 +1,70 @@
+import simpy
+import numpy as np
+import pandas as pd
+import pytest
+
+from assumptions import incident_type
+from call_arrival import call_arrival
+from dispatch import dispatch_arrival
+from event_calendar import EventCalendar
+from incident_process import incident_process
+
+
+def simulate(network_factory, incident, arrival):
+    env = simpy.Environment()
+    network = network_factory(env, incident)
+    env.process(incident_process(env, incident, network, incident_type, arrival=arrival))
+    env.run()
+    return network
+
+
+def test_dispatch_arrival_matches_call_arrival(network_factory, incident):
+    expected = simulate(network_factory, incident, call_arrival)
+    network = simulate(network_factory, incident, dispatch_arrival)
+    pd.testing.assert_frame_equal(network.recorder.to_frame(), expected.recorder.to_frame())
+    # Vehicles are back in their stations in both.
+    for i,station in expected.stations.items():
+        assert station.availability == station.vehicles
+    assert (network.dispatcher.availability == network.dispatcher.vehicles).all()
+
+
+def scan(engine, location, key):
+    # Reference search: the first station with a free vehicle in the within-standard list, then in the beyond-standard list.
+    col = engine.type_col[key]
+    for within, nearest in [(True, engine.nearest_st[key][location]), (False, engine.nearest_nst[key][location])]:
+        for k,pos in enumerate(nearest):
+            if engine.availability[pos, col] > 0:
+                return pos, k+1, within
+    return -1, len(engine.nearest_nst[key][location]), False
+
+
+@pytest.mark.parametrize('busy', [0.5, 0.95, 1.0])
+def test_rank_search_matches_list_scan(network_factory, busy):
+    engine = network_factory(None).dispatcher
+    rng = np.random.default_rng(0)
+    # Random availability, with a share `busy` of the stations without free vehicles.
+    availability = np.where(rng.random(engine.vehicles.shape) < busy, 0, engine.vehicles)
+    engine.set_availability(availability)
+    for location in range(1, len(engine.nearest_st['t1'])):
+        for key in ['t1', 't2', 't3']:
+            pos, num, within = engine.find(location, key)
+            assert (pos, num, within) == scan(engine, location, key)
+
+
+@pytest.mark.parametrize('factor', [1, 20])
+def test_k_nearest_lists_match_full_lists(network_factory, incident, factor):
+    # The same incidents arriving `factor` times faster, so most stations are busy.
+    incident = incident.copy()
+    incident['arint'] = incident['arint']/factor
+    networks = []
+    for k in [None, 3]:
+        calendar = EventCalendar()
+        network = network_factory(calendar, incident)
+        if k is not None:
+            network.zones = {}
+            network.generate_zone(network.tt_matrix, k=k)
+            network.generate_dispatcher()
+            assert network.dispatcher.truncated['t1']
+        calendar.run(incident, network, incident_type)
+        networks.append(network)
+    pd.testing.assert_frame_equal(networks[1].recorder.to_frame(), networks[0].recorder.to_frame())
@@ -0,0 +1,57 @@
+import os
+
+import simpy
+import pandas as pd
+import pytest
+
+from assumptions import incident_type
+from data_cache import load_od
+from dispatch import dispatch_arrival
+from event_calendar import EventCalendar
+from incident_process import incident_process
+from od_schedule import ODSchedule
+from conftest import DATA
+
+
+def simpy_run(network_factory, incident, schedule=None):
+    env = simpy.Environment()
+    network = network_factory(env)
+    if schedule is not None:
+        network.generate_schedule(schedule)
+    env.process(incident_process(env, incident, network, incident_type, arrival=dispatch_arrival))
+    env.run()
+    return env, network
+
+
+def calendar_run(network_factory, incident, schedule=None, chunk=None):
+    calendar = EventCalendar()
+    network = network_factory(calendar)
+    if schedule is not None:
+        network.generate_schedule(schedule)
+    if chunk is None:
+        calendar.run(incident, network, incident_type)
+    else:
+        calendar.start(incident, network, incident_type)
+        while calendar.calendar:
+            calendar.run(until=calendar.now+chunk)
+    return calendar, network
+
+
+@pytest.mark.parametrize('chunk', [None, 6*3600])
+def test_calendar_matches_simpy(network_factory, incident, chunk):
+    env, expected = simpy_run(network_factory, incident)
+    calendar, network = calendar_run(network_factory, incident, chunk=chunk)
+    pd.testing.assert_frame_equal(network.recorder.to_frame(), expected.recorder.to_frame())
+    assert calendar.now == env.now
+
+
+def test_calendar_matches_simpy_with_od_schedule(inputs, network_factory, incident):
+    od_3 = next(iter(inputs['od'].values()))
+    od_4 = load_od(os.path.join(DATA, 'OD_Matrix', 'od_4.csv'))
+    schedule = ODSchedule([(0, od_4), (7*3600, od_3), (19*3600, od_4)])
+    _, expected = simpy_run(network_factory, incident, schedule)
+    _, network = calendar_run(network_factory, incident, schedule)
+    pd.testing.assert_frame_equal(network.recorder.to_frame(), expected.recorder.to_frame())
+    # The periods of the same OD matrix share their precomputed objects.
+    assert network.periods[2] is network.periods[0]
+    assert network.periods[1]['dispatcher'] is not network.periods[0]['dispatcher']
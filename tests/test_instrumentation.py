@@ -0,0 +1,37 @@
+from instrumentation import Instrumentation
+from runner import make_grid, run_experiment, run_replication, prepare_inputs
+from conftest import CONFIG, ARRIVAL, OD
+
+
+def test_dispatch_search_counters(inputs, incident):
+    instrumentation = Instrumentation()
+    run_replication(CONFIG, ARRIVAL, OD, inputs=inputs, engine='calendar', instrumentation=instrumentation)
+    counters = instrumentation.counters
+    searches = sum(counters[f'dispatch_search_{key}'] for key in ['t1', 't2', 't3'])
+    assert searches == instrumentation.calls['dispatch_search'] > len(incident)
+    assert counters['within_standard_checked'] > 0
+    assert counters['free_stations_ranked'] > 0
+    assert 'scanned_stations' not in counters
+
+
+def test_run_experiment_merges_worker_instrumentation():
+    grid = make_grid([CONFIG], [ARRIVAL], [OD])*2
+    instrumentation = Instrumentation()
+    result = run_experiment(grid, processes=2, engine='calendar', instrumentation=instrumentation)
+    assert len(result['config_2']) == 2
+
+    single = Instrumentation()
+    run_replication(CONFIG, ARRIVAL, OD, inputs=prepare_inputs(grid), engine='calendar', instrumentation=single)
+    for name,value in single.counters.items():
+        assert instrumentation.counters[name] == 2*value
+    assert instrumentation.calls['env.run'] == 2
+    assert instrumentation.seconds['env.run'] > 0
+
+
+def test_event_calendar_scheduling(inputs):
+    instrumentation = Instrumentation()
+    run_replication(CONFIG, ARRIVAL, OD, inputs=inputs, engine='calendar', instrumentation=instrumentation)
+    # Every scheduled event is processed by the end of the run.
+    scheduled = instrumentation.counters['events_scheduled']
+    assert scheduled == instrumentation.counters['events_processed'] > 0
+    assert instrumentation.calls['event_scheduling'] == scheduled
@@ -0,0 +1,59 @@
+import simpy
+import numpy as np
+import pandas as pd
+import pytest
+
+from assumptions import incident_type
+from call_arrival import call_arrival
+from dispatch import dispatch_arrival
+from event_calendar import EventCalendar
+from incident_process import incident_process
+
+
+def simulate(network_factory, incident, engine, record):
+    env = simpy.Environment() if engine != 'calendar' else EventCalendar()
+    network = network_factory(env)
+    network.generate_statistics(record=record)
+    if engine == 'calendar':
+        env.run(incident, network, incident_type)
+    else:
+        arrival = call_arrival if engine == 'call_arrival' else dispatch_arrival
+        env.process(incident_process(env, incident, network, incident_type, arrival=arrival))
+        env.run()
+    return network
+
+
+def post_hoc(network):
+    network.generate_result()
+    network.compute_util()
+    network.generate_station_db()
+    network.generate_zonal_db()
+    return network.station_util_db, network.zonal_db
+
+
+def assert_outputs_equal(online, expected):
+    util, zonal = online
+    expected_util, expected_zonal = expected
+    numeric = lambda df: df.replace('Not Defined', np.nan).astype(np.float64)
+    pd.testing.assert_frame_equal(numeric(util), numeric(expected_util), rtol=1e-9)
+    # Every column of the zonal databases, including the number of incidents for each number of traversed stations.
+    assert list(zonal.columns) == list(expected_zonal.columns)
+    pd.testing.assert_frame_equal(zonal, expected_zonal, check_dtype=False, rtol=1e-9)
+
+
+@pytest.mark.parametrize('engine', ['calendar', 'dispatch_arrival', 'call_arrival'])
+def test_online_statistics_match_final_database(network_factory, incident, engine):
+    network = simulate(network_factory, incident, engine, record=True)
+    network.generate_online_db()
+    online = network.station_util_db, network.zonal_db
+    assert any(column.startswith('e3_t3_1_trvs_') for column in network.zonal_db.columns)
+    assert_outputs_equal(online, post_hoc(network))
+
+
+@pytest.mark.parametrize('engine', ['calendar', 'dispatch_arrival', 'call_arrival'])
+def test_online_statistics_without_recorder(network_factory, incident, engine):
+    expected = post_hoc(simulate(network_factory, incident, 'calendar', record=True))
+    network = simulate(network_factory, incident, engine, record=False)
+    assert network.recorder is None
+    network.generate_online_db()
+    assert_outputs_equal((network.station_util_db, network.zonal_db), expected)
@@ -0,0 +1,30 @@
+import numpy as np
+
+from assumptions import zone_num
+from incident_generator import IncidentGenerator
+from replication import ReplicationController
+
+
+def controller(incident, metric, **kwargs):
+    """
+    Controller of one configuration whose replications give the values of `metric(replication)`, without simulating them.
+    """
+    generator = IncidentGenerator.from_arrivals(incident, zone_num, seed=1)
+    control = ReplicationController({'config':None}, None, generator, metrics={'coverage':None}, **kwargs)
+    control.simulate = lambda name, replication: {'coverage':metric(replication)}
+    return control
+
+
+def test_stops_at_min_replications_once_precise(incident):
+    control = controller(incident, lambda replication: 0.8+1e-6*(replication % 2), precision=0.01, min_replications=4)
+    summary = control.run()
+    assert summary['replications'].tolist() == [4]
+    assert len(control.results['config']['coverage']) == 4
+
+
+def test_stops_at_max_replications_otherwise(incident):
+    noise = np.random.default_rng(0).normal(0.5, 0.2, 100)
+    control = controller(incident, lambda replication: noise[replication], precision=0.001, max_replications=12)
+    summary = control.run()
+    assert summary['replications'].tolist() == [12]
+    assert not control.converged(summary)
@@ -0,0 +1,31 @@
+import pandas as pd
+import pytest
+
+from helper_functions_outputs import process_data
+from result_sink import ResultSink, StoredRun, load_results
+from runner import run_replication
+from conftest import CONFIG, ARRIVAL, OD
+
+pytest.importorskip('pyarrow')
+
+
+def test_stored_runs_match_in_memory_results(inputs, tmp_path):
+    sink = ResultSink(tmp_path)
+    stored = [run_replication(CONFIG, ARRIVAL, OD, inputs=inputs, engine='calendar', sink=sink, replication=k) for k in range(2)]
+    assert all(isinstance(run, StoredRun) for run in stored)
+    expected = run_replication(CONFIG, ARRIVAL, OD, inputs=inputs, engine='calendar')
+
+    loaded = load_results(tmp_path)
+    assert list(loaded) == [expected.config]
+    assert [run.replication for run in loaded[expected.config]] == [0, 1]
+    for run in loaded[expected.config]:
+        pd.testing.assert_frame_equal(run.station_util_db, expected.station_util_db)
+        for name in ['zonal_db_e1', 'zonal_db_e2', 'zonal_db_e3']:
+            pd.testing.assert_frame_equal(getattr(run, name), getattr(expected, name))
+
+    # The stored runs give `process_data` the same input as in-memory runs.
+    for param, fields in [('utilization', ['t1_util', 't2_util', 't3_util']), ('coverage', ['cov_e1', 'cov_e2', 'cov_e3'])]:
+        data = process_data(loaded, fields, param)
+        expected_data = process_data({expected.config:[expected, expected]}, fields, param)
+        for field in fields:
+            pd.testing.assert_frame_equal(data[expected.config][field], expected_data[expected.config][field])
@@ -0,0 +1,14 @@
+import os
+import shutil
+
+import pytest
+
+from runner import make_grid, prepare_inputs
+from conftest import CONFIG, ARRIVAL, OD
+
+
+def test_configurations_with_the_same_name_are_rejected(tmp_path):
+    copy = os.path.join(tmp_path, os.path.basename(CONFIG))
+    shutil.copy(CONFIG, copy)
+    with pytest.raises(ValueError, match='same name'):
+        prepare_inputs(make_grid([CONFIG, copy], [ARRIVAL], [OD]))
@@ -0,0 +1,56 @@
+import itertools
+import tracemalloc
+
+import numpy as np
+
+from assumptions import incident_type, zone_num
+from incident_generator import IncidentGenerator
+from surge import SurgeSimulation, HOUR
+
+
+def overloaded(incident, factor=50):
+    # The same incidents arriving `factor` times faster.
+    incident = incident.copy()
+    incident['arint'] = incident['arint']/factor
+    return incident
+
+
+def test_hourly_statistics(network_factory, incident):
+    sim = SurgeSimulation(network_factory(None), incident_type).run(overloaded(incident))
+    summary = sim.summary()
+    hourly = sim.hourly_db()
+    assert summary['arrived'] == summary['completed'] == len(incident)
+    assert summary['queued'] > 0
+    assert len(hourly) == int(sim.now//HOUR)+1
+    assert hourly['arrived'].sum() == sim.arrived
+    assert hourly['completed'].sum() == sim.completed
+    assert (hourly['wall_seconds'] >= 0).all()
+    assert np.isclose(hourly['wall_seconds'].sum(), summary['wall_seconds'])
+    assert hourly['max_queue'].max() == sim.max_queue_length
+
+
+def test_full_queue_drops_incidents(network_factory, incident):
+    network = network_factory(None)
+    sim = SurgeSimulation(network, incident_type, max_queue=20).run(overloaded(incident))
+    assert sim.dropped > 0
+    assert sim.arrived == sim.completed+sim.dropped == len(incident)
+    assert sim.max_queue_length == 20
+    assert (network.dispatcher.availability == network.dispatcher.vehicles).all()
+
+
+def test_memory_does_not_grow_with_incidents(network_factory, incident):
+    generator = IncidentGenerator.from_arrivals(incident, zone_num, seed=1).scale(50)
+
+    def peak(n):
+        sim = SurgeSimulation(network_factory(None), incident_type, max_queue=200)
+        tracemalloc.start()
+        sim.run(itertools.islice(generator.incidents(0), n))
+        size = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert sim.arrived == n
+        return size
+
+    small = peak(5000)
+    large = peak(20000)
+    # Four times the incidents in about the same memory (a recorder would need four times as much).
+    assert large < 1.5*small
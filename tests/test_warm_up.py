@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from assumptions import incident_type
+from event_calendar import EventCalendar
+from warm_up import mser, RunningMSER, truncate, warm_up_time
+from runner import run_replication
+from conftest import CONFIG, ARRIVAL, OD
+
+
+def transient_series(n=5000, warm=500, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(10, 1, n)
+    values[:warm] += np.linspace(8, 0, warm)
+    return values
+
+
+def test_mser_truncates_the_transient():
+    d = mser(transient_series())
+    assert 250 <= d <= 750
+
+
+def test_running_mser_detects_the_batch_mser_point():
+    values = transient_series()
+    detector = RunningMSER(batch=5, interval=100)
+    times = np.arange(len(values), dtype=np.float64)
+    for t, value in zip(times, values):
+        if detector.add(t, value):
+            break
+    assert detector.truncation is not None
+    assert detector.truncation == mser(values[:len(detector.means)*5])
+
+
+def run(network_factory, incident, record, warm_up=None):
+    calendar = EventCalendar()
+    network = network_factory(calendar)
+    network.generate_statistics(record=record)
+    if warm_up is not None:
+        network.statistics.set_warm_up(warm_up)
+    calendar.run(incident, network, incident_type)
+    return network
+
+
+def assert_same_outputs(network, expected):
+    network.generate_online_db()
+    expected.generate_result()
+    expected.compute_util()
+    expected.generate_station_db()
+    expected.generate_zonal_db()
+    numeric = lambda df: df.replace('Not Defined', np.nan).astype(np.float64)
+    pd.testing.assert_frame_equal(numeric(network.station_util_db), numeric(expected.station_util_db), rtol=1e-9)
+    pd.testing.assert_frame_equal(network.zonal_db, expected.zonal_db, check_dtype=False, rtol=1e-9)
+
+
+@pytest.mark.parametrize('warm_up', [20000.0, 'mser'])
+def test_online_warm_up_matches_truncated_final_database(network_factory, incident, warm_up):
+    network = run(network_factory, incident, False, warm_up)
+    assert network.statistics.detector is None
+    assert network.statistics.pending == []
+    if warm_up == 'mser':
+        # Detected during the run at the truncation point of MSER on the recorded series.
+        expected = run(network_factory, incident, True)
+        assert network.statistics.start == warm_up_time(expected) > 0
+    expected = run(network_factory, incident, True)
+    truncate(expected, network.statistics.start)
+    assert_same_outputs(network, expected)
+
+
+def test_runner_online_warm_up(inputs):
+    online = run_replication(CONFIG, ARRIVAL, OD, inputs=inputs, engine='calendar', online=True, warm_up='mser')
+    recorded = run_replication(CONFIG, ARRIVAL, OD, inputs=inputs, engine='calendar', warm_up='mser')
+    pd.testing.assert_frame_equal(online.zonal_db_e1, recorded.zonal_db_e1, check_dtype=False, rtol=1e-9)
+
+
+def test_online_warm_up_not_detected_during_the_run(network_factory, incident):
+    # Checks spaced beyond the end of the run: the truncation point is only found by MSER on the whole run, like on the recorder.
+    calendar = EventCalendar()
+    network = network_factory(calendar)
+    network.generate_statistics(record=False)
+    network.statistics.set_warm_up('mser', interval=10**6)
+    calendar.run(incident, network, incident_type)
+    assert network.statistics.detector is not None
+    network.statistics.finish()
+    expected = run(network_factory, incident, True)
+    truncate(expected, 'mser')
+    assert network.statistics.start == expected.warm_up > 0
+    assert_same_outputs(network, expected)
+
+
+def test_warm_up_must_end_before_the_run(network_factory, incident):
+    network = run(network_factory, incident, True)
+    with pytest.raises(ValueError):
+        truncate(network, network.env.now)
+    # Utilization is 0 rather than a division by zero if the warm-up period is set directly.
+    network.warm_up = network.env.now
+    network.generate_result()
+    network.compute_util()
+    network.generate_station_db()
+    assert (network.station_util_db.replace('Not Defined', 0) == 0).all().all()
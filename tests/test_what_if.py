@@ -0,0 +1,39 @@
+import os
+
+import simpy
+import pandas as pd
+import pytest
+
+from assumptions import incident_type, time_st_t1, time_st_t2, time_st_t3, zone_num
+from dispatch import dispatch_arrival
+from incident_process import incident_process
+from what_if import WhatIf
+from conftest import DATA, CONFIG, OD
+
+
+CONFIGS = [CONFIG, os.path.join(DATA, 'Resource_Configurations', 'config_3.csv')]
+
+
+def test_what_if_matches_separate_runs(inputs, network_factory, incident):
+    locs = {os.path.basename(config):network_factory(None, config=config).loc for config in CONFIGS}
+    what_if = WhatIf(locs, inputs['od'][OD], zone_num, time_st_t1, time_st_t2, time_st_t3, len(incident), incident, incident_type)
+    what_if.run(incident)
+    for config, (name, network) in zip(CONFIGS, what_if.generate_outputs().items()):
+        env = simpy.Environment()
+        separate = network_factory(env, config=config)
+        env.process(incident_process(env, incident, separate, incident_type, arrival=dispatch_arrival))
+        env.run()
+        pd.testing.assert_frame_equal(network.recorder.to_frame(), separate.recorder.to_frame())
+
+
+def test_what_if_without_available_vehicle(inputs, network_factory, incident):
+    # A configuration with a single station and vehicle of each type, and simultaneous incidents.
+    loc = network_factory(None).loc.copy()
+    loc[['Station', 't1', 't2', 't3']] = 0
+    loc.loc[0, ['Station', 't1', 't2', 't3']] = 1
+    burst = incident.iloc[:5].copy()
+    burst['arint'] = 0.0
+    what_if = WhatIf({'full':network_factory(None).loc, 'single':loc}, inputs['od'][OD], zone_num,
+                     time_st_t1, time_st_t2, time_st_t3, len(burst), burst, incident_type)
+    with pytest.raises(RuntimeError, match='configuration single'):
+        what_if.run(burst)
@@ -0,0 +1,36 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import DATA
+from data_cache import load_configuration
+
+gpd = pytest.importorskip('geopandas')
+from helper_functions_outputs import ZoneMap
+
+
+@pytest.fixture(scope='module')
+def zone_map():
+    return ZoneMap(gpd.read_file(os.path.join(DATA, 'study area', 'zones_studyarea.shp')))
+
+
+def test_station_values_are_drawn_in_their_zone(zone_map):
+    # Stations are indexed by their row in the resource configuration; station 0 is the station of zone 1.
+    loc = load_configuration(os.path.join(DATA, 'Current_Situation', 'current_config.csv'))
+    stations = loc.index[loc['Station'] == 1]
+    assert stations[0] == 0
+    util = pd.Series(np.arange(1, len(stations)+1, dtype=np.float64), index=stations)
+    values = zone_map.values(util, stations=True)
+    for st, value in util.items():
+        assert values[zone_map.ids == int(loc.loc[st, 'zone'])] == [value]
+    assert np.count_nonzero(values) == len(stations)
+
+
+def test_zone_values_are_drawn_in_their_zone(zone_map):
+    cov = pd.Series([0.5, 0.25], index=pd.Index([1, 693]))
+    values = zone_map.values(cov)
+    assert values[zone_map.ids == 1] == [0.5]
+    assert values[zone_map.ids == 693] == [0.25]
+    assert np.count_nonzero(values) == 2